@@ -1,62 +1,437 @@
+import asyncio
 import base64
+import codecs
+import importlib.util
 import json
 import logging
+import random
+import re
+import time
+from typing import Awaitable, Callable
 
+import httpx
+from httpx import AsyncClient as httpx_async_client
 from httpx import Client as httpx_client
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
 
 
 OKVED_JSON_GITHUB_URL_TEMPLATE = 'https://api.github.com/repos/{owner}/{repo}/contents/{file_path}'
 
+RAW_MEDIA_TYPE_REJECTED_STATUS_CODES = frozenset((403, 406, 415))
 
-class GithubClient:
-    def __init__(self, owner: str, repo: str, file_path: str) -> None:
+RETRYABLE_STATUS_CODES = frozenset((429, 500, 502, 503, 504))
+RATE_LIMIT_STATUS_CODES = frozenset((403, 429))
+
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 30.0
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.5
+MAX_BACKOFF = 30.0
+MAX_RATE_LIMIT_WAIT = 60.0
+
+
+class _BaseGithubClient:
+    def __init__(
+        self,
+        owner: str,
+        repo: str,
+        file_path: str,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: float = DEFAULT_READ_TIMEOUT,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff_factor: float = DEFAULT_BACKOFF_FACTOR,
+        http2: bool = False,
+    ) -> None:
         self._owner: str = owner
         self._repo: str = repo
         self._file_path: str = file_path
+        self._timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self._max_retries = max_retries
+        self._backoff_factor = backoff_factor
+        self._http2 = http2 and _is_http2_available()
+        # Реестр ответил на последнюю проверку etag: 200 с новым etag или 304. Ошибки и отсутствие ответа не считаются;
+        self._etag_check_succeeded = False
 
-    def check_okved_json_etag(self, cached_etag: str | None = None) -> dict | None:
-        url = OKVED_JSON_GITHUB_URL_TEMPLATE.format(owner=self._owner, repo=self._repo, file_path=self._file_path)
+    def is_etag_check_succeeded(self) -> bool:
+        return self._etag_check_succeeded
 
-        headers = {'Accept': 'application/vnd.github.v3+json'}
+    def _get_okved_json_url(self) -> str:
+        return OKVED_JSON_GITHUB_URL_TEMPLATE.format(owner=self._owner, repo=self._repo, file_path=self._file_path)
 
-        if cached_etag:
-            headers['If-None-Match'] = cached_etag
+    def _get_retry_delay(self, response: httpx.Response | None, attempt: int) -> float | None:
+        if attempt >= self._max_retries:
+            return None
 
-        with httpx_client() as client:
-            # TODO: добавить обработку исключений запроса;
-            response = client.head(url, headers=headers, follow_redirects=True)
+        if response is None:
+            return _get_backoff_delay(backoff_factor=self._backoff_factor, attempt=attempt)
 
-        if response.status_code == 304:
-            logger.info("etag didn't change.")
-        elif response.status_code == 200:
-            logger.info('etag updated.')
-            new_etag = response.headers.get('ETag')
-            if new_etag:
-                return new_etag
-        else:
-            logger.warning('Check github okved.json etag failed: %s - %s', response.status_code, response.text)
+        rate_limit_delay = _get_rate_limit_delay(response)
+        if rate_limit_delay is not None:
+            if rate_limit_delay > MAX_RATE_LIMIT_WAIT:
+                logger.warning('Github API rate limit exceeded, reset in %.0f seconds.', rate_limit_delay)
+                return None
+            return rate_limit_delay
+
+        if response.status_code in RETRYABLE_STATUS_CODES:
+            return _get_backoff_delay(backoff_factor=self._backoff_factor, attempt=attempt)
 
         return None
 
+
+class GithubClient(_BaseGithubClient):
+    def __init__(self, owner: str, repo: str, file_path: str, **kwargs) -> None:
+        super().__init__(owner=owner, repo=repo, file_path=file_path, **kwargs)
+        self._client: httpx_client | None = None
+
+    def __enter__(self) -> 'GithubClient':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    def check_okved_json_etag(self, cached_etag: str | None = None) -> str | None:
+        client = self._get_client()
+        url = self._get_okved_json_url()
+        headers = _form_etag_request_headers(cached_etag=cached_etag)
+
+        response = self._send_with_retries(lambda: client.head(url, headers=headers, follow_redirects=True))
+        self._etag_check_succeeded = response is not None and response.status_code in (200, 304)
+        return _parse_etag_response(response)
+
     def load_okved_json(self) -> list | None:
-        url = OKVED_JSON_GITHUB_URL_TEMPLATE.format(owner=self._owner, repo=self._repo, file_path=self._file_path)
+        client = self._get_client()
+        url = self._get_okved_json_url()
+        download = _OkvedJsonDownload()
+
+        response = self._send_with_retries(
+            lambda: download.read(client=client, url=url, headers=_form_raw_okved_json_request_headers())
+        )
+        if not _is_raw_media_type_rejected(response):
+            return _get_downloaded_okved_codes(response=response, download=download)
+
+        logger.info('Raw okved.json download rejected, falling back to contents API.')
+        response = self._send_with_retries(lambda: client.get(url, headers=_form_okved_json_request_headers()))
+        download_url = _get_download_url(response)
+        if download_url is None:
+            return _parse_okved_json_response(response)
+
+        response = self._send_with_retries(lambda: download.read(client=client, url=download_url, headers={}))
+        return _get_downloaded_okved_codes(response=response, download=download)
+
+    def _get_client(self) -> httpx_client:
+        if self._client is None:
+            self._client = httpx_client(timeout=self._timeout, http2=self._http2)
+        return self._client
+
+    def _send_with_retries(self, send: Callable[[], httpx.Response]) -> httpx.Response | None:
+        attempt = 0
+        while True:
+            response = None
+            try:
+                response = send()
+            except httpx.TransportError as exc:
+                logger.warning('Github API request failed (attempt %s): %r', attempt + 1, exc)
+
+            delay = self._get_retry_delay(response=response, attempt=attempt)
+            if delay is None:
+                return response
+            time.sleep(delay)
+            attempt += 1
+
+
+class AsyncGithubClient(_BaseGithubClient):
+    def __init__(self, owner: str, repo: str, file_path: str, **kwargs) -> None:
+        super().__init__(owner=owner, repo=repo, file_path=file_path, **kwargs)
+        self._client: httpx_async_client | None = None
+
+    async def __aenter__(self) -> 'AsyncGithubClient':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def check_okved_json_etag(self, cached_etag: str | None = None) -> str | None:
+        client = self._get_client()
+        url = self._get_okved_json_url()
+        headers = _form_etag_request_headers(cached_etag=cached_etag)
+
+        response = await self._send_with_retries(lambda: client.head(url, headers=headers, follow_redirects=True))
+        self._etag_check_succeeded = response is not None and response.status_code in (200, 304)
+        return _parse_etag_response(response)
+
+    async def load_okved_json(self) -> list | None:
+        client = self._get_client()
+        url = self._get_okved_json_url()
+        download = _OkvedJsonDownload()
+
+        response = await self._send_with_retries(
+            lambda: download.aread(client=client, url=url, headers=_form_raw_okved_json_request_headers())
+        )
+        if not _is_raw_media_type_rejected(response):
+            return _get_downloaded_okved_codes(response=response, download=download)
+
+        logger.info('Raw okved.json download rejected, falling back to contents API.')
+        response = await self._send_with_retries(lambda: client.get(url, headers=_form_okved_json_request_headers()))
+        download_url = _get_download_url(response)
+        if download_url is None:
+            return _parse_okved_json_response(response)
+
+        response = await self._send_with_retries(lambda: download.aread(client=client, url=download_url, headers={}))
+        return _get_downloaded_okved_codes(response=response, download=download)
+
+    def _get_client(self) -> httpx_async_client:
+        if self._client is None:
+            self._client = httpx_async_client(timeout=self._timeout, http2=self._http2)
+        return self._client
+
+    async def _send_with_retries(self, send: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response | None:
+        attempt = 0
+        while True:
+            response = None
+            try:
+                response = await send()
+            except httpx.TransportError as exc:
+                logger.warning('Github API request failed (attempt %s): %r', attempt + 1, exc)
+
+            delay = self._get_retry_delay(response=response, attempt=attempt)
+            if delay is None:
+                return response
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+class _OkvedJsonDownload:
+    def __init__(self) -> None:
+        self.okved_codes: list | None = None
+
+    def read(self, client: httpx_client, url: str, headers: dict[str, str]) -> httpx.Response:
+        self.okved_codes = None
+        with client.stream('GET', url, headers=headers, follow_redirects=True) as response:
+            if response.status_code != 200:
+                response.read()
+                return response
+
+            parser = JsonArrayStreamParser()
+            try:
+                for chunk in response.iter_bytes():
+                    parser.feed(chunk)
+                self.okved_codes = parser.close()
+            except ValueError as exc:
+                logger.warning('Wrong format of github okved.json: %r', exc)
+        return response
+
+    async def aread(self, client: httpx_async_client, url: str, headers: dict[str, str]) -> httpx.Response:
+        self.okved_codes = None
+        async with client.stream('GET', url, headers=headers, follow_redirects=True) as response:
+            if response.status_code != 200:
+                await response.aread()
+                return response
+
+            parser = JsonArrayStreamParser()
+            try:
+                async for chunk in response.aiter_bytes():
+                    parser.feed(chunk)
+                self.okved_codes = parser.close()
+            except ValueError as exc:
+                logger.warning('Wrong format of github okved.json: %r', exc)
+        return response
+
+
+class JsonArrayStreamParser:
+    def __init__(self) -> None:
+        self._utf8_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json_decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._array_started = False
+        self._array_finished = False
+        self._item_expected = True
+        self._min_buffer_len_to_parse = 0
+        self.items: list = []
+
+    def feed(self, chunk: bytes) -> None:
+        self._buffer += self._utf8_decoder.decode(chunk)
+        if len(self._buffer) >= self._min_buffer_len_to_parse:
+            self._parse(final=False)
+
+    def close(self) -> list:
+        self._buffer += self._utf8_decoder.decode(b'', final=True)
+        self._parse(final=True)
+        if not self._array_finished:
+            raise ValueError('Unexpected end of json array')
+        return self.items
 
-        headers = {'Accept': 'application/vnd.github.v3+json'}
+    def _parse(self, final: bool) -> None:
+        buffer = self._buffer
+        position = 0
 
-        with httpx_client() as client:
-            # TODO: добавить обработку исключений запроса;
-            response = client.get(url, headers=headers)
+        while True:
+            position = _JSON_WHITESPACE.match(buffer, position).end()
+            if position == len(buffer):
+                break
+            char = buffer[position]
 
-        okved_codes = None
+            if self._array_finished:
+                raise ValueError('Extra data after json array')
+            elif not self._array_started:
+                if char != '[':
+                    raise ValueError('Json array expected')
+                self._array_started = True
+                position += 1
+            elif char == ']' and (not self._item_expected or not self.items):
+                self._array_finished = True
+                position += 1
+            elif not self._item_expected:
+                if char != ',':
+                    raise ValueError('Comma expected between json array items')
+                self._item_expected = True
+                position += 1
+            else:
+                try:
+                    item, item_end = self._json_decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    if final:
+                        raise
+                    # Элемент массива ещё не докачан: разбираем его заново, когда буфер вырастет вдвое;
+                    self._buffer = buffer[position:]
+                    self._min_buffer_len_to_parse = 2 * len(self._buffer)
+                    return
+                if item_end == len(buffer) and not final:
+                    # Число в конце буфера может оказаться неполным;
+                    self._buffer = buffer[position:]
+                    self._min_buffer_len_to_parse = len(self._buffer) + 1
+                    return
+                self.items.append(item)
+                self._item_expected = False
+                position = item_end
+
+        self._buffer = ''
+        self._min_buffer_len_to_parse = 0
+
+
+_JSON_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+def _form_etag_request_headers(cached_etag: str | None) -> dict[str, str]:
+    headers = {'Accept': 'application/vnd.github.v3+json'}
+
+    if cached_etag:
+        headers['If-None-Match'] = cached_etag
+
+    return headers
+
+
+def _form_okved_json_request_headers() -> dict[str, str]:
+    return {'Accept': 'application/vnd.github.v3+json'}
+
+
+def _form_raw_okved_json_request_headers() -> dict[str, str]:
+    return {'Accept': 'application/vnd.github.raw+json'}
+
+
+def _is_raw_media_type_rejected(response: httpx.Response | None) -> bool:
+    if response is None or response.status_code not in RAW_MEDIA_TYPE_REJECTED_STATUS_CODES:
+        return False
+    # Исчерпанный лимит запросов не повод обращаться к API ещё раз;
+    return _get_rate_limit_delay(response) is None
+
+
+def _get_downloaded_okved_codes(response: httpx.Response | None, download: _OkvedJsonDownload) -> list | None:
+    if response is None:
+        logger.warning('Loading github okved.json failed: no response.')
+    elif response.status_code != 200:
+        logger.warning('Loading github okved.json failed: %s - %s', response.status_code, response.text)
+    return download.okved_codes
+
+
+def _get_download_url(response: httpx.Response | None) -> str | None:
+    if response is None or response.status_code != 200:
+        return None
+    try:
+        contents = response.json()
+    except ValueError:
+        return None
+    # Для файлов больше 1 Мб contents API не возвращает содержимое, только ссылку на него;
+    if not isinstance(contents, dict) or contents.get('content') or not contents.get('download_url'):
+        return None
+    return contents['download_url']
+
+
+def _parse_etag_response(response: httpx.Response | None) -> str | None:
+    if response is None:
+        logger.warning('Check github okved.json etag failed: no response.')
+    elif response.status_code == 304:
+        logger.info("etag didn't change.")
+    elif response.status_code == 200:
+        logger.info('etag updated.')
+        new_etag = response.headers.get('ETag')
+        if new_etag:
+            return new_etag
+    else:
+        logger.warning('Check github okved.json etag failed: %s - %s', response.status_code, response.text)
+
+    return None
+
+
+def _parse_okved_json_response(response: httpx.Response | None) -> list | None:
+    if response is None:
+        logger.warning('Loading github okved.json failed: no response.')
+        return None
+
+    if response.status_code != 200:
+        logger.warning('Loading github okved.json failed: %s - %s', response.status_code, response.text)
+        return None
+
+    try:
+        content = response.json()['content']
+        decoded = base64.b64decode(content).decode('utf-8')
+        return json.loads(decoded)
+    except (KeyError, TypeError, ValueError) as exc:
+        logger.warning('Wrong format of github okved.json response: %r', exc)
+        return None
+
+
+def _get_backoff_delay(backoff_factor: float, attempt: int) -> float:
+    # "Full jitter": случайная задержка, чтобы повторные запросы разных процессов не шли синхронно;
+    return random.uniform(0, min(MAX_BACKOFF, backoff_factor * 2**attempt))
+
+
+def _get_rate_limit_delay(response: httpx.Response) -> float | None:
+    if response.status_code not in RATE_LIMIT_STATUS_CODES:
+        return None
+
+    retry_after = response.headers.get('Retry-After')
+    if retry_after is not None:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            return None
+
+    if response.headers.get('X-RateLimit-Remaining') != '0':
+        return None
+
+    try:
+        reset_at = float(response.headers['X-RateLimit-Reset'])
+    except (KeyError, ValueError):
+        return None
+    return max(0.0, reset_at - time.time())
 
-        if response.status_code == 200:
-            content = response.json()['content']
-            decoded = base64.b64decode(content).decode('utf-8')
-            okved_codes = json.loads(decoded)
-        else:
-            logger.warning('Loading github okved.json failed: %s - %s', response.status_code, response.text)
 
-        return okved_codes
+def _is_http2_available() -> bool:
+    if importlib.util.find_spec('h2') is None:
+        logger.warning(
+            'Package h2 is not installed, falling back to HTTP/1.1. Install the http2 extra: '
+            "pip install 'find-your-okved-game[http2]'."
+        )
+        return False
+    return True
@@ -0,0 +1,182 @@
+import contextlib
+import csv
+import importlib.util
+import io
+import json
+import sys
+from enum import Enum
+from itertools import islice
+from typing import IO, Iterable, Iterator, Tuple
+
+STDIO_PATH = '-'
+
+RESULT_FIELDS = ('phone', 'normalized_phone', 'okved', 'title', 'matches_count', 'complete_match', 'error')
+
+OKVED_LOAD_FAILED_ERROR = 'Не удалось загрузить коды ОКВЭД'
+
+# Результаты пишутся порциями: одна запись в файл на порцию, а в памяти не больше одной порции;
+RESULT_WRITE_CHUNK_SIZE = 1024
+PARQUET_ROW_GROUP_SIZE = 64 * 1024
+OUTPUT_BUFFER_SIZE = 1024 * 1024
+
+_JSON_ENCODER = json.JSONEncoder(ensure_ascii=False)
+
+
+class OutputFormat(str, Enum):
+    csv = 'csv'
+    jsonl = 'jsonl'
+    parquet = 'parquet'
+
+
+class ParquetNotAvailableError(RuntimeError):
+    def __init__(self):
+        super().__init__(
+            'Package pyarrow is not installed, parquet output is not available. Install the parquet extra: '
+            "pip install 'find-your-okved-game[parquet]'"
+        )
+
+
+class MissingPhoneColumnError(ValueError):
+    def __init__(self, column: str):
+        self.column = column
+        message = 'There is no column with phones in the csv header: {column}'.format(column=column)
+        super().__init__(message)
+
+
+def open_input(path: str) -> contextlib.AbstractContextManager[IO[str]]:
+    if path == STDIO_PATH:
+        return contextlib.nullcontext(sys.stdin)
+    return open(path, encoding='utf-8', newline='')
+
+
+def open_output(path: str, binary: bool = False) -> contextlib.AbstractContextManager[IO]:
+    if path == STDIO_PATH:
+        return contextlib.nullcontext(sys.stdout.buffer if binary else sys.stdout)
+    if binary:
+        return open(path, 'wb', buffering=OUTPUT_BUFFER_SIZE)
+    return open(path, 'w', encoding='utf-8', newline='', buffering=OUTPUT_BUFFER_SIZE)
+
+
+def is_binary_output_format(output_format: OutputFormat) -> bool:
+    return output_format is OutputFormat.parquet
+
+
+def is_parquet_available() -> bool:
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def read_phones(
+    input_file: Iterable[str],
+    column: str | None = None,
+    fieldnames: list[str] | None = None,
+) -> Iterator[str]:
+    if column is None:
+        for line in input_file:
+            raw_phone = line.rstrip('\r\n')
+            if raw_phone:
+                yield raw_phone
+        return
+
+    reader = csv.DictReader(input_file, fieldnames=fieldnames)
+    if reader.fieldnames is None or column not in reader.fieldnames:
+        raise MissingPhoneColumnError(column=column)
+    for row in reader:
+        yield row[column]
+
+
+def form_result_record(
+    raw_phone: str,
+    normalized_phone: str | None,
+    matching_okved_data: dict | None,
+    error_message: str,
+) -> dict:
+    record = {
+        'phone': raw_phone,
+        'normalized_phone': normalized_phone or '',
+        'okved': '',
+        'title': '',
+        'matches_count': None,
+        'complete_match': None,
+        'error': error_message,
+    }
+    if not normalized_phone:
+        return record
+
+    if matching_okved_data is None:
+        record['error'] = OKVED_LOAD_FAILED_ERROR
+        return record
+
+    record['okved'] = matching_okved_data['okved']
+    record['title'] = matching_okved_data['title']
+    record['matches_count'] = matching_okved_data['matches_count']
+    record['complete_match'] = matching_okved_data['complete_match']
+    return record
+
+
+def write_results(
+    results: Iterable[Tuple[str, str | None, dict | None, str]],
+    output_file: IO,
+    output_format: OutputFormat,
+    write_header: bool = True,
+) -> int:
+    # Результаты не собираются целиком: порция формируется, пока читаются номера, и сразу уходит в файл;
+    if output_format is OutputFormat.parquet:
+        return _write_results_to_parquet(results, output_file)
+
+    written_count = 0
+    results = iter(results)
+    if output_format is OutputFormat.csv:
+        chunk_buffer = io.StringIO()
+        writer = csv.DictWriter(chunk_buffer, fieldnames=RESULT_FIELDS)
+        if write_header:
+            writer.writeheader()
+        while results_chunk := list(islice(results, RESULT_WRITE_CHUNK_SIZE)):
+            writer.writerows(form_result_record(*result) for result in results_chunk)
+            output_file.write(chunk_buffer.getvalue())
+            chunk_buffer.seek(0)
+            chunk_buffer.truncate()
+            written_count += len(results_chunk)
+        # Заголовок пишется, даже если номеров не было;
+        if chunk_buffer.tell():
+            output_file.write(chunk_buffer.getvalue())
+    else:
+        while results_chunk := list(islice(results, RESULT_WRITE_CHUNK_SIZE)):
+            output_file.write(
+                ''.join(_JSON_ENCODER.encode(form_result_record(*result)) + '\n' for result in results_chunk)
+            )
+            written_count += len(results_chunk)
+
+    return written_count
+
+
+def _write_results_to_parquet(
+    results: Iterable[Tuple[str, str | None, dict | None, str]], output_file: IO[bytes]
+) -> int:
+    if not is_parquet_available():
+        raise ParquetNotAvailableError()
+
+    # pyarrow импортируется только при выводе в parquet;
+    import pyarrow
+    import pyarrow.parquet
+
+    schema = pyarrow.schema(
+        [
+            ('phone', pyarrow.string()),
+            ('normalized_phone', pyarrow.string()),
+            ('okved', pyarrow.string()),
+            ('title', pyarrow.string()),
+            ('matches_count', pyarrow.int32()),
+            ('complete_match', pyarrow.bool_()),
+            ('error', pyarrow.string()),
+        ]
+    )
+    written_count = 0
+    results = iter(results)
+    with pyarrow.parquet.ParquetWriter(output_file, schema) as writer:
+        # Каждая порция - отдельная группа строк parquet, поэтому память не растёт с размером входа;
+        while results_chunk := list(islice(results, PARQUET_ROW_GROUP_SIZE)):
+            records = [form_result_record(*result) for result in results_chunk]
+            columns = {field: [record[field] for record in records] for field in RESULT_FIELDS}
+            writer.write_table(pyarrow.Table.from_pydict(columns, schema=schema))
+            written_count += len(results_chunk)
+    return written_count
@@ -0,0 +1,228 @@
+import platform
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+from src.repositories.cache import CacheRepository
+from src.services.matching import find_matching_okved_code
+from src.services.matching_engine import MatchingEngine, create_okved_batch_matcher
+from src.services.okved import OkvedService, normalize_phone, normalize_phones, try_normalize_phone
+from src.services.okved_index import build_okved_index
+from src.services.okved_index_codec import dump_okved_index, load_okved_index
+
+BENCH_ETAG = 'bench_etag'
+
+PHONE_TEMPLATES = (
+    '+7{code}{head}{middle}{tail}',
+    '8{code}{head}{middle}{tail}',
+    '+7 ({code}) {head}-{middle}-{tail}',
+    '8-{code}-{head}-{middle}-{tail}',
+    'тел.: +7 {code} {head} {middle} {tail}',
+    '00+7{code}{head}{middle}{tail}',
+    '  8 ({code}) {head}{middle}{tail}  ',
+)
+
+
+class _StubGithubClient:
+    def __init__(self, okved_codes: list[dict]):
+        self._okved_codes = okved_codes
+
+    def check_okved_json_etag(self, cached_etag: str | None) -> str | None:
+        if cached_etag == BENCH_ETAG:
+            return None
+        return BENCH_ETAG
+
+    def is_etag_check_succeeded(self) -> bool:
+        return True
+
+    def load_okved_json(self) -> list[dict]:
+        return self._okved_codes
+
+
+def generate_okved_codes(
+    rnd: random.Random, sections_count: int, depth: int, width: int, letter_codes_share: float = 0.0
+) -> list[dict]:
+    okved_codes = []
+    for section_number in range(sections_count):
+        section = {
+            'code': 'Раздел {letter}'.format(letter=chr(ord('A') + section_number % 26)),
+            'name': 'Раздел {number}'.format(number=section_number),
+            'items': [],
+        }
+        _fill_okved_items(
+            rnd, parent=section, prefix='', depth=depth, width=width, letter_codes_share=letter_codes_share
+        )
+        okved_codes.append(section)
+    return okved_codes
+
+
+def generate_phones(rnd: random.Random, count: int, invalid_share: float) -> list[str]:
+    phones = []
+    for _ in range(count):
+        code = '9{digits}'.format(digits=_random_digits(rnd, 2))
+        if rnd.random() < invalid_share:
+            # Неправильное число цифр, код страны или вторая цифра;
+            code = rnd.choice(('9{digits}'.format(digits=_random_digits(rnd, 1)), '4{digits}'.format(digits=code[1:])))
+        phones.append(
+            rnd.choice(PHONE_TEMPLATES).format(
+                code=code,
+                head=_random_digits(rnd, 3),
+                middle=_random_digits(rnd, 2),
+                tail=_random_digits(rnd, 2),
+            )
+        )
+    return phones
+
+
+def run_benchmarks(
+    sections_count: int = 21,
+    depth: int = 4,
+    width: int = 6,
+    phones_count: int = 10000,
+    invalid_share: float = 0.1,
+    repeat: int = 5,
+    seed: int = 0,
+) -> dict:
+    rnd = random.Random(seed)
+    okved_codes = generate_okved_codes(rnd, sections_count=sections_count, depth=depth, width=width)
+    phones = generate_phones(rnd, count=phones_count, invalid_share=invalid_share)
+    normalized_phones = [phone for phone, _ in normalize_phones(phones) if phone]
+    # Эталонный поиск обходит всё дерево на каждый номер, поэтому для него берётся часть номеров;
+    reference_phones = normalized_phones[: max(1, len(normalized_phones) // 20)]
+    okved_index = build_okved_index(okved_codes)
+
+    results = {}
+
+    def bench(name: str, operations_count: int, func: Callable[[], object]) -> None:
+        results[name] = _measure(func, operations_count=operations_count, repeat=repeat)
+
+    bench('normalize_phone', len(phones), lambda: [_normalize_phone_or_none(phone) for phone in phones])
+    bench('try_normalize_phone', len(phones), lambda: [try_normalize_phone(phone) for phone in phones])
+    bench('normalize_phones', len(phones), lambda: list(normalize_phones(phones)))
+
+    bench(
+        'find_matching_okved_code.reference',
+        len(reference_phones),
+        lambda: [find_matching_okved_code(phone=phone, okved_codes=okved_codes) for phone in reference_phones],
+    )
+    bench(
+        'find_matching_okved_code.index',
+        len(normalized_phones),
+        lambda: [okved_index.find_matching_okved_code(phone=phone) for phone in normalized_phones],
+    )
+    numpy_matcher = create_okved_batch_matcher(okved_index=okved_index, engine=MatchingEngine.numpy)
+    if numpy_matcher is not okved_index:
+        bench(
+            'find_matching_okved_codes.numpy',
+            len(normalized_phones),
+            lambda: numpy_matcher.find_matching_okved_codes(normalized_phones),
+        )
+
+    with tempfile.TemporaryDirectory(prefix='okved-bench-') as cache_dir:
+        cache_repo = CacheRepository(
+            etag_cache_path=str(Path(cache_dir) / 'etag_cache.json'),
+            okved_json_cache_path=str(Path(cache_dir) / 'okved.json'),
+        )
+        okved_index_data = dump_okved_index(BENCH_ETAG, okved_index)
+
+        bench(
+            'cache.save_okved_snapshot_to_manifest',
+            1,
+            lambda: cache_repo.save_okved_snapshot_to_manifest(etag=BENCH_ETAG, okved_codes=okved_codes),
+        )
+        bench('cache.get_okved_snapshot_from_manifest', 1, cache_repo.get_okved_snapshot_from_manifest)
+        bench('cache.build_okved_index', 1, lambda: build_okved_index(okved_codes))
+        bench(
+            'cache.save_okved_index_to_cache',
+            1,
+            lambda: cache_repo.save_okved_index_to_cache(okved_index_data=okved_index_data),
+        )
+        bench(
+            'cache.load_okved_index_from_cache', 1, lambda: load_okved_index(cache_repo.open_okved_index_from_cache())
+        )
+
+        github_client = _StubGithubClient(okved_codes=okved_codes)
+        bench(
+            'okved_service.get_okved.cold',
+            1,
+            lambda: OkvedService(github_client=github_client, cache_repo=cache_repo).get_okved(phones[0]),
+        )
+        okved_service = OkvedService(
+            github_client=github_client,
+            cache_repo=cache_repo,
+            revalidate_interval=float('inf'),
+        )
+        okved_service.warm_up()
+        bench('okved_service.get_okved.warm', len(phones), lambda: [okved_service.get_okved(phone) for phone in phones])
+        bench('okved_service.get_okved_batch', len(phones), lambda: list(okved_service.get_okved_batch(phones)))
+
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'machine': platform.machine(),
+            'system': platform.system(),
+        },
+        'parameters': {
+            'sections_count': sections_count,
+            'depth': depth,
+            'width': width,
+            'okved_codes_count': len(okved_index),
+            'phones_count': phones_count,
+            'invalid_share': invalid_share,
+            'repeat': repeat,
+            'seed': seed,
+        },
+        'results': results,
+    }
+
+
+def _measure(func: Callable[[], object], operations_count: int, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started_at)
+
+    return {
+        'operations': operations_count,
+        'repeat': repeat,
+        'min_s': min(timings),
+        'median_s': statistics.median(timings),
+        'mean_s': statistics.fmean(timings),
+        'per_operation_us': min(timings) / max(operations_count, 1) * 1e6,
+    }
+
+
+def _normalize_phone_or_none(phone: str) -> str | None:
+    try:
+        return normalize_phone(sequence=phone)
+    except ValueError:
+        return None
+
+
+def _fill_okved_items(
+    rnd: random.Random, parent: dict, prefix: str, depth: int, width: int, letter_codes_share: float
+) -> None:
+    if not depth:
+        return
+    for _ in range(rnd.randint(1, width)):
+        part = _random_digits(rnd, 2) if not prefix else _random_digits(rnd, rnd.randint(1, 2))
+        code = '{prefix}.{part}'.format(prefix=prefix, part=part) if prefix else part
+        # Коды с буквами в реестре встречаются редко, но поиск должен их пропускать;
+        if letter_codes_share and rnd.random() < letter_codes_share:
+            code = 'X{code}'.format(code=code)
+        node = {'code': code, 'name': 'Вид деятельности {code}'.format(code=code)}
+        if depth > 1:
+            node['items'] = []
+            _fill_okved_items(
+                rnd, parent=node, prefix=code, depth=depth - 1, width=width, letter_codes_share=letter_codes_share
+            )
+        parent['items'].append(node)
+
+
+def _random_digits(rnd: random.Random, count: int) -> str:
+    return ''.join(rnd.choice('0123456789') for _ in range(count))
@@ -1,17 +1,38 @@
+import json
 import logging
 
 import typer
 
-from src.deps import get_okved_service
+# Зависимости команд (настройки, httpx, asyncio, numpy) импортируются внутри команд, чтобы не замедлять запуск;
+from src.commands.batch_io import (
+    STDIO_PATH,
+    MissingPhoneColumnError,
+    OutputFormat,
+    is_binary_output_format,
+    is_parquet_available,
+    open_input,
+    open_output,
+    read_phones,
+    write_results,
+)
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
 
 app = typer.Typer()
 
 GREETINGS_TEMPLATE = """Вас приветствует утилита "Найди свой ОКВЭД по номеру телефона".
 'Вы передали номер телефона: {phone}"""
 
+STDIN_WITH_WORKERS_MSG = 'Параллельная обработка возможна только для файла, а не для стандартного ввода.'
+
+PARQUET_WITH_WORKERS_MSG = 'Параллельная обработка не поддерживает вывод в parquet.'
+
+PARQUET_NOT_AVAILABLE_MSG = 'Для вывода в parquet установите пакет pyarrow.'
+
+PREFORK_NOT_AVAILABLE_MSG = 'Несколько воркеров сервера можно запустить только в системе с fork.'
+
+TOP_WITH_FORMAT_MSG = 'Несколько лучших ОКВЭД выводятся только текстом, без опции --format.'
+
 PHONE_NORMALIZATION_ERROR_TMP = 'Произошла ошибка нормализации телефонного номера:\n{phone_err};'
 
 COMPLETE_MATCH_MSG_TEMPLATE = """Найден ОКВЭД, все цифры которого ({code_len}) совпадают с концевыми цифрами номера.
@@ -31,21 +52,205 @@ NO_MATCH_MSG_TEMPLATE = """Не найдено ни одного совпада
 Название: {title}.
 """
 
+TOP_OKVED_HEADER_TEMPLATE = 'Лучшие ОКВЭД для номера {phone} (равные по числу совпадений показаны все):'
+
+TOP_OKVED_LINE_TEMPLATE = '{rank}. ОКВЭД: {code}; совпало цифр: {code_len}{complete}; название: {title}.'
+
+TOP_OKVED_COMPLETE_MATCH_MARK = ', полное совпадение'
+
 OKVED_LOAD_FAILED_MSG = """Увы. Нам не удалось загрузить коды ОКВЭД ни из удалённого реестра, ни из локального кэша.
 Пожалуйста, попробуйте повторить свой запрос чуть позже."""
 
 
+@app.callback()
+def configure_logging():
+    logging.basicConfig(level=logging.INFO)
+
+
 @app.command('phone')
-def main(phone: str = typer.Argument('+79000000000')):
+def main(
+    phone: str = typer.Argument('+79000000000'),
+    offline: bool = typer.Option(False, '--offline'),
+    top: int = typer.Option(1, '--top', min=1),
+    output_format: OutputFormat | None = typer.Option(None, '--format'),
+):
+    from src.deps import get_okved_service
+
+    if output_format is not None:
+        if top > 1:
+            typer.echo(TOP_WITH_FORMAT_MSG, err=True)
+            raise typer.Exit(code=1)
+        _check_output_format_available(output_format)
+
+        # В машиночитаемом виде выводится только запись результата, без приветствия;
+        okved_service = get_okved_service(offline=offline, with_result_cache=True)
+        result = (phone, *okved_service.get_okved(raw_phone_number=phone))
+        okved_service.save_result_cache()
+        with open_output(STDIO_PATH, binary=is_binary_output_format(output_format)) as output_file:
+            write_results([result], output_file, output_format)
+        return
+
     typer.echo(GREETINGS_TEMPLATE.format(phone=phone))
 
-    okved_service = get_okved_service()
+    if top > 1:
+        okved_service = get_okved_service(offline=offline)
+        normalized_phone, top_okved_codes, normalization_error = okved_service.get_top_okved(
+            raw_phone_number=phone,
+            k=top,
+        )
+        typer.echo(form_top_okved_message(normalized_phone, top_okved_codes, normalization_error))
+        return
+
+    okved_service = get_okved_service(offline=offline, with_result_cache=True)
 
     normalized_phone, matching_okved_data, normalization_error = okved_service.get_okved(raw_phone_number=phone)
+    okved_service.save_result_cache()
     resulting_message = form_resulting_message(normalized_phone, matching_okved_data, normalization_error)
     typer.echo(resulting_message)
 
 
+@app.command('phones')
+def process_phones(
+    input_path: str = typer.Argument('-'),
+    column: str | None = typer.Option(None, '--column'),
+    output_path: str = typer.Option('-', '--output'),
+    output_format: OutputFormat = typer.Option(OutputFormat.csv, '--format'),
+    workers: int = typer.Option(1, '--workers', min=1),
+    offline: bool = typer.Option(False, '--offline'),
+):
+    from src.deps import get_okved_service
+
+    _check_output_format_available(output_format)
+    okved_service = get_okved_service(offline=offline)
+
+    if workers > 1:
+        if input_path == STDIO_PATH:
+            typer.echo(STDIN_WITH_WORKERS_MSG, err=True)
+            raise typer.Exit(code=1)
+        if is_binary_output_format(output_format):
+            # Файл parquet нельзя склеить из частей, записанных воркерами;
+            typer.echo(PARQUET_WITH_WORKERS_MSG, err=True)
+            raise typer.Exit(code=1)
+
+        from src.commands.sharded_batch import run_sharded_batch
+        from src.deps import get_cache_repo, get_matching_engine
+
+        try:
+            processed_count = run_sharded_batch(
+                okved_service=okved_service,
+                cache_repo=get_cache_repo(),
+                input_path=input_path,
+                output_path=output_path,
+                output_format=output_format,
+                column=column,
+                workers=workers,
+                matching_engine=get_matching_engine(),
+            )
+        except MissingPhoneColumnError as exc:
+            typer.echo(exc, err=True)
+            raise typer.Exit(code=1)
+        logger.info('Обработано номеров: %s', processed_count)
+        return
+
+    with (
+        open_input(input_path) as input_file,
+        open_output(output_path, binary=is_binary_output_format(output_format)) as output_file,
+    ):
+        raw_phones = read_phones(input_file, column=column)
+        try:
+            processed_count = write_results(okved_service.get_okved_batch(raw_phones), output_file, output_format)
+        except MissingPhoneColumnError as exc:
+            typer.echo(exc, err=True)
+            raise typer.Exit(code=1)
+
+    logger.info('Обработано номеров: %s', processed_count)
+
+
+@app.command('serve')
+def serve(
+    host: str | None = typer.Option(None, '--host'),
+    port: int | None = typer.Option(None, '--port'),
+    workers: int | None = typer.Option(None, '--workers', min=1),
+):
+    import asyncio
+    import os
+
+    from src import settings
+    from src.deps import get_okved_http_server, get_okved_prefork_server
+
+    workers = workers or settings.SERVER_SETTINGS.workers
+    if workers > 1:
+        if not hasattr(os, 'fork'):
+            typer.echo(PREFORK_NOT_AVAILABLE_MSG, err=True)
+            raise typer.Exit(code=1)
+        okved_prefork_server = get_okved_prefork_server(host=host, port=port, workers=workers)
+        try:
+            okved_prefork_server.serve_forever()
+        except KeyboardInterrupt:
+            logger.info('Сервер остановлен.')
+        return
+
+    okved_http_server = get_okved_http_server(host=host, port=port)
+    try:
+        asyncio.run(okved_http_server.serve_forever())
+    except KeyboardInterrupt:
+        logger.info('Сервер остановлен.')
+
+
+@app.command('bench')
+def bench(
+    sections_count: int = typer.Option(21, '--sections', min=1),
+    depth: int = typer.Option(4, '--depth', min=1),
+    width: int = typer.Option(6, '--width', min=1),
+    phones_count: int = typer.Option(10000, '--phones', min=1),
+    invalid_share: float = typer.Option(0.1, '--invalid-share', min=0, max=1),
+    repeat: int = typer.Option(5, '--repeat', min=1),
+    seed: int = typer.Option(0, '--seed'),
+    output_path: str = typer.Option('-', '--output'),
+):
+    from src.commands.bench import run_benchmarks
+
+    bench_results = run_benchmarks(
+        sections_count=sections_count,
+        depth=depth,
+        width=width,
+        phones_count=phones_count,
+        invalid_share=invalid_share,
+        repeat=repeat,
+        seed=seed,
+    )
+    with open_output(output_path) as output_file:
+        json.dump(bench_results, output_file, ensure_ascii=False, indent=2)
+        output_file.write('\n')
+
+
+def _check_output_format_available(output_format: OutputFormat) -> None:
+    if output_format is OutputFormat.parquet and not is_parquet_available():
+        typer.echo(PARQUET_NOT_AVAILABLE_MSG, err=True)
+        raise typer.Exit(code=1)
+
+
+def form_top_okved_message(normalized_phone: str, top_okved_codes: list[dict] | None, normalization_error) -> str:
+    if not normalized_phone:
+        return PHONE_NORMALIZATION_ERROR_TMP.format(phone_err=normalization_error)
+
+    if top_okved_codes is None:
+        return OKVED_LOAD_FAILED_MSG
+
+    lines = [TOP_OKVED_HEADER_TEMPLATE.format(phone=normalized_phone)]
+    for okved_data in top_okved_codes:
+        lines.append(
+            TOP_OKVED_LINE_TEMPLATE.format(
+                rank=okved_data['rank'],
+                code=okved_data['okved'],
+                code_len=okved_data['matches_count'],
+                complete=TOP_OKVED_COMPLETE_MATCH_MARK if okved_data['complete_match'] else '',
+                title=okved_data['title'],
+            )
+        )
+    return '\n'.join(lines)
+
+
 def form_resulting_message(normalized_phone: str, matching_okved_data, normalization_error) -> str:
     if not normalized_phone:
         return PHONE_NORMALIZATION_ERROR_TMP.format(phone_err=normalization_error)
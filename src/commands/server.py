@@ -0,0 +1,330 @@
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import signal
+import socket
+from functools import partial
+from http import HTTPStatus
+from typing import Callable, NoReturn, Tuple
+from urllib.parse import unquote, urlsplit
+
+from src.commands.batch_io import form_result_record
+from src.services.metrics import PrometheusMetrics
+from src.services.okved import OkvedService
+from src.services.refresher import OkvedSnapshotRefresher
+
+logger = logging.getLogger(__name__)
+
+MAX_REQUEST_BODY_SIZE = 16 * 1024 * 1024
+MAX_HEADERS_COUNT = 100
+
+OKVED_PATH = '/okved'
+OKVED_BATCH_PATH = '/okved/batch'
+METRICS_PATH = '/metrics'
+
+JSON_CONTENT_TYPE = 'application/json; charset=utf-8'
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class BadRequestError(ValueError): ...
+
+
+class OkvedHttpServer:
+    def __init__(
+        self,
+        okved_service: OkvedService,
+        host: str,
+        port: int,
+        metrics: PrometheusMetrics | None = None,
+        refresher: OkvedSnapshotRefresher | None = None,
+        sock: socket.socket | None = None,
+    ):
+        self._okved_service = okved_service
+        self._host = host
+        self._port = port
+        self._metrics = metrics
+        self._refresher = refresher
+        # Воркер многопроцессного сервера принимает соединения на сокете, открытом родительским процессом;
+        self._sock = sock
+
+    async def serve_forever(self) -> None:
+        try:
+            warmed_up = self._okved_service.warm_up()
+        except Exception as exc:
+            logger.error(exc)
+            warmed_up = False
+        if not warmed_up:
+            logger.warning('Не удалось загрузить ОКВЭД при старте сервера, попробуем при первом запросе;')
+
+        if self._refresher is not None:
+            self._refresher.start()
+        try:
+            if self._sock is not None:
+                server = await asyncio.start_server(self._handle_connection, sock=self._sock)
+            else:
+                server = await asyncio.start_server(self._handle_connection, host=self._host, port=self._port)
+            logger.info('Сервер поиска ОКВЭД слушает %s:%s', self._host, self._port)
+            async with server:
+                await server.serve_forever()
+        finally:
+            if self._refresher is not None:
+                self._refresher.stop()
+
+    def handle_request(self, method: str, target: str, body: bytes) -> Tuple[HTTPStatus, dict | list | str]:
+        url = urlsplit(target)
+
+        if url.path == METRICS_PATH and self._metrics is not None:
+            if method != 'GET':
+                return HTTPStatus.METHOD_NOT_ALLOWED, {'error': 'Method not allowed'}
+            # Метрики отдаются в текстовом формате Prometheus, а не в JSON;
+            return HTTPStatus.OK, self._metrics.render()
+
+        if url.path not in (OKVED_PATH, OKVED_BATCH_PATH):
+            return HTTPStatus.NOT_FOUND, {'error': 'Not found'}
+
+        try:
+            if url.path == OKVED_PATH and method == 'GET':
+                return HTTPStatus.OK, self._get_okved(query=url.query)
+            if url.path == OKVED_BATCH_PATH and method == 'POST':
+                return HTTPStatus.OK, self._get_okved_batch(body=body)
+        except BadRequestError as exc:
+            return HTTPStatus.BAD_REQUEST, {'error': str(exc)}
+
+        return HTTPStatus.METHOD_NOT_ALLOWED, {'error': 'Method not allowed'}
+
+    def _get_okved(self, query: str) -> dict:
+        query_params = _parse_query(query)
+        if 'phone' not in query_params:
+            raise BadRequestError('Query parameter "phone" is required')
+
+        raw_phone = query_params['phone']
+        normalized_phone, matching_okved_data, error_message = self._okved_service.get_okved(raw_phone)
+        return form_result_record(raw_phone, normalized_phone, matching_okved_data, error_message)
+
+    def _get_okved_batch(self, body: bytes) -> list[dict]:
+        try:
+            payload = json.loads(body)
+        except (json.JSONDecodeError, UnicodeDecodeError) as exc:
+            raise BadRequestError('Request body is not a valid json: {error}'.format(error=exc))
+
+        raw_phones = payload.get('phones') if isinstance(payload, dict) else payload
+        if not isinstance(raw_phones, list) or not all(isinstance(phone, str) for phone in raw_phones):
+            raise BadRequestError('Request body must be a list of phones or an object with "phones" list')
+
+        return [form_result_record(*result) for result in self._okved_service.get_okved_batch(raw_phones)]
+
+    async def _dispatch_request(self, method: str, target: str, body: bytes) -> Tuple[HTTPStatus, dict | list | str]:
+        # Поиск одного номера по загруженному снимку занимает микросекунды и выполняется прямо в цикле событий.
+        # Пакеты номеров и поиски, которым сначала нужно обновить снимок, уходят в пул потоков, чтобы
+        # не задерживать остальные соединения;
+        path = urlsplit(target).path
+        if path == OKVED_BATCH_PATH or (path == OKVED_PATH and not self._okved_service.has_actual_snapshot()):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                None, partial(self.handle_request, method=method, target=target, body=body)
+            )
+        return self.handle_request(method=method, target=target, body=body)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            keep_alive = True
+            while keep_alive:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, target, version, headers, body = request
+
+                try:
+                    status, payload = await self._dispatch_request(method=method, target=target, body=body)
+                except Exception:
+                    logger.exception('Ошибка обработки запроса %s %s', method, target)
+                    status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {'error': 'Internal server error'}
+
+                keep_alive = _is_keep_alive(version=version, headers=headers)
+                writer.write(_form_response(status=status, payload=payload, keep_alive=keep_alive))
+                await writer.drain()
+        except BadRequestError as exc:
+            writer.write(_form_response(status=HTTPStatus.BAD_REQUEST, payload={'error': str(exc)}, keep_alive=False))
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+            # Клиент мог уже разорвать соединение: закрытию это не мешает;
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+
+class OkvedPreforkServer:
+    def __init__(
+        self,
+        okved_service: OkvedService,
+        create_worker_server: Callable[[socket.socket], OkvedHttpServer],
+        host: str,
+        port: int,
+        workers: int,
+        refresher: OkvedSnapshotRefresher | None = None,
+    ):
+        # Родительский процесс только загружает и публикует снимок ОКВЭД, а запросы обслуживают воркеры;
+        self._okved_service = okved_service
+        self._create_worker_server = create_worker_server
+        self._host = host
+        self._port = port
+        self._workers = workers
+        self._refresher = refresher
+
+    def serve_forever(self) -> None:
+        # Снимок публикуется до запуска воркеров, чтобы они подключились к нему, а не загружали ОКВЭД каждый сам;
+        try:
+            warmed_up = self._okved_service.warm_up()
+        except Exception as exc:
+            logger.error(exc)
+            warmed_up = False
+        if not warmed_up:
+            logger.warning('Не удалось загрузить ОКВЭД до запуска воркеров, попробуем при следующем обновлении;')
+
+        worker_pids = []
+        try:
+            with socket.create_server((self._host, self._port)) as sock:
+                for _ in range(self._workers):
+                    worker_pid = os.fork()
+                    if not worker_pid:
+                        _run_worker_server(self._create_worker_server, sock)
+                    worker_pids.append(worker_pid)
+            # Сигнал остановки родительскому процессу останавливает и воркеров, а не оставляет их без присмотра;
+            signal.signal(signal.SIGTERM, _interrupt_on_signal)
+            logger.info('Сервер поиска ОКВЭД слушает %s:%s, воркеров: %s', self._host, self._port, len(worker_pids))
+
+            if self._refresher is not None:
+                self._refresher.start()
+            _wait_worker_servers(worker_pids)
+        finally:
+            _stop_worker_servers(worker_pids)
+            if self._refresher is not None:
+                self._refresher.stop()
+
+
+def _run_worker_server(
+    create_worker_server: Callable[[socket.socket], OkvedHttpServer], sock: socket.socket
+) -> NoReturn:
+    exit_code = 0
+    try:
+        asyncio.run(create_worker_server(sock).serve_forever())
+    except KeyboardInterrupt:
+        pass
+    except Exception:
+        logger.exception('Воркер сервера ОКВЭД завершился с ошибкой;')
+        exit_code = 1
+    finally:
+        # Воркер не возвращается в код родительского процесса, который вызвал fork;
+        os._exit(exit_code)
+
+
+def _interrupt_on_signal(signum: int, frame) -> NoReturn:
+    raise KeyboardInterrupt()
+
+
+def _wait_worker_servers(worker_pids: list[int]) -> None:
+    while worker_pids:
+        worker_pid, status = os.wait()
+        if worker_pid in worker_pids:
+            worker_pids.remove(worker_pid)
+            logger.warning('Воркер сервера ОКВЭД %s завершился, код %s;', worker_pid, os.waitstatus_to_exitcode(status))
+
+
+def _stop_worker_servers(worker_pids: list[int]) -> None:
+    for worker_pid in worker_pids:
+        try:
+            os.kill(worker_pid, signal.SIGTERM)
+        except ProcessLookupError:
+            continue
+    for worker_pid in worker_pids:
+        try:
+            os.waitpid(worker_pid, 0)
+        except ChildProcessError:
+            continue
+    worker_pids.clear()
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Tuple[str, str, str, dict[str, str], bytes] | None:
+    request_line = await _read_line(reader)
+    if not request_line.strip():
+        return None
+
+    try:
+        method, target, version = request_line.decode('latin-1').split()
+    except ValueError:
+        raise BadRequestError('Malformed request line')
+
+    headers = {}
+    while True:
+        header_line = await _read_line(reader)
+        if header_line in (b'\r\n', b'\n', b''):
+            break
+        if len(headers) >= MAX_HEADERS_COUNT:
+            raise BadRequestError('Too many headers')
+        name, _, value = header_line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        content_length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise BadRequestError('Malformed Content-Length header')
+    if content_length < 0 or content_length > MAX_REQUEST_BODY_SIZE:
+        raise BadRequestError('Unacceptable Content-Length: {length}'.format(length=content_length))
+
+    body = b''
+    if content_length:
+        body = await reader.readexactly(content_length)
+
+    return method, target, version, headers, body
+
+
+async def _read_line(reader: asyncio.StreamReader) -> bytes:
+    try:
+        return await reader.readline()
+    except ValueError:
+        raise BadRequestError('Request line or header is too long')
+
+
+def _parse_query(query: str) -> dict[str, str]:
+    # Значения не декодируются через unquote_plus, чтобы знак плюс в номере телефона не превращался в пробел;
+    query_params = {}
+    for pair in query.split('&'):
+        if not pair:
+            continue
+        name, _, value = pair.partition('=')
+        query_params[unquote(name)] = unquote(value)
+    return query_params
+
+
+def _is_keep_alive(version: str, headers: dict[str, str]) -> bool:
+    connection = headers.get('connection', '').lower()
+    if version == 'HTTP/1.0':
+        return connection == 'keep-alive'
+    return connection != 'close'
+
+
+def _form_response(status: HTTPStatus, payload: dict | list | str, keep_alive: bool) -> bytes:
+    if isinstance(payload, str):
+        body = payload.encode('utf-8')
+        content_type = PROMETHEUS_CONTENT_TYPE
+    else:
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        content_type = JSON_CONTENT_TYPE
+    head = (
+        'HTTP/1.1 {code} {phrase}\r\n'
+        'Content-Type: {content_type}\r\n'
+        'Content-Length: {length}\r\n'
+        'Connection: {connection}\r\n'
+        '\r\n'
+    ).format(
+        code=status.value,
+        phrase=status.phrase,
+        content_type=content_type,
+        length=len(body),
+        connection='keep-alive' if keep_alive else 'close',
+    )
+    return head.encode('latin-1') + body
@@ -0,0 +1,181 @@
+import csv
+import logging
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, Tuple
+
+from src.commands.batch_io import (
+    STDIO_PATH,
+    MissingPhoneColumnError,
+    OutputFormat,
+    open_output,
+    read_phones,
+    write_results,
+)
+from src.repositories.cache import CacheRepository
+from src.services.matching_engine import MatchingEngine
+from src.services.okved import OkvedService, load_okved_snapshot_from_cache, match_okved_batch
+from src.services.okved_index import OkvedIndex
+
+logger = logging.getLogger(__name__)
+
+SHARDS_PER_WORKER = 4
+MIN_SHARD_SIZE = 1024 * 1024
+
+_worker_okved_index: OkvedIndex | None = None
+_worker_matching_engine = MatchingEngine.python
+
+
+def run_sharded_batch(
+    okved_service: OkvedService,
+    cache_repo: CacheRepository,
+    input_path: str,
+    output_path: str,
+    output_format: OutputFormat,
+    column: str | None,
+    workers: int,
+    matching_engine: MatchingEngine = MatchingEngine.python,
+) -> int:
+    fieldnames, data_start = _read_csv_header(input_path=input_path, column=column)
+
+    # Снимок актуализируется один раз в родительском процессе, воркеры только читают его из кэша;
+    snapshot = okved_service.get_actual_snapshot()
+    snapshot_etag = snapshot.etag if snapshot is not None else None
+    snapshot_loaded = snapshot is not None and len(snapshot.okved_index) > 0
+
+    byte_ranges = split_into_line_ranges(
+        input_path=input_path,
+        data_start=data_start,
+        shards_count=workers * SHARDS_PER_WORKER,
+    )
+
+    processed_count = 0
+    output_dir = os.path.dirname(os.path.abspath(output_path)) if output_path != STDIO_PATH else None
+    with (
+        tempfile.TemporaryDirectory(dir=output_dir, prefix='.okved-shards-') as parts_dir,
+        ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(cache_repo, snapshot_etag, snapshot_loaded, matching_engine),
+        ) as executor,
+    ):
+        futures = [
+            executor.submit(
+                _process_shard,
+                input_path,
+                start,
+                end,
+                column,
+                fieldnames,
+                output_format,
+                os.path.join(parts_dir, '{number:06d}.part'.format(number=number)),
+                number == 0,
+            )
+            for number, (start, end) in enumerate(byte_ranges)
+        ]
+
+        with open_output(output_path) as output_file:
+            # Части склеиваются в порядке следования во входном файле по мере готовности;
+            for future in futures:
+                part_path, part_count = future.result()
+                with open(part_path, encoding='utf-8', newline='') as part_file:
+                    shutil.copyfileobj(part_file, output_file)
+                os.remove(part_path)
+                processed_count += part_count
+
+    return processed_count
+
+
+def split_into_line_ranges(input_path: str, data_start: int, shards_count: int) -> list[Tuple[int, int]]:
+    file_size = os.path.getsize(input_path)
+    data_size = file_size - data_start
+    shards_count = max(1, min(shards_count, data_size // MIN_SHARD_SIZE))
+
+    boundaries = [data_start]
+    with open(input_path, 'rb') as f:
+        for shard_number in range(1, shards_count):
+            approximate_start = data_start + data_size * shard_number // shards_count
+            if approximate_start <= boundaries[-1]:
+                continue
+            # Граница сдвигается на начало следующей строки, чтобы каждая строка попала ровно в одну часть;
+            f.seek(approximate_start - 1)
+            f.readline()
+            line_start = f.tell()
+            if boundaries[-1] < line_start < file_size:
+                boundaries.append(line_start)
+    boundaries.append(file_size)
+
+    return list(zip(boundaries, boundaries[1:]))
+
+
+def _read_csv_header(input_path: str, column: str | None) -> Tuple[list[str] | None, int]:
+    if column is None:
+        return None, 0
+
+    with open(input_path, 'rb') as f:
+        header_line = f.readline()
+    fieldnames = next(csv.reader([header_line.decode('utf-8')]), [])
+    if column not in fieldnames:
+        raise MissingPhoneColumnError(column=column)
+    return fieldnames, len(header_line)
+
+
+def _init_worker(
+    cache_repo: CacheRepository,
+    snapshot_etag: str | None,
+    snapshot_loaded: bool,
+    matching_engine: MatchingEngine,
+) -> None:
+    global _worker_okved_index, _worker_matching_engine
+
+    _worker_matching_engine = matching_engine
+    if not snapshot_loaded:
+        return
+
+    # Каждый воркер отображает в память бинарный индекс из кэша, а не получает его копию от родителя;
+    snapshot = load_okved_snapshot_from_cache(cache_repo=cache_repo, etag=snapshot_etag)
+    if snapshot is None:
+        logger.warning('Воркер не смог загрузить ОКВЭД из кэша;')
+        return
+    _worker_okved_index = snapshot.okved_index
+
+
+def _process_shard(
+    input_path: str,
+    start: int,
+    end: int,
+    column: str | None,
+    fieldnames: list[str] | None,
+    output_format: OutputFormat,
+    part_path: str,
+    write_header: bool,
+) -> Tuple[str, int]:
+    lines = _iterate_lines_in_range(input_path=input_path, start=start, end=end)
+    raw_phones = read_phones(lines, column=column, fieldnames=fieldnames)
+    results = match_okved_batch(
+        raw_phone_numbers=raw_phones,
+        get_okved_index=_get_worker_okved_index,
+        matching_engine=_worker_matching_engine,
+    )
+
+    with open(part_path, 'w', encoding='utf-8', newline='') as part_file:
+        part_count = write_results(results, part_file, output_format, write_header=write_header)
+
+    return part_path, part_count
+
+
+def _get_worker_okved_index() -> OkvedIndex | None:
+    return _worker_okved_index
+
+
+def _iterate_lines_in_range(input_path: str, start: int, end: int) -> Iterator[str]:
+    remaining = end - start
+    with open(input_path, 'rb') as f:
+        f.seek(start)
+        for line in f:
+            yield line.decode('utf-8')
+            remaining -= len(line)
+            if remaining <= 0:
+                break
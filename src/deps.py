@@ -1,21 +1,190 @@
-from src.clients.github import GithubClient
+from typing import TYPE_CHECKING, Tuple
+
+from src import settings
 from src.repositories.cache import CacheRepository
-from src.services.okved import OkvedService
-from src.settings import CACHE_SETTINGS, GITHUB_SETTINGS
+from src.services.matching_engine import MatchingEngine
+from src.services.okved import AsyncOkvedService, OkvedService
+from src.services.result_cache import OkvedResultCache, load_okved_result_cache_from_cache
+
+if TYPE_CHECKING:
+    import socket
+
+    from src.clients.github import GithubClient
+    from src.commands.server import OkvedHttpServer, OkvedPreforkServer
+    from src.services.metrics import PrometheusMetrics
+    from src.services.refresher import OkvedSnapshotRefresher
+
 
+def get_github_client() -> 'GithubClient':
+    # httpx импортируется только тогда, когда действительно нужен доступ к реестру;
+    from src.clients.github import GithubClient
 
-def get_github_client() -> GithubClient:
-    return GithubClient(owner=GITHUB_SETTINGS.owner, repo=GITHUB_SETTINGS.repo, file_path=GITHUB_SETTINGS.file_path)
+    return GithubClient(
+        owner=settings.GITHUB_SETTINGS.owner,
+        repo=settings.GITHUB_SETTINGS.repo,
+        file_path=settings.GITHUB_SETTINGS.file_path,
+        connect_timeout=settings.GITHUB_SETTINGS.connect_timeout,
+        read_timeout=settings.GITHUB_SETTINGS.read_timeout,
+        max_retries=settings.GITHUB_SETTINGS.max_retries,
+        backoff_factor=settings.GITHUB_SETTINGS.backoff_factor,
+        http2=settings.GITHUB_SETTINGS.http2,
+    )
 
 
 def get_cache_repo() -> CacheRepository:
     return CacheRepository(
-        etag_cache_path=CACHE_SETTINGS.etag_cache_path,
-        okved_json_cache_path=CACHE_SETTINGS.okved_json_cache_path,
+        etag_cache_path=settings.CACHE_SETTINGS.etag_cache_path,
+        okved_json_cache_path=settings.CACHE_SETTINGS.okved_json_cache_path,
+        okved_manifest_path=settings.CACHE_SETTINGS.okved_manifest_path,
+    )
+
+
+def get_okved_result_cache(cache_repo: CacheRepository | None = None) -> OkvedResultCache | None:
+    cache_settings = settings.CACHE_SETTINGS
+    if cache_settings.result_cache_size <= 0:
+        return None
+
+    persistent = cache_repo is not None and cache_settings.result_cache_persist
+    result_cache = OkvedResultCache(
+        max_size=cache_settings.result_cache_size,
+        ttl=cache_settings.result_cache_ttl,
+        persistent=persistent,
     )
+    if persistent:
+        load_okved_result_cache_from_cache(cache_repo=cache_repo, result_cache=result_cache)
+    return result_cache
 
 
-def get_okved_service() -> OkvedService:
-    github_client = get_github_client()
+def get_okved_service(offline: bool = False, with_result_cache: bool = False) -> OkvedService:
+    # В автономном режиме ОКВЭД берутся только из локального кэша, и клиент github не создаётся;
+    github_client = None if offline else get_github_client()
     cache_repo = get_cache_repo()
-    return OkvedService(github_client=github_client, cache_repo=cache_repo)
+    # Кэш результатов между запусками нужен одиночным поискам, пакетная обработка его не использует;
+    result_cache = get_okved_result_cache(cache_repo=cache_repo) if with_result_cache else None
+    return OkvedService(
+        github_client=github_client,
+        cache_repo=cache_repo,
+        revalidate_interval=settings.CACHE_SETTINGS.snapshot_revalidate_interval,
+        stale_while_revalidate=settings.CACHE_SETTINGS.snapshot_stale_while_revalidate,
+        matching_engine=get_matching_engine(),
+        result_cache=result_cache,
+        persist_result_cache=settings.CACHE_SETTINGS.result_cache_persist,
+    )
+
+
+def get_async_okved_service(offline: bool = False) -> AsyncOkvedService:
+    # Для встраивания в приложения на asyncio: синхронный сервис работает с реестром и кэшем в пуле потоков;
+    github_client = None if offline else get_github_client()
+    okved_service = OkvedService(
+        github_client=github_client,
+        cache_repo=get_cache_repo(),
+        revalidate_interval=settings.CACHE_SETTINGS.snapshot_revalidate_interval,
+        stale_while_revalidate=settings.CACHE_SETTINGS.snapshot_stale_while_revalidate,
+        matching_engine=get_matching_engine(),
+        result_cache=get_okved_result_cache(),
+    )
+    return AsyncOkvedService(okved_service=okved_service)
+
+
+def get_matching_engine() -> MatchingEngine:
+    return MatchingEngine(settings.MATCHING_SETTINGS.engine)
+
+
+def get_okved_http_server(
+    host: str | None = None,
+    port: int | None = None,
+    sock: 'socket.socket | None' = None,
+    follow_shared_snapshot: bool = False,
+) -> 'OkvedHttpServer':
+    from src.commands.server import OkvedHttpServer
+    from src.services.metrics import PrometheusMetrics
+
+    server_settings = settings.SERVER_SETTINGS
+    metrics = PrometheusMetrics()
+    refresher = None
+    if follow_shared_snapshot:
+        # Воркер не обращается к реестру: он подключается к снимку, который публикует родительский процесс;
+        okved_service = OkvedService(
+            github_client=None,
+            cache_repo=get_cache_repo(),
+            revalidate_interval=float('inf'),
+            matching_engine=get_matching_engine(),
+            metrics=metrics,
+            result_cache=get_okved_result_cache(),
+            watch_generation=True,
+        )
+    else:
+        okved_service, refresher = _get_okved_server_service(metrics=metrics)
+
+    return OkvedHttpServer(
+        okved_service=okved_service,
+        host=host or server_settings.host,
+        port=port or server_settings.port,
+        metrics=metrics,
+        refresher=refresher,
+        sock=sock,
+    )
+
+
+def get_okved_prefork_server(
+    host: str | None = None,
+    port: int | None = None,
+    workers: int | None = None,
+) -> 'OkvedPreforkServer':
+    from src.commands.server import OkvedPreforkServer
+    from src.services.refresher import OkvedSnapshotRefresher
+
+    server_settings = settings.SERVER_SETTINGS
+    okved_service = OkvedService(
+        github_client=get_github_client(),
+        cache_repo=get_cache_repo(),
+        revalidate_interval=float('inf'),
+        matching_engine=get_matching_engine(),
+    )
+    # Родительский процесс обновляет ОКВЭД по расписанию всегда: кроме него, в реестр никто не обращается;
+    refresher = OkvedSnapshotRefresher(
+        okved_service=okved_service,
+        interval=server_settings.snapshot_revalidate_interval,
+    )
+    return OkvedPreforkServer(
+        okved_service=okved_service,
+        create_worker_server=lambda sock: get_okved_http_server(
+            host=host,
+            port=port,
+            sock=sock,
+            follow_shared_snapshot=True,
+        ),
+        host=host or server_settings.host,
+        port=port or server_settings.port,
+        workers=workers or server_settings.workers,
+        refresher=refresher,
+    )
+
+
+def _get_okved_server_service(metrics: 'PrometheusMetrics') -> Tuple[OkvedService, 'OkvedSnapshotRefresher | None']:
+    from src.services.refresher import OkvedSnapshotRefresher
+
+    server_settings = settings.SERVER_SETTINGS
+    refresher = None
+    if server_settings.background_refresh:
+        # etag проверяется фоновым потоком по расписанию, и поиски никогда не ждут загрузки реестра;
+        revalidate_interval = float('inf')
+    else:
+        # Сервер обслуживает запросы по снимку ОКВЭД в памяти, а актуальность etag проверяется в фоне;
+        revalidate_interval = server_settings.snapshot_revalidate_interval
+
+    okved_service = OkvedService(
+        github_client=get_github_client(),
+        cache_repo=get_cache_repo(),
+        revalidate_interval=revalidate_interval,
+        stale_while_revalidate=True,
+        matching_engine=get_matching_engine(),
+        metrics=metrics,
+        result_cache=get_okved_result_cache(),
+    )
+    if server_settings.background_refresh:
+        refresher = OkvedSnapshotRefresher(
+            okved_service=okved_service,
+            interval=server_settings.snapshot_revalidate_interval,
+        )
+    return okved_service, refresher
@@ -1,18 +1,268 @@
+import hashlib
 import json
 import logging
+import mmap
+import os
+import struct
+import tempfile
+from contextlib import contextmanager
 from pathlib import Path
+from typing import BinaryIO, Iterator, Tuple
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
+
+
+MANIFEST_VERSION = 1
+
+# Номер поколения опубликованного снимка ОКВЭД: беззнаковое 8-байтовое целое в начале файла;
+_GENERATION = struct.Struct('<Q')
 
 
 class CantSaveJsonError(Exception): ...
 
 
 class CacheRepository:
-    def __init__(self, etag_cache_path: str, okved_json_cache_path: str):
+    def __init__(
+        self,
+        etag_cache_path: str,
+        okved_json_cache_path: str,
+        okved_manifest_path: str | None = None,
+        okved_index_path: str | None = None,
+        okved_lock_path: str | None = None,
+        okved_results_path: str | None = None,
+        okved_changes_path: str | None = None,
+        okved_generation_path: str | None = None,
+    ):
         self._etag_cache_path = etag_cache_path
         self._okved_json_cache_path = okved_json_cache_path
+        if okved_manifest_path is None:
+            okved_manifest_path = str(Path(okved_json_cache_path).with_suffix('.manifest.jsonl'))
+        self._okved_manifest_path = okved_manifest_path
+        if okved_index_path is None:
+            okved_index_path = str(Path(okved_json_cache_path).with_suffix('.index.bin'))
+        self._okved_index_path = okved_index_path
+        if okved_lock_path is None:
+            okved_lock_path = str(Path(okved_json_cache_path).with_suffix('.lock'))
+        self._okved_lock_path = okved_lock_path
+        if okved_results_path is None:
+            okved_results_path = str(Path(okved_json_cache_path).with_suffix('.results.jsonl'))
+        self._okved_results_path = okved_results_path
+        if okved_changes_path is None:
+            okved_changes_path = str(Path(okved_json_cache_path).with_suffix('.changes.jsonl'))
+        self._okved_changes_path = okved_changes_path
+        if okved_generation_path is None:
+            okved_generation_path = str(Path(okved_json_cache_path).with_suffix('.generation'))
+        self._okved_generation_path = okved_generation_path
+        self._okved_generation_map: mmap.mmap | None = None
+
+    @contextmanager
+    def lock_okved_refresh(self) -> Iterator[None]:
+        # Блокировка на файле общая для всех процессов на хосте: кэш обновляет только её держатель, остальные ждут;
+        lock_file = _open_lock_file(Path(self._okved_lock_path))
+        if lock_file is None:
+            yield
+            return
+
+        with lock_file:
+            _lock_file(lock_file)
+            try:
+                yield
+            finally:
+                _unlock_file(lock_file)
+
+    def get_okved_refreshed_at(self) -> float | None:
+        lock_file = Path(self._okved_lock_path)
+        if not lock_file.exists():
+            return None
+
+        try:
+            refreshed_at = lock_file.read_text()
+            return float(refreshed_at) if refreshed_at else None
+        except (OSError, ValueError) as exc:
+            logger.warning(exc)
+            return None
+
+    def save_okved_refreshed_at(self, refreshed_at: float) -> None:
+        # Время пишется в файл блокировки под самой блокировкой, поэтому его не читают наполовину записанным;
+        try:
+            Path(self._okved_lock_path).write_text(repr(refreshed_at))
+        except OSError as exc:
+            logger.warning(exc)
+
+    def get_okved_generation(self) -> int:
+        # Поколение читается из отображения файла в память, поэтому проверку можно делать на каждый поиск;
+        generation_map = self._okved_generation_map
+        if generation_map is None:
+            generation_map = self._okved_generation_map = _open_generation_map(Path(self._okved_generation_path))
+            if generation_map is None:
+                return 0
+        return _GENERATION.unpack_from(generation_map, 0)[0]
+
+    def bump_okved_generation(self) -> int:
+        # Вызывается под блокировкой обновления после публикации нового индекса, поэтому гонок между писателями нет;
+        generation_file = Path(self._okved_generation_path)
+        try:
+            generation_file.parent.mkdir(parents=True, exist_ok=True)
+            generation_file.touch(exist_ok=True)
+            with generation_file.open('r+b') as f:
+                data = f.read(_GENERATION.size)
+                generation = _GENERATION.unpack(data)[0] + 1 if len(data) == _GENERATION.size else 1
+                f.seek(0)
+                f.write(_GENERATION.pack(generation))
+        except OSError as exc:
+            logger.warning(exc)
+            return self.get_okved_generation()
+        return generation
+
+    def open_okved_index_from_cache(self) -> mmap.mmap | None:
+        index_file = Path(self._okved_index_path)
+        if not index_file.exists():
+            return None
+
+        try:
+            with index_file.open('rb') as f:
+                # Отображение остаётся действительным и после закрытия файла;
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as exc:
+            logger.warning(exc)
+            return None
+
+    def save_okved_index_to_cache(self, okved_index_data: bytes) -> None:
+        _try_save_bytes_atomically(file_path=Path(self._okved_index_path), data=okved_index_data)
+
+    def get_okved_results_from_cache(self) -> list[list] | None:
+        results_cache = Path(self._okved_results_path)
+        if not results_cache.exists():
+            return None
+
+        okved_results = []
+        try:
+            with results_cache.open('rb') as f:
+                for line in f:
+                    try:
+                        okved_results.append(json.loads(line))
+                    except (json.JSONDecodeError, UnicodeDecodeError) as exc:
+                        # Недописанная при сбое последняя строка пропускается;
+                        logger.warning(exc)
+        except OSError as exc:
+            logger.warning(exc)
+            return None
+        return okved_results
+
+    def append_okved_results_to_cache(self, okved_results: list[list]) -> None:
+        # Результаты только дописываются в конец файла: при загрузке более поздняя строка заменяет более раннюю;
+        file_path = Path(self._okved_results_path)
+        try:
+            lines = b''.join(_dump_compact_json(okved_result) + b'\n' for okved_result in okved_results)
+        except (TypeError, ValueError) as exc:
+            logger.error(exc)
+            raise CantSaveJsonError()
+
+        try:
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            with file_path.open('ab') as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError as exc:
+            logger.error(exc)
+            raise CantSaveJsonError()
+
+    def save_okved_results_to_cache(self, okved_results: list[list]) -> None:
+        # Файл переписывается целиком, только когда дописанных строк накопилось слишком много;
+        try:
+            data = b''.join(_dump_compact_json(okved_result) + b'\n' for okved_result in okved_results)
+        except (TypeError, ValueError) as exc:
+            logger.error(exc)
+            raise CantSaveJsonError()
+        _try_save_bytes_atomically(file_path=Path(self._okved_results_path), data=data)
+
+    def append_okved_change_to_log(self, change_record: dict) -> None:
+        # Журнал только дописывается: каждая строка - одно изменение реестра, которое потребители применяют по порядку;
+        file_path = Path(self._okved_changes_path)
+        try:
+            line = _dump_compact_json(change_record) + b'\n'
+        except (TypeError, ValueError) as exc:
+            logger.error(exc)
+            raise CantSaveJsonError()
+
+        try:
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            with file_path.open('ab') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError as exc:
+            logger.error(exc)
+            raise CantSaveJsonError()
+
+    def get_okved_changes_from_log(self) -> list[dict]:
+        changes_log = Path(self._okved_changes_path)
+        if not changes_log.exists():
+            return []
+
+        change_records = []
+        try:
+            with changes_log.open('rb') as f:
+                for line in f:
+                    try:
+                        change_records.append(json.loads(line))
+                    except (json.JSONDecodeError, UnicodeDecodeError) as exc:
+                        # Недописанная при сбое последняя строка пропускается;
+                        logger.warning(exc)
+        except OSError as exc:
+            logger.warning(exc)
+        return change_records
+
+    def get_okved_etag_from_manifest(self) -> str | None:
+        header = _read_manifest_header(Path(self._okved_manifest_path))
+        if header is None:
+            return None
+        return header['etag']
+
+    def get_okved_snapshot_from_manifest(self) -> Tuple[str | None, list[dict]] | None:
+        manifest = Path(self._okved_manifest_path)
+        if not manifest.exists():
+            return None
+
+        try:
+            with manifest.open('rb') as f:
+                header = _parse_manifest_header(f.readline())
+                payload = f.read()
+        except OSError as exc:
+            logger.warning(exc)
+            return None
+
+        if header is None:
+            return None
+
+        if len(payload) != header['size'] or hashlib.sha256(payload).hexdigest() != header['sha256']:
+            logger.warning('Checksum mismatch in okved cache manifest')
+            return None
+
+        try:
+            okved_codes = json.loads(payload)
+        except (json.JSONDecodeError, UnicodeDecodeError) as exc:
+            logger.warning(exc)
+            return None
+
+        if type(okved_codes) is not list:
+            logger.warning('Wrong format of okved cache manifest')
+            return None
+
+        return header['etag'], okved_codes
+
+    def save_okved_snapshot_to_manifest(self, etag: str | None, okved_codes: list) -> None:
+        payload = _dump_compact_json(okved_codes)
+        header = {
+            'version': MANIFEST_VERSION,
+            'etag': etag,
+            'size': len(payload),
+            'sha256': hashlib.sha256(payload).hexdigest(),
+        }
+        data = _dump_compact_json(header) + b'\n' + payload
+
+        _try_save_bytes_atomically(file_path=Path(self._okved_manifest_path), data=data)
 
     def get_okved_json_etag_from_cache(self) -> str | None:
         cache = Path(self._etag_cache_path)
@@ -63,10 +313,124 @@ class CacheRepository:
         return okved_codes
 
 
-def _try_save_json(file_path: Path, data: dict[str, str]) -> None:
+def _open_lock_file(lock_path: Path) -> BinaryIO | None:
+    try:
+        lock_path.parent.mkdir(parents=True, exist_ok=True)
+        return lock_path.open('ab')
+    except OSError as exc:
+        logger.warning('Cant open okved cache lock file, refreshing without it: %s', exc)
+        return None
+
+
+def _lock_file(lock_file: BinaryIO) -> None:
+    # Вне posix блокировка между процессами не поддерживается, остаётся только блокировка внутри процесса;
+    if os.name != 'posix':
+        return
+    import fcntl
+
+    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+
+
+def _unlock_file(lock_file: BinaryIO) -> None:
+    if os.name != 'posix':
+        return
+    import fcntl
+
+    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def _open_generation_map(generation_file: Path) -> mmap.mmap | None:
+    try:
+        with generation_file.open('rb') as f:
+            if os.fstat(f.fileno()).st_size < _GENERATION.size:
+                return None
+            # Файл поколения не подменяется, а перезаписывается на месте, поэтому отображение видит новые значения;
+            return mmap.mmap(f.fileno(), _GENERATION.size, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as exc:
+        logger.warning(exc)
+        return None
+
+
+def _read_manifest_header(manifest: Path) -> dict | None:
+    if not manifest.exists():
+        return None
+
+    try:
+        with manifest.open('rb') as f:
+            header_line = f.readline()
+    except OSError as exc:
+        logger.warning(exc)
+        return None
+
+    return _parse_manifest_header(header_line)
+
+
+def _parse_manifest_header(header_line: bytes) -> dict | None:
+    try:
+        header = json.loads(header_line)
+    except (json.JSONDecodeError, UnicodeDecodeError) as exc:
+        logger.warning(exc)
+        return None
+
+    if type(header) is not dict or header.get('version') != MANIFEST_VERSION:
+        logger.warning('Unsupported okved cache manifest version')
+        return None
+
+    if not {'etag', 'size', 'sha256'} <= header.keys():
+        logger.warning('Wrong format of okved cache manifest header')
+        return None
+
+    return header
+
+
+def _dump_compact_json(data: dict | list) -> bytes:
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _try_save_json(file_path: Path, data: dict[str, str] | list) -> None:
     try:
-        with file_path.open('w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-    except Exception as exc:  # TODO: уточнить конкретный тип возможного исключения
+        serialized = _dump_compact_json(data)
+    except (TypeError, ValueError) as exc:
         logger.error(exc)
         raise CantSaveJsonError()
+
+    _try_save_bytes_atomically(file_path=file_path, data=serialized)
+
+
+def _try_save_bytes_atomically(file_path: Path, data: bytes) -> None:
+    # Файл пишется во временный файл рядом с целевым и подменяет его только после fsync,
+    # поэтому при сбое в кэше остаётся либо старая, либо новая версия целиком;
+    temp_path = None
+    try:
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            dir=file_path.parent,
+            prefix='.{name}.'.format(name=file_path.name),
+            suffix='.tmp',
+            delete=False,
+        ) as f:
+            temp_path = Path(f.name)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, file_path)
+        temp_path = None
+        _fsync_directory(file_path.parent)
+    except OSError as exc:
+        logger.error(exc)
+        raise CantSaveJsonError()
+    finally:
+        if temp_path is not None:
+            temp_path.unlink(missing_ok=True)
+
+
+def _fsync_directory(directory: Path) -> None:
+    if os.name != 'posix':
+        return
+    directory_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(directory_fd)
+    finally:
+        os.close(directory_fd)
@@ -0,0 +1,72 @@
+from typing import Tuple
+
+
+def find_matching_okved_code(phone: str, okved_codes: list[dict]) -> dict[str, str | int | bool]:
+    max_match_len = -1  # В случае, если совпадений будет не найдено, возвратится первый непустой ОКВЭД;
+    longest_match_code = ''
+    longest_match_code_title = ''
+
+    complete_match_found = False
+
+    nodes = []
+    for section in okved_codes:
+        nodes.extend(section['items'])
+
+    while nodes:
+        next_nodes = []
+        for node in nodes:
+            if 'items' in node:
+                next_nodes.extend(node['items'])
+            code_as_is = node['code']
+            code_as_digits = _get_digits_of_code_if_correct(code_as_is)
+            matches_count, complete_match = _compare_code_with_phone(code=code_as_digits, phone=phone)
+
+            if complete_match_found and not complete_match:
+                continue
+            elif not complete_match_found and complete_match:
+                max_match_len = matches_count
+                longest_match_code = code_as_is
+                longest_match_code_title = node['name']
+
+                complete_match_found = True
+
+            elif (not complete_match_found and not complete_match) or (complete_match_found and complete_match):
+                if matches_count > max_match_len:
+                    max_match_len = matches_count
+                    longest_match_code = code_as_is
+                    longest_match_code_title = node['name']
+
+        nodes = next_nodes
+
+    return {
+        'okved': longest_match_code,
+        'matches_count': max_match_len,
+        'complete_match': complete_match_found,
+        'title': longest_match_code_title,
+    }
+
+
+def _get_digits_of_code_if_correct(okved_code: str) -> str:
+    digits = []
+    for char in okved_code:
+        if char.isalpha():
+            return ''
+        if char.isdigit():
+            digits.append(char)
+    return ''.join(digits)
+
+
+def _compare_code_with_phone(code: str, phone: str) -> Tuple[int, bool]:
+    if not code:
+        return 0, False
+
+    code_len = len(code)
+    phone_end = phone[-code_len:]
+    if code == phone_end:
+        return code_len, True
+    else:
+        trailing_matches_count = 0
+        for code_digit, phone_digit in zip(code, phone_end):
+            if code_digit == phone_digit:
+                trailing_matches_count += 1
+        return trailing_matches_count, False
@@ -0,0 +1,40 @@
+import importlib.util
+import logging
+from enum import Enum
+from typing import Protocol, Sequence
+
+from src.services.okved_index import OkvedIndex
+
+logger = logging.getLogger(__name__)
+
+
+class MatchingEngine(str, Enum):
+    auto = 'auto'
+    python = 'python'
+    numpy = 'numpy'
+
+
+class OkvedBatchMatcher(Protocol):
+    def find_matching_okved_codes(self, phones: Sequence[str]) -> list[dict[str, str | int | bool]]: ...
+
+
+def create_okved_batch_matcher(okved_index: OkvedIndex, engine: MatchingEngine) -> OkvedBatchMatcher:
+    # С битовыми масками частичных совпадений поиск по индексу обгоняет движок на NumPy уже на паре тысяч кодов,
+    # поэтому auto выбирает индекс, а NumPy включается только явно;
+    if engine is not MatchingEngine.numpy or not _is_numpy_available():
+        return okved_index
+
+    # numpy импортируется только при выборе векторизованного движка;
+    from src.services.okved_index_numpy import NumpyOkvedMatcher
+
+    return NumpyOkvedMatcher(okved_index)
+
+
+def _is_numpy_available() -> bool:
+    if importlib.util.find_spec('numpy') is None:
+        logger.warning(
+            'Package numpy is not installed, falling back to the pure-python matching engine. Install the numpy '
+            "extra: pip install 'find-your-okved-game[numpy]'."
+        )
+        return False
+    return True
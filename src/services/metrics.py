@@ -0,0 +1,141 @@
+import contextlib
+import threading
+import time
+from bisect import bisect_left
+from typing import Iterator
+
+STAGE_NORMALIZE = 'normalize'
+STAGE_ETAG_CHECK = 'etag_check'
+STAGE_CACHE_READ = 'cache_read'
+STAGE_CACHE_WRITE = 'cache_write'
+STAGE_DOWNLOAD = 'download'
+STAGE_INDEX_BUILD = 'index_build'
+STAGE_DIFF = 'diff'
+STAGE_MATCH = 'match'
+
+# Снимок ОКВЭД взят из памяти или из локального кэша без загрузки из реестра;
+COUNTER_CACHE_HITS = 'cache_hits'
+# Ни в памяти, ни в локальном кэше не нашлось пригодных ОКВЭД, и они загружены из реестра;
+COUNTER_CACHE_MISSES = 'cache_misses'
+# etag в реестре изменился, и ОКВЭД в кэше обновлены;
+COUNTER_CACHE_REFRESHES = 'cache_refreshes'
+# Результат поиска по нормализованному номеру взят из кэша результатов без сопоставления с ОКВЭД;
+COUNTER_RESULT_CACHE_HITS = 'result_cache_hits'
+# Результата по номеру не было в кэше результатов или его срок жизни истёк;
+COUNTER_RESULT_CACHE_MISSES = 'result_cache_misses'
+
+COUNTERS_HELP = {
+    COUNTER_CACHE_HITS: 'OKVED snapshots served from memory or the local cache.',
+    COUNTER_CACHE_MISSES: 'OKVED snapshots downloaded because the local cache was unusable.',
+    COUNTER_CACHE_REFRESHES: 'OKVED snapshots downloaded because the registry etag changed.',
+    COUNTER_RESULT_CACHE_HITS: 'OKVED lookups answered from the result cache.',
+    COUNTER_RESULT_CACHE_MISSES: 'OKVED lookups that were not found in the result cache.',
+}
+
+DEFAULT_DURATION_BUCKETS = (0.00001, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+
+
+class MetricsHook:
+    def observe_stage(self, stage: str, seconds: float) -> None: ...
+
+    def increment(self, counter: str, value: int = 1) -> None: ...
+
+
+NOOP_METRICS_HOOK = MetricsHook()
+
+
+class PrometheusMetrics(MetricsHook):
+    def __init__(self, prefix: str = 'okved', buckets: tuple[float, ...] = DEFAULT_DURATION_BUCKETS):
+        self._prefix = prefix
+        self._buckets = buckets
+        self._lock = threading.Lock()
+        # Для каждого этапа: число наблюдений в каждой корзине (без накопления), сумма и количество;
+        self._stage_buckets: dict[str, list[int]] = {}
+        self._stage_sums: dict[str, float] = {}
+        self._stage_counts: dict[str, int] = {}
+        self._counters = dict.fromkeys(COUNTERS_HELP, 0)
+
+    def observe_stage(self, stage: str, seconds: float) -> None:
+        bucket = bisect_left(self._buckets, seconds)
+        with self._lock:
+            if stage not in self._stage_buckets:
+                self._stage_buckets[stage] = [0] * (len(self._buckets) + 1)
+                self._stage_sums[stage] = 0.0
+                self._stage_counts[stage] = 0
+            self._stage_buckets[stage][bucket] += 1
+            self._stage_sums[stage] += seconds
+            self._stage_counts[stage] += 1
+
+    def increment(self, counter: str, value: int = 1) -> None:
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + value
+
+    def get_counter(self, counter: str) -> int:
+        with self._lock:
+            return self._counters.get(counter, 0)
+
+    def get_stage_count(self, stage: str) -> int:
+        with self._lock:
+            return self._stage_counts.get(stage, 0)
+
+    def render(self) -> str:
+        with self._lock:
+            stage_buckets = {stage: list(buckets) for stage, buckets in self._stage_buckets.items()}
+            stage_sums = dict(self._stage_sums)
+            stage_counts = dict(self._stage_counts)
+            counters = dict(self._counters)
+
+        histogram_name = '{prefix}_stage_duration_seconds'.format(prefix=self._prefix)
+        lines = [
+            '# HELP {name} Duration of OKVED lookup stages in seconds.'.format(name=histogram_name),
+            '# TYPE {name} histogram'.format(name=histogram_name),
+        ]
+        for stage in sorted(stage_buckets):
+            cumulative_count = 0
+            for upper_bound, bucket_count in zip((*self._buckets, float('inf')), stage_buckets[stage]):
+                cumulative_count += bucket_count
+                lines.append(
+                    '{name}_bucket{{stage="{stage}",le="{le}"}} {count}'.format(
+                        name=histogram_name,
+                        stage=stage,
+                        le=_format_bucket_bound(upper_bound),
+                        count=cumulative_count,
+                    )
+                )
+            lines.append(
+                '{name}_sum{{stage="{stage}"}} {value!r}'.format(
+                    name=histogram_name,
+                    stage=stage,
+                    value=stage_sums[stage],
+                )
+            )
+            lines.append(
+                '{name}_count{{stage="{stage}"}} {value}'.format(
+                    name=histogram_name,
+                    stage=stage,
+                    value=stage_counts[stage],
+                )
+            )
+
+        for counter in sorted(counters):
+            counter_name = '{prefix}_{counter}_total'.format(prefix=self._prefix, counter=counter)
+            lines.append('# HELP {name} {help}'.format(name=counter_name, help=COUNTERS_HELP.get(counter, counter)))
+            lines.append('# TYPE {name} counter'.format(name=counter_name))
+            lines.append('{name} {value}'.format(name=counter_name, value=counters[counter]))
+
+        return '\n'.join(lines) + '\n'
+
+
+@contextlib.contextmanager
+def measure_stage(metrics: MetricsHook, stage: str) -> Iterator[None]:
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.observe_stage(stage, time.perf_counter() - started_at)
+
+
+def _format_bucket_bound(upper_bound: float) -> str:
+    if upper_bound == float('inf'):
+        return '+Inf'
+    return repr(upper_bound)
@@ -1,14 +1,52 @@
 import logging
-from typing import Tuple
+import threading
+import time
+from concurrent.futures import Executor
+from enum import IntEnum
+from functools import lru_cache, partial
+from itertools import islice
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, Tuple, TypeVar
 
-from src.clients.github import GithubClient
 from src.repositories.cache import CacheRepository, CantSaveJsonError
+from src.services.matching import _compare_code_with_phone as _compare_code_with_phone
+from src.services.matching import find_matching_okved_code as find_matching_okved_code
+from src.services.matching_engine import MatchingEngine, OkvedBatchMatcher, create_okved_batch_matcher
+from src.services.metrics import (
+    COUNTER_CACHE_HITS,
+    COUNTER_CACHE_MISSES,
+    COUNTER_CACHE_REFRESHES,
+    COUNTER_RESULT_CACHE_HITS,
+    COUNTER_RESULT_CACHE_MISSES,
+    NOOP_METRICS_HOOK,
+    STAGE_CACHE_READ,
+    STAGE_CACHE_WRITE,
+    STAGE_DIFF,
+    STAGE_DOWNLOAD,
+    STAGE_ETAG_CHECK,
+    STAGE_INDEX_BUILD,
+    STAGE_MATCH,
+    STAGE_NORMALIZE,
+    MetricsHook,
+    measure_stage,
+)
+from src.services.okved_diff import diff_okved_codes, form_okved_change_record
+from src.services.okved_index import OkvedIndex, build_okved_index
+from src.services.okved_index_codec import WrongOkvedIndexFormatError, dump_okved_index, load_okved_index
+from src.services.okved_registry import OkvedRegistry, build_okved_registry
+from src.services.result_cache import OkvedResultCache, save_okved_result_cache_to_cache
+from src.services.snapshot import OkvedSnapshot
+
+if TYPE_CHECKING:
+    from src.clients.github import GithubClient
 
 logger = logging.getLogger('okved_service')
-logging.basicConfig(level=logging.DEBUG)
 
 PHONE_NUMBER_LEN = 11
 
+MATCHING_CHUNK_SIZE = 1024
+
+T = TypeVar('T')
+
 
 class PhoneNumberFormatError(ValueError): ...
 
@@ -43,76 +81,580 @@ class EmptyPhoneNumberError(PhoneNumberFormatError):
         super().__init__(message)
 
 
+class PhoneStatus(IntEnum):
+    ok = 0
+    empty = 1
+    wrong_digits_number = 2
+    wrong_country_code = 3
+    wrong_country_code_after_plus = 4
+    wrong_second_digit = 5
+
+
+_PHONE_ERROR_MESSAGE_TEMPLATES = {
+    PhoneStatus.empty: 'Данный телефонный номер пуст',
+    PhoneStatus.wrong_digits_number: 'В данном телефонном номере неправильное число цифр ({actual} вместо {needed})',
+    PhoneStatus.wrong_country_code: 'В данном телефонном номере неправильный код страны ({actual} вместо +7 или 8)',
+    PhoneStatus.wrong_country_code_after_plus: (
+        'В данном телефонном номере неправильный код страны ({actual} вместо +7 или 8)'
+    ),
+    PhoneStatus.wrong_second_digit: 'В данном телефонном номере неправильная вторая цифра ({actual} вместо 9)',
+}
+
+# Для ASCII-номеров всё, кроме цифр и плюса, удаляется одним вызовом bytes.translate;
+_ASCII_NOT_PHONE_CHARS = bytes(code for code in range(128) if chr(code) not in '+0123456789')
+
+
 class OkvedService:
-    def __init__(self, github_client: GithubClient, cache_repo: CacheRepository):
+    def __init__(
+        self,
+        github_client: 'GithubClient | None',
+        cache_repo: CacheRepository,
+        revalidate_interval: float = 0,
+        stale_while_revalidate: bool = False,
+        clock: Callable[[], float] = time.monotonic,
+        matching_engine: MatchingEngine = MatchingEngine.python,
+        metrics: MetricsHook = NOOP_METRICS_HOOK,
+        result_cache: OkvedResultCache | None = None,
+        persist_result_cache: bool = False,
+        watch_generation: bool = False,
+    ):
         self._github_client = github_client
         self._cache_repo = cache_repo
+        self._revalidate_interval = revalidate_interval
+        self._stale_while_revalidate = stale_while_revalidate
+        self._clock = clock
+        self._matching_engine = matching_engine
+        self._metrics = metrics
+        self._result_cache = result_cache
+        self._persist_result_cache = persist_result_cache
+        # Процесс, следящий за поколением снимка в кэше, подключается к снимку, опубликованному другим процессом;
+        self._watch_generation = watch_generation
+
+        self._snapshot: OkvedSnapshot | None = None
+        self._snapshot_revalidated_at = 0.0
+        self._revalidation_lock = threading.Lock()
+        self._background_revalidation: threading.Thread | None = None
+        self._refresh_lock = threading.Lock()
+        self._refresh_generation = 0
+        self._snapshot_generation = 0
+
+    def warm_up(self) -> bool:
+        return self._get_actual_okved_index() is not None
 
     def get_okved(self, raw_phone_number: str) -> Tuple[str | None, dict | None, str]:
-        error_message = ''
-        normalized_phone, error_message = try_normalize_phone(raw_phone_number)
+        normalized_phone, error_message = self._normalize_phone(raw_phone_number)
         if not normalized_phone:
             return normalized_phone, None, error_message
         okved_code = self.get_okved_by_phone(phone=normalized_phone)
         return normalized_phone, okved_code, error_message
 
+    def get_okved_from_snapshot(
+        self, snapshot: OkvedSnapshot, raw_phone_number: str
+    ) -> Tuple[str | None, dict | None, str]:
+        normalized_phone, error_message = self._normalize_phone(raw_phone_number)
+        if not normalized_phone:
+            return normalized_phone, None, error_message
+        okved_code = self.get_okved_by_phone_from_snapshot(snapshot=snapshot, phone=normalized_phone)
+        return normalized_phone, okved_code, error_message
+
+    def get_top_okved(self, raw_phone_number: str, k: int) -> Tuple[str | None, list[dict] | None, str]:
+        normalized_phone, error_message = self._normalize_phone(raw_phone_number)
+        if not normalized_phone:
+            return normalized_phone, None, error_message
+
+        okved_index = self._get_actual_okved_index()
+        if okved_index is None:
+            return normalized_phone, None, error_message
+        started_at = time.perf_counter()
+        top_okved_codes = okved_index.find_top_okved_codes(phone=normalized_phone, k=k)
+        self._metrics.observe_stage(STAGE_MATCH, time.perf_counter() - started_at)
+        return normalized_phone, top_okved_codes, error_message
+
+    def get_okved_batch(self, raw_phone_numbers: Iterable[str]) -> Iterator[Tuple[str, str | None, dict | None, str]]:
+        return match_okved_batch(
+            raw_phone_numbers=raw_phone_numbers,
+            get_okved_index=self._get_actual_okved_index,
+            matching_engine=self._matching_engine,
+            metrics=self._metrics,
+        )
+
     def get_okved_by_phone(self, phone: str) -> dict | None:
-        okved_codes = self._get_actual_okved_codes()
-        if not okved_codes:
+        return self.get_okved_by_phone_from_snapshot(snapshot=self._get_actual_snapshot(), phone=phone)
+
+    def get_okved_by_phone_from_snapshot(self, snapshot: OkvedSnapshot | None, phone: str) -> dict | None:
+        # Поиск по уже полученному снимку: ни etag, ни кэш здесь не проверяются;
+        if snapshot is None or not len(snapshot.okved_index):
+            return None
+
+        # Результаты кэшируются по etag снимка, поэтому после обновления ОКВЭД старые записи уже не находятся;
+        result_cache = self._result_cache if snapshot.etag is not None else None
+        if result_cache is not None:
+            okved_code = result_cache.get(etag=snapshot.etag, phone=phone)
+            if okved_code is not None:
+                self._metrics.increment(COUNTER_RESULT_CACHE_HITS)
+                return okved_code
+            self._metrics.increment(COUNTER_RESULT_CACHE_MISSES)
+
+        started_at = time.perf_counter()
+        okved_code = snapshot.okved_index.find_matching_okved_code(phone=phone)
+        self._metrics.observe_stage(STAGE_MATCH, time.perf_counter() - started_at)
+        if result_cache is not None:
+            result_cache.put(etag=snapshot.etag, phone=phone, okved_data=okved_code)
+        return okved_code
+
+    def get_actual_snapshot(self) -> OkvedSnapshot | None:
+        return self._get_actual_snapshot()
+
+    def has_actual_snapshot(self) -> bool:
+        # Поиск по такому снимку не ждёт ни реестра, ни кэша: etag проверять ещё рано, или его проверит фоновый поток;
+        if self._snapshot is None:
+            return False
+        if self._watch_generation and self._cache_repo.get_okved_generation() != self._snapshot_generation:
+            return False
+        return self._stale_while_revalidate or self._clock() - self._snapshot_revalidated_at < self._revalidate_interval
+
+    def get_snapshot_if_actual(self) -> OkvedSnapshot | None:
+        # Снимок, по которому можно искать сразу. Устаревший снимок при обновлении в фоне тоже подходит: etag проверит
+        # фоновый поток. Если снимка ещё нет, на хосте опубликован новый или истёк интервал проверки, возвращается None;
+        snapshot = self._snapshot
+        if snapshot is None:
             return None
-        return find_matching_okved_code(phone=phone, okved_codes=okved_codes)
 
-    def _get_actual_okved_codes(self) -> list[dict] | None:
-        cached_json_etag = self._cache_repo.get_okved_json_etag_from_cache()
+        if self._watch_generation and self._cache_repo.get_okved_generation() != self._snapshot_generation:
+            return None
+
+        if self._clock() - self._snapshot_revalidated_at < self._revalidate_interval:
+            self._metrics.increment(COUNTER_CACHE_HITS)
+            return snapshot
+
+        if self._stale_while_revalidate:
+            self._start_background_revalidation()
+            return snapshot
+
+        return None
+
+    def save_result_cache(self) -> None:
+        if self._result_cache is None or not self._persist_result_cache:
+            return
+        # На диск попадают только результаты по актуальному снимку: остальные после перезапуска уже не пригодятся;
+        snapshot = self._snapshot
+        save_okved_result_cache_to_cache(
+            cache_repo=self._cache_repo,
+            result_cache=self._result_cache,
+            etag=snapshot.etag if snapshot is not None else None,
+        )
+
+    def refresh_snapshot(self) -> bool:
+        # Проверяет etag и при необходимости загружает новые ОКВЭД независимо от интервала проверки;
+        try:
+            return self._revalidate_snapshot() is not None
+        except Exception as exc:
+            logger.error('Не удалось обновить ОКВЭД в фоне, продолжаем использовать старые: %s', exc)
+            return False
+
+    def _get_actual_okved_index(self) -> OkvedIndex | None:
+        snapshot = self._get_actual_snapshot()
+        if snapshot is None or not len(snapshot.okved_index):
+            return None
+        return snapshot.okved_index
+
+    def _get_actual_snapshot(self) -> OkvedSnapshot | None:
+        snapshot = self.get_snapshot_if_actual()
+        if snapshot is not None:
+            return snapshot
+        # Новый снимок, опубликованный на хосте, берётся из кэша сразу, не дожидаясь интервала проверки;
+        return self._revalidate_snapshot()
+
+    def _normalize_phone(self, raw_phone_number: str) -> Tuple[str | bool, str]:
+        started_at = time.perf_counter()
+        normalized_phone, error_message = try_normalize_phone(raw_phone_number)
+        self._metrics.observe_stage(STAGE_NORMALIZE, time.perf_counter() - started_at)
+        return normalized_phone, error_message
+
+    def _start_background_revalidation(self) -> None:
+        with self._revalidation_lock:
+            if self._background_revalidation is not None and self._background_revalidation.is_alive():
+                return
+            self._background_revalidation = threading.Thread(
+                target=self.refresh_snapshot,
+                name='okved-snapshot-revalidation',
+                daemon=True,
+            )
+            self._background_revalidation.start()
+
+    def _revalidate_snapshot(self) -> OkvedSnapshot | None:
+        refresh_generation = self._refresh_generation
+        with self._refresh_lock:
+            if refresh_generation != self._refresh_generation:
+                # Пока поток ждал блокировку, ОКВЭД обновил другой поток: его результат берётся без повторной проверки;
+                return self._snapshot
+            try:
+                return self._refresh_snapshot_under_cache_lock()
+            finally:
+                self._refresh_generation += 1
+
+    def _refresh_snapshot_under_cache_lock(self) -> OkvedSnapshot | None:
+        snapshot = self._snapshot
+        lock_requested_at = time.time()
+        with self._cache_repo.lock_okved_refresh():
+            actual_snapshot = None
+            refreshed_at = self._cache_repo.get_okved_refreshed_at()
+            if refreshed_at is not None and refreshed_at >= lock_requested_at:
+                # Пока процесс ждал блокировку, кэш обновил другой процесс: etag в реестре заново не запрашивается;
+                actual_snapshot = self._get_cached_okved_snapshot(snapshot=snapshot)
+            if actual_snapshot is None:
+                actual_snapshot, registry_checked = self._get_actual_okved_snapshot(snapshot=snapshot)
+                # Время обновления пишется, только если реестр действительно ответил: иначе процесс, ждущий блокировку,
+                # принял бы кэш из автономного режима или после сбоя сети за только что проверенный;
+                if actual_snapshot is not None and registry_checked:
+                    self._cache_repo.save_okved_refreshed_at(time.time())
+            snapshot_generation = self._cache_repo.get_okved_generation() if self._watch_generation else 0
+        # Поколение запоминается и при неудаче, иначе каждый поиск заново пытался бы прочитать тот же кэш;
+        self._snapshot_generation = snapshot_generation
+
+        if actual_snapshot is None:
+            if snapshot is not None:
+                logger.warning('Не удалось получить ОКВЭД, продолжаем использовать ранее загруженные;')
+            return snapshot
+
+        # Снимок подменяется одним присваиванием: начатые поиски дорабатывают на той версии, которую уже получили;
+        self._snapshot = actual_snapshot
+        self._snapshot_revalidated_at = self._clock()
+        return actual_snapshot
+
+    def _get_actual_okved_snapshot(self, snapshot: OkvedSnapshot | None = None) -> Tuple[OkvedSnapshot | None, bool]:
+        # Вместе со снимком возвращается признак того, что актуальность ОКВЭД подтвердил реестр;
+        if self._github_client is None:
+            return self._get_offline_okved_snapshot(snapshot=snapshot), False
+
+        with measure_stage(self._metrics, STAGE_CACHE_READ):
+            cached_json_etag = self._cache_repo.get_okved_etag_from_manifest()
         logger.info('Проверяем актуальность ОКВЭД в локальном кэше по etag...')
-        new_etag = self._github_client.check_okved_json_etag(cached_etag=cached_json_etag)
+        with measure_stage(self._metrics, STAGE_ETAG_CHECK):
+            new_etag = self._github_client.check_okved_json_etag(cached_etag=cached_json_etag)
 
-        new_okved_codes = None
         if new_etag:
             logger.info('Локальные ОКВЭД устарели, обновляем etag и ОКВЭД...')
-            self._cache_repo.save_okved_json_etag_to_cache(etag=new_etag)
-            new_okved_codes = self._github_client.load_okved_json()
+            new_snapshot = self._load_okved_snapshot_to_cache(etag=new_etag, snapshot=snapshot)
+            if new_snapshot is not None:
+                self._metrics.increment(COUNTER_CACHE_REFRESHES)
+                return new_snapshot, True
+            logger.warning('Не удалось загрузить новые ОКВЭД, используем локальные...')
+            if snapshot is not None:
+                self._metrics.increment(COUNTER_CACHE_HITS)
+                return snapshot, False
+        elif snapshot is not None and snapshot.etag == cached_json_etag:
+            logger.info('ОКВЭД в памяти актуальны, используем их...')
+            self._metrics.increment(COUNTER_CACHE_HITS)
+            return snapshot, self._github_client.is_etag_check_succeeded()
         else:
             logger.info('локальные ОКВЭД актуальны, используем их...')
 
-        if new_okved_codes:
-            try:
-                self._cache_repo.save_okved_codes_to_cache(new_okved_codes=new_okved_codes)
-            except CantSaveJsonError:
-                logger.warning('Не удалось сохранить новые ОКВЭД в кэш;')
-            return new_okved_codes
-
-        okved_codes_from_cache = self._cache_repo.get_okved_codes_from_cache()
-
-        if not okved_codes_from_cache:
-            logger.warning('Не удалось загрузить ОКВЭД из кэша, загружаем их заново из реестра...')
+        cached_snapshot = load_okved_snapshot_from_cache(
+            cache_repo=self._cache_repo,
+            etag=cached_json_etag,
+            metrics=self._metrics,
+        )
+        if cached_snapshot is not None:
+            self._metrics.increment(COUNTER_CACHE_HITS)
+            # Кэш актуален, только если реестр ответил, что etag не изменился, а не новым etag, который не скачался;
+            return cached_snapshot, not new_etag and self._github_client.is_etag_check_succeeded()
+
+        logger.warning('Не удалось загрузить ОКВЭД из кэша, загружаем их заново из реестра...')
+        self._metrics.increment(COUNTER_CACHE_MISSES)
+        # etag запрашивается до загрузки кодов, поэтому он не может оказаться новее сохранённых вместе с ним кодов;
+        actual_etag = new_etag
+        if not actual_etag:
+            with measure_stage(self._metrics, STAGE_ETAG_CHECK):
+                actual_etag = self._github_client.check_okved_json_etag(cached_etag=None)
+        new_snapshot = self._load_okved_snapshot_to_cache(etag=actual_etag, snapshot=snapshot)
+        return new_snapshot, new_snapshot is not None
+
+    def _get_offline_okved_snapshot(self, snapshot: OkvedSnapshot | None = None) -> OkvedSnapshot | None:
+        # Без клиента github etag в реестре не проверяется: актуальными считаются ОКВЭД из локального кэша;
+        cached_snapshot = self._get_cached_okved_snapshot(snapshot=snapshot)
+        if cached_snapshot is None:
+            logger.warning('В автономном режиме ОКВЭД берутся только из кэша, но там их нет;')
+            self._metrics.increment(COUNTER_CACHE_MISSES)
+        return cached_snapshot
+
+    def _get_cached_okved_snapshot(self, snapshot: OkvedSnapshot | None = None) -> OkvedSnapshot | None:
+        with measure_stage(self._metrics, STAGE_CACHE_READ):
+            cached_json_etag = self._cache_repo.get_okved_etag_from_manifest()
+        if snapshot is not None and snapshot.etag == cached_json_etag:
+            self._metrics.increment(COUNTER_CACHE_HITS)
+            return snapshot
+
+        cached_snapshot = load_okved_snapshot_from_cache(
+            cache_repo=self._cache_repo,
+            etag=cached_json_etag,
+            metrics=self._metrics,
+        )
+        if cached_snapshot is not None:
+            self._metrics.increment(COUNTER_CACHE_HITS)
+        return cached_snapshot
+
+    def _load_okved_snapshot_to_cache(
+        self,
+        etag: str | None,
+        snapshot: OkvedSnapshot | None = None,
+    ) -> OkvedSnapshot | None:
+        with measure_stage(self._metrics, STAGE_DOWNLOAD):
             new_okved_codes = self._github_client.load_okved_json()
-            self._cache_repo.save_okved_codes_to_cache(new_okved_codes=new_okved_codes)
-            return new_okved_codes
-        return okved_codes_from_cache
-
+        if not new_okved_codes:
+            return None
 
-def try_normalize_phone(raw_phone_number: str):
-    normalized_phone = False
-    error_message = ''
-    try:
-        normalized_phone = normalize_phone(sequence=raw_phone_number)
-    except EmptyPhoneNumberError:
-        error_message = 'Данный телефонный номер пуст'
-    except WrongDigitsNumberError as dig_number_error:
-        error_message = 'В данном телефонном номере неправильное число цифр ({actual} вместо {needed})'.format(
-            actual=dig_number_error.digits_number,
-            needed=PHONE_NUMBER_LEN,
+        # Прежнее дерево ОКВЭД читается до того, как новое перезапишет его в кэше;
+        previous_okved_snapshot = self._get_previous_okved_codes(snapshot=snapshot)
+        try:
+            with measure_stage(self._metrics, STAGE_CACHE_WRITE):
+                self._cache_repo.save_okved_snapshot_to_manifest(etag=etag, okved_codes=new_okved_codes)
+        except CantSaveJsonError:
+            logger.warning('Не удалось сохранить новые ОКВЭД в кэш;')
+
+        if previous_okved_snapshot is not None:
+            previous_etag, previous_okved_codes = previous_okved_snapshot
+            self._log_okved_changes(
+                previous_etag=previous_etag,
+                previous_okved_codes=previous_okved_codes,
+                etag=etag,
+                okved_codes=new_okved_codes,
+            )
+
+        new_snapshot = _build_okved_snapshot_to_cache(
+            cache_repo=self._cache_repo,
+            etag=etag,
+            okved_codes=new_okved_codes,
+            metrics=self._metrics,
         )
-    except WrongCountryCodeError as country_code_error:
-        error_message = 'В данном телефонном номере неправильный код страны ({actual} вместо +7 или 8)'.format(
-            actual=country_code_error.contry_code,
+        # Новый индекс уже в кэше: процессы, следящие за поколением, подключатся к нему без проверки etag;
+        self._cache_repo.bump_okved_generation()
+        return new_snapshot
+
+    def _get_previous_okved_codes(self, snapshot: OkvedSnapshot | None) -> Tuple[str | None, list[dict]] | None:
+        if snapshot is not None and snapshot.okved_registry is not None:
+            return snapshot.etag, snapshot.okved_registry.to_okved_codes()
+        with measure_stage(self._metrics, STAGE_CACHE_READ):
+            return self._cache_repo.get_okved_snapshot_from_manifest()
+
+    def _log_okved_changes(
+        self,
+        previous_etag: str | None,
+        previous_okved_codes: list[dict],
+        etag: str | None,
+        okved_codes: list[dict],
+    ) -> None:
+        with measure_stage(self._metrics, STAGE_DIFF):
+            okved_codes_diff = diff_okved_codes(previous_okved_codes, okved_codes)
+        if okved_codes_diff is None:
+            logger.warning('Коды ОКВЭД в реестре не уникальны, изменения не вычисляются;')
+            return
+
+        change_record = form_okved_change_record(
+            okved_codes_diff=okved_codes_diff,
+            from_etag=previous_etag,
+            to_etag=etag,
+            changed_at=time.time(),
         )
-    except WrongSecondDigitError as second_digit_error:
-        error_message = 'В данном телефонном номере неправильная вторая цифра ({actual} вместо 9)'.format(
-            actual=second_digit_error.second_digit,
+        try:
+            with measure_stage(self._metrics, STAGE_CACHE_WRITE):
+                self._cache_repo.append_okved_change_to_log(change_record)
+        except CantSaveJsonError:
+            logger.warning('Не удалось записать изменения ОКВЭД в журнал;')
+        logger.info(
+            'Изменения ОКВЭД: добавлено %s, удалено %s, переименовано %s, перенесено %s;',
+            len(okved_codes_diff.added),
+            len(okved_codes_diff.removed),
+            len(okved_codes_diff.renamed),
+            len(okved_codes_diff.moved),
         )
-    return normalized_phone, error_message
+
+
+class AsyncOkvedService:
+    def __init__(self, okved_service: OkvedService, executor: Executor | None = None):
+        # Проверка etag, загрузка реестра, построение индекса и пакетное сопоставление выполняются синхронным
+        # сервисом в пуле потоков. Одиночный поиск по актуальному снимку занимает микросекунды и идёт в цикле событий;
+        self._okved_service = okved_service
+        self._executor = executor
+
+    async def warm_up(self) -> bool:
+        return await self._run_in_executor(self._okved_service.warm_up)
+
+    async def get_okved(self, raw_phone_number: str) -> Tuple[str | None, dict | None, str]:
+        # Снимок берётся один раз: поиск по нему в цикле событий уже не может запустить проверку etag;
+        snapshot = self._okved_service.get_snapshot_if_actual()
+        if snapshot is not None:
+            return self._okved_service.get_okved_from_snapshot(snapshot, raw_phone_number)
+        return await self._run_in_executor(self._okved_service.get_okved, raw_phone_number)
+
+    async def get_top_okved(self, raw_phone_number: str, k: int) -> Tuple[str | None, list[dict] | None, str]:
+        return await self._run_in_executor(self._okved_service.get_top_okved, raw_phone_number, k)
+
+    async def get_okved_batch(self, raw_phone_numbers: Iterable[str]) -> list[Tuple[str, str | None, dict | None, str]]:
+        # Генератор пакетного поиска ничего не делает до первой итерации, поэтому весь пакет разбирается в пуле;
+        return await self._run_in_executor(list, self._okved_service.get_okved_batch(list(raw_phone_numbers)))
+
+    async def get_okved_by_phone(self, phone: str) -> dict | None:
+        snapshot = self._okved_service.get_snapshot_if_actual()
+        if snapshot is not None:
+            return self._okved_service.get_okved_by_phone_from_snapshot(snapshot, phone)
+        return await self._run_in_executor(self._okved_service.get_okved_by_phone, phone)
+
+    async def get_actual_snapshot(self) -> OkvedSnapshot | None:
+        return await self._run_in_executor(self._okved_service.get_actual_snapshot)
+
+    async def refresh_snapshot(self) -> bool:
+        return await self._run_in_executor(self._okved_service.refresh_snapshot)
+
+    async def save_result_cache(self) -> None:
+        await self._run_in_executor(self._okved_service.save_result_cache)
+
+    async def _run_in_executor(self, func: Callable[..., T], *args, **kwargs) -> T:
+        # asyncio импортируется здесь, чтобы не замедлять запуск CLI, которому асинхронный сервис не нужен;
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+
+def match_okved_batch(
+    raw_phone_numbers: Iterable[str],
+    get_okved_index: Callable[[], OkvedIndex | None],
+    matching_engine: MatchingEngine = MatchingEngine.python,
+    chunk_size: int = MATCHING_CHUNK_SIZE,
+    metrics: MetricsHook = NOOP_METRICS_HOOK,
+) -> Iterator[Tuple[str, str | None, dict | None, str]]:
+    okved_matcher = None
+    okved_index_resolved = False
+
+    raw_phone_numbers = iter(raw_phone_numbers)
+    while raw_phones_chunk := list(islice(raw_phone_numbers, chunk_size)):
+        normalized_chunk = normalize_phone_chunk(raw_phones_chunk, metrics=metrics)
+
+        if not okved_index_resolved and any(normalized_phone for _, normalized_phone, _ in normalized_chunk):
+            # Актуальность ОКВЭД проверяется один раз на весь пакет и только если в нём есть корректные номера;
+            okved_index = get_okved_index()
+            if okved_index is not None:
+                okved_matcher = create_okved_batch_matcher(okved_index=okved_index, engine=matching_engine)
+            okved_index_resolved = True
+
+        yield from match_normalized_phone_chunk(normalized_chunk, okved_matcher=okved_matcher, metrics=metrics)
+
+
+def normalize_phone_chunk(
+    raw_phones_chunk: list[str],
+    metrics: MetricsHook = NOOP_METRICS_HOOK,
+) -> list[Tuple[str, str | None, str]]:
+    started_at = time.perf_counter()
+    normalized_chunk = [
+        (raw_phone, normalized_phone, error_message)
+        for raw_phone, (normalized_phone, error_message) in zip(raw_phones_chunk, normalize_phones(raw_phones_chunk))
+    ]
+    metrics.observe_stage(STAGE_NORMALIZE, time.perf_counter() - started_at)
+    return normalized_chunk
+
+
+def match_normalized_phone_chunk(
+    normalized_chunk: list[Tuple[str, str | None, str]],
+    okved_matcher: OkvedBatchMatcher | None,
+    metrics: MetricsHook = NOOP_METRICS_HOOK,
+) -> Iterator[Tuple[str, str | None, dict | None, str]]:
+    # Номера сопоставляются с ОКВЭД порциями, чтобы векторизованный движок обрабатывал их целыми блоками;
+    normalized_phones = [normalized_phone for _, normalized_phone, _ in normalized_chunk if normalized_phone]
+    okved_codes = iter(())
+    if okved_matcher is not None and normalized_phones:
+        started_at = time.perf_counter()
+        okved_codes = iter(okved_matcher.find_matching_okved_codes(normalized_phones))
+        metrics.observe_stage(STAGE_MATCH, time.perf_counter() - started_at)
+
+    for raw_phone, normalized_phone, error_message in normalized_chunk:
+        okved_code = next(okved_codes, None) if normalized_phone else None
+        yield raw_phone, normalized_phone, okved_code, error_message
+
+
+def load_okved_snapshot_from_cache(
+    cache_repo: CacheRepository,
+    etag: str | None,
+    metrics: MetricsHook = NOOP_METRICS_HOOK,
+) -> OkvedSnapshot | None:
+    with measure_stage(metrics, STAGE_CACHE_READ):
+        published_okved_index = _load_published_okved_index(cache_repo.open_okved_index_from_cache())
+    if published_okved_index is not None and published_okved_index[0] == etag:
+        return OkvedSnapshot(etag=etag, okved_index=published_okved_index[1])
+
+    with measure_stage(metrics, STAGE_CACHE_READ):
+        cached_okved_snapshot = cache_repo.get_okved_snapshot_from_manifest()
+    if cached_okved_snapshot is None:
+        return None
+    cached_etag, okved_codes = cached_okved_snapshot
+    return _build_okved_snapshot_to_cache(
+        cache_repo=cache_repo,
+        etag=cached_etag,
+        okved_codes=okved_codes,
+        metrics=metrics,
+    )
+
+
+def _build_okved_index_and_registry(okved_codes: list[dict]) -> Tuple[OkvedIndex, OkvedRegistry]:
+    # Вместо вложенных словарей из json снимок держит компактный реестр, из которого дерево можно восстановить;
+    return build_okved_index(okved_codes), build_okved_registry(okved_codes)
+
+
+def _load_published_okved_index(okved_index_buffer) -> Tuple[str | None, OkvedIndex] | None:
+    if okved_index_buffer is None:
+        return None
+    try:
+        return load_okved_index(okved_index_buffer)
+    except WrongOkvedIndexFormatError as exc:
+        logger.warning('Не удалось прочитать индекс ОКВЭД из кэша: %s', exc)
+        return None
+
+
+def _build_okved_snapshot_to_cache(
+    cache_repo: CacheRepository,
+    etag: str | None,
+    okved_codes: list[dict],
+    metrics: MetricsHook = NOOP_METRICS_HOOK,
+) -> OkvedSnapshot:
+    with measure_stage(metrics, STAGE_INDEX_BUILD):
+        okved_index, okved_registry = _build_okved_index_and_registry(okved_codes)
+    okved_index = _publish_okved_index_to_cache(
+        cache_repo=cache_repo, etag=etag, okved_index=okved_index, metrics=metrics
+    )
+    return OkvedSnapshot(etag=etag, okved_index=okved_index, okved_registry=okved_registry)
+
+
+def _publish_okved_index_to_cache(
+    cache_repo: CacheRepository,
+    etag: str | None,
+    okved_index: OkvedIndex,
+    metrics: MetricsHook = NOOP_METRICS_HOOK,
+) -> OkvedIndex:
+    try:
+        with measure_stage(metrics, STAGE_CACHE_WRITE):
+            cache_repo.save_okved_index_to_cache(okved_index_data=dump_okved_index(etag, okved_index))
+    except CantSaveJsonError:
+        logger.warning('Не удалось сохранить индекс ОКВЭД в кэш;')
+        return okved_index
+
+    # Построенные таблицы заменяются отображением файла индекса: страницы файла в памяти общие для всех процессов
+    # на хосте, поэтому память не растёт с числом процессов, подключившихся к снимку;
+    with measure_stage(metrics, STAGE_CACHE_READ):
+        published_okved_index = _load_published_okved_index(cache_repo.open_okved_index_from_cache())
+    if published_okved_index is None or published_okved_index[0] != etag:
+        return okved_index
+    return published_okved_index[1]
+
+
+def try_normalize_phone(raw_phone_number: str):
+    normalized_phone, status, detail = parse_phone(raw_phone=raw_phone_number)
+    if status is PhoneStatus.ok:
+        return normalized_phone, ''
+    return False, _form_phone_error_message(status=status, detail=detail)
+
+
+def normalize_phones(raw_phone_numbers: Iterable[str]) -> Iterator[Tuple[str | bool, str]]:
+    return map(try_normalize_phone, raw_phone_numbers)
 
 
 def normalize_phone(sequence: str) -> str | bool:
@@ -125,19 +667,61 @@ def normalize_phone(sequence: str) -> str | bool:
     Returns:
         str or False: нормализованный номер или False при ошибке
     """
-    _validate_phone_not_empty(sequence=sequence)
+    normalized_phone, status, detail = parse_phone(raw_phone=sequence)
+
+    if status is PhoneStatus.empty:
+        raise EmptyPhoneNumberError()
+    if status is PhoneStatus.wrong_digits_number:
+        raise WrongDigitsNumberError(digits_number=int(detail))
+    if status is PhoneStatus.wrong_country_code:
+        raise WrongCountryCodeError(country_code=detail, plus=False)
+    if status is PhoneStatus.wrong_country_code_after_plus:
+        raise WrongCountryCodeError(country_code=detail, plus=True)
+    if status is PhoneStatus.wrong_second_digit:
+        raise WrongSecondDigitError(second_digit=detail)
+
+    return normalized_phone
+
+
+def parse_phone(raw_phone: str) -> Tuple[str, PhoneStatus, str]:
+    # Возвращает нормализованный номер, статус и значение, из-за которого номер не прошёл проверку;
+    if not raw_phone:
+        return '', PhoneStatus.empty, ''
+
+    if raw_phone.isascii():
+        plus_before_first_digit, digits = _parse_ascii_phone(raw_phone=raw_phone)
+    else:
+        plus_before_first_digit, digits = _parse_raw_phone(raw_phone=raw_phone)
+
+    if len(digits) != PHONE_NUMBER_LEN:
+        return '', PhoneStatus.wrong_digits_number, str(len(digits))
+
+    country_code = digits[0]
+    if plus_before_first_digit and country_code != '7':
+        return '', PhoneStatus.wrong_country_code_after_plus, country_code
+    if not plus_before_first_digit and country_code != '8':
+        return '', PhoneStatus.wrong_country_code, country_code
 
-    plus_before_first_digit, digits = _parse_raw_phone(raw_phone=sequence)
+    second_digit = digits[1]
+    if second_digit != '9':
+        return '', PhoneStatus.wrong_second_digit, second_digit
 
-    _validate_digits_number(digits)
+    return '+7' + digits[1:], PhoneStatus.ok, ''
 
-    _validate_country_code(digits, plus_before_first_digit)
 
-    _validate_second_digit(digits)
+# Текст ошибки зависит только от статуса и значения, поэтому повторяющиеся ошибки не форматируются заново;
+@lru_cache(maxsize=1024)
+def _form_phone_error_message(status: PhoneStatus, detail: str) -> str:
+    return _PHONE_ERROR_MESSAGE_TEMPLATES[status].format(actual=detail, needed=PHONE_NUMBER_LEN)
 
-    normalized = '+7{rest_digits}'.format(rest_digits=digits[1:])
 
-    return normalized
+def _parse_ascii_phone(raw_phone: str) -> Tuple[bool, str]:
+    phone_chars = raw_phone.encode('ascii').translate(None, _ASCII_NOT_PHONE_CHARS)
+    # Плюсы и нули до первой значащей цифры: нули отбрасываются, а плюс среди них задаёт код страны +7;
+    significant_chars = phone_chars.lstrip(b'+0')
+    plus_before_first_digit = b'+' in phone_chars[: len(phone_chars) - len(significant_chars)]
+    digits = significant_chars.replace(b'+', b'').decode('ascii')
+    return plus_before_first_digit, digits
 
 
 def _parse_raw_phone(raw_phone: str) -> Tuple[bool, str]:
@@ -155,100 +739,3 @@ def _parse_raw_phone(raw_phone: str) -> Tuple[bool, str]:
             first_digit_found = True
 
     return plus_before_first_digit, ''.join(digits)
-
-
-def _validate_phone_not_empty(sequence: str) -> None:
-    if not sequence:
-        raise EmptyPhoneNumberError()
-
-
-def _validate_digits_number(digits: str) -> None:
-    digits_number = len(digits)
-    if digits_number != PHONE_NUMBER_LEN:
-        raise WrongDigitsNumberError(digits_number=digits_number)
-
-
-def _validate_country_code(digits: str, plus_before_first_digit) -> None:
-    country_code = digits[0]
-    if country_code != '7' and plus_before_first_digit:
-        raise WrongCountryCodeError(country_code=country_code, plus=True)
-
-    if country_code != '8' and not plus_before_first_digit:
-        raise WrongCountryCodeError(country_code=country_code, plus=False)
-
-
-def _validate_second_digit(digits: str) -> None:
-    second_digit = digits[1]
-    if second_digit != '9':
-        raise WrongSecondDigitError(second_digit=second_digit)
-
-
-def find_matching_okved_code(phone: str, okved_codes: list[dict]) -> dict[str, str | int | bool]:
-    max_match_len = -1  # В случае, если совпадений будет не найдено, возвратится первый непустой ОКВЭД;
-    longest_match_code = ''
-    longest_match_code_title = ''
-
-    complete_match_found = False
-
-    nodes = []
-    for section in okved_codes:
-        nodes.extend(section['items'])
-
-    while nodes:
-        next_nodes = []
-        for node in nodes:
-            if 'items' in node:
-                next_nodes.extend(node['items'])
-            code_as_is = node['code']
-            code_as_digits = _get_digits_of_code_if_correct(code_as_is)
-            matches_count, complete_match = _compare_code_with_phone(code=code_as_digits, phone=phone)
-
-            if complete_match_found and not complete_match:
-                continue
-            elif not complete_match_found and complete_match:
-                max_match_len = matches_count
-                longest_match_code = code_as_is
-                longest_match_code_title = node['name']
-
-                complete_match_found = True
-
-            elif (not complete_match_found and not complete_match) or (complete_match_found and complete_match):
-                if matches_count > max_match_len:
-                    max_match_len = matches_count
-                    longest_match_code = code_as_is
-                    longest_match_code_title = node['name']
-
-        nodes = next_nodes
-
-    return {
-        'okved': longest_match_code,
-        'matches_count': max_match_len,
-        'complete_match': complete_match_found,
-        'title': longest_match_code_title,
-    }
-
-
-def _get_digits_of_code_if_correct(okved_code: str) -> str:
-    digits = []
-    for char in okved_code:
-        if char.isalpha():
-            return ''
-        if char.isdigit():
-            digits.append(char)
-    return ''.join(digits)
-
-
-def _compare_code_with_phone(code: str, phone: str) -> Tuple[int, bool]:
-    if not code:
-        return 0, False
-
-    code_len = len(code)
-    phone_end = phone[-code_len:]
-    if code == phone_end:
-        return code_len, True
-    else:
-        trailing_matches_count = 0
-        for code_digit, phone_digit in zip(code, phone_end):
-            if code_digit == phone_digit:
-                trailing_matches_count += 1
-        return trailing_matches_count, False
@@ -0,0 +1,140 @@
+from typing import Tuple
+
+OKVED_CHANGES_VERSION = 1
+
+# Положение узла в дереве ОКВЭД: код родителя, код предыдущего соседа и поля узла без вложенных узлов.
+# Положение задаётся через предыдущего соседа, а не индексом, чтобы вставка узла не сдвигала всех соседей за ним;
+OkvedNodePlace = Tuple[str | None, str | None, dict]
+
+
+class OkvedChangesReplayError(ValueError): ...
+
+
+class OkvedCodesDiff:
+    def __init__(self, added: list[dict], removed: list[str], renamed: list[dict], moved: list[dict]):
+        self.added = added
+        self.removed = removed
+        self.renamed = renamed
+        self.moved = moved
+
+    def is_empty(self) -> bool:
+        return not (self.added or self.removed or self.renamed or self.moved)
+
+    def has_structural_changes(self) -> bool:
+        # Добавление, удаление и перенос кодов меняют порядок обхода в ширину, а переименование - только названия;
+        return bool(self.added or self.removed or self.moved)
+
+
+def diff_okved_codes(old_okved_codes: list[dict], new_okved_codes: list[dict]) -> OkvedCodesDiff | None:
+    old_nodes = _flatten_okved_codes(old_okved_codes)
+    new_nodes = _flatten_okved_codes(new_okved_codes)
+    if old_nodes is None or new_nodes is None:
+        return None
+
+    added = []
+    renamed = []
+    moved = []
+    for code, (parent, after, fields) in new_nodes.items():
+        if code not in old_nodes:
+            added.append({'code': code, 'parent': parent, 'after': after, 'fields': fields})
+            continue
+
+        old_parent, old_after, old_fields = old_nodes[code]
+        if fields != old_fields:
+            renamed.append(
+                {'code': code, 'old_name': old_fields.get('name'), 'name': fields.get('name'), 'fields': fields}
+            )
+        if (parent, after) != (old_parent, old_after):
+            moved.append({'code': code, 'parent': parent, 'after': after})
+
+    removed = [code for code in old_nodes if code not in new_nodes]
+    return OkvedCodesDiff(added=added, removed=removed, renamed=renamed, moved=moved)
+
+
+def form_okved_change_record(
+    okved_codes_diff: OkvedCodesDiff,
+    from_etag: str | None,
+    to_etag: str | None,
+    changed_at: float,
+) -> dict:
+    return {
+        'version': OKVED_CHANGES_VERSION,
+        'from_etag': from_etag,
+        'to_etag': to_etag,
+        'changed_at': changed_at,
+        'added': okved_codes_diff.added,
+        'removed': okved_codes_diff.removed,
+        'renamed': okved_codes_diff.renamed,
+        'moved': okved_codes_diff.moved,
+    }
+
+
+def apply_okved_change_record(okved_codes: list[dict], change_record: dict) -> list[dict]:
+    if change_record.get('version') != OKVED_CHANGES_VERSION:
+        raise OkvedChangesReplayError('Unsupported okved change record version')
+
+    nodes = _flatten_okved_codes(okved_codes)
+    if nodes is None:
+        raise OkvedChangesReplayError('Okved codes are not unique, changes cant be replayed')
+
+    try:
+        for code in change_record['removed']:
+            del nodes[code]
+        for entry in change_record['renamed']:
+            parent, after, _ = nodes[entry['code']]
+            nodes[entry['code']] = (parent, after, entry['fields'])
+        for entry in change_record['moved']:
+            _, _, fields = nodes[entry['code']]
+            nodes[entry['code']] = (entry['parent'], entry['after'], fields)
+        for entry in change_record['added']:
+            nodes[entry['code']] = (entry['parent'], entry['after'], entry['fields'])
+    except KeyError as exc:
+        raise OkvedChangesReplayError('Change record doesnt match okved codes: {code}'.format(code=exc))
+
+    return _build_okved_codes(nodes)
+
+
+def _flatten_okved_codes(okved_codes: list[dict]) -> dict[str, OkvedNodePlace] | None:
+    # Узлы перечисляются в прямом порядке обхода, поэтому родитель всегда идёт раньше своих потомков;
+    nodes = {}
+    stack = [(None, list(okved_codes))]
+    while stack:
+        parent, children = stack.pop()
+        after = None
+        for node in children:
+            code = node.get('code') if type(node) is dict else None
+            if type(code) is not str or code in nodes:
+                return None
+            nodes[code] = (parent, after, {key: value for key, value in node.items() if key != 'items'})
+            after = code
+        for node in reversed(children):
+            if node.get('items'):
+                stack.append((node['code'], node['items']))
+    return nodes
+
+
+def _build_okved_codes(nodes: dict[str, OkvedNodePlace]) -> list[dict]:
+    next_codes: dict[str | None, dict[str | None, str]] = {}
+    for code, (parent, after, _) in nodes.items():
+        siblings = next_codes.setdefault(parent, {})
+        if after in siblings:
+            raise OkvedChangesReplayError('Two okved codes follow the same code: {code}'.format(code=after))
+        siblings[after] = code
+
+    built_count = 0
+
+    def build_children(parent: str | None) -> list[dict]:
+        nonlocal built_count
+        children = []
+        siblings = next_codes.get(parent, {})
+        code = siblings.get(None)
+        while code is not None:
+            built_count += 1
+            children.append({**nodes[code][2], 'items': build_children(code)})
+            code = siblings.get(code)
+        return children
+
+    okved_codes = build_children(None)
+    if built_count != len(nodes):
+        raise OkvedChangesReplayError('Some okved codes are detached from the tree after replay')
+    return okved_codes
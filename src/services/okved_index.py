@@ -0,0 +1,481 @@
+from array import array
+from bisect import bisect_left
+from typing import Iterable, Iterator, Sequence
+
+from src.services.matching import _get_digits_of_code_if_correct
+
+# Ключ суффикса - число из единицы и цифр кода: единица в начале сохраняет длину кода и его ведущие нули.
+# 18 цифр и единица помещаются в int64;
+MAX_SUFFIX_KEY_DIGITS = 18
+# Ключи суффиксов раскладываются по слотам хеш-таблицы с открытой адресацией, пустой слот помечен -1;
+NO_SUFFIX = -1
+
+_ASCII_DIGITS = '0123456789'
+_SUFFIX_KEY_BASES = [10**digits_count for digits_count in range(MAX_SUFFIX_KEY_DIGITS + 1)]
+
+OKVED_INDEX_TABLE_TYPECODES = (
+    ('code_offsets', 'q'),
+    ('code_blob', 'B'),
+    ('title_offsets', 'q'),
+    ('title_blob', 'B'),
+    ('suffix_keys', 'q'),
+    ('suffix_orders', 'i'),
+    ('suffix_slots', 'i'),
+    ('group_lengths', 'i'),
+    ('group_order_offsets', 'q'),
+    ('group_orders', 'i'),
+    ('group_digit_offsets', 'q'),
+    ('group_digits', 'I'),
+    ('mask_position_offsets', 'q'),
+    ('mask_digits', 'I'),
+    ('mask_offsets', 'q'),
+    ('mask_blob', 'B'),
+)
+
+
+class OkvedIndexTables:
+    def __init__(self, **tables: Sequence[int]):
+        self.code_offsets = tables['code_offsets']
+        self.code_blob = tables['code_blob']
+        self.title_offsets = tables['title_offsets']
+        self.title_blob = tables['title_blob']
+        self.suffix_keys = tables['suffix_keys']
+        self.suffix_orders = tables['suffix_orders']
+        self.suffix_slots = tables['suffix_slots']
+        self.group_lengths = tables['group_lengths']
+        self.group_order_offsets = tables['group_order_offsets']
+        self.group_orders = tables['group_orders']
+        self.group_digit_offsets = tables['group_digit_offsets']
+        self.group_digits = tables['group_digits']
+        self.mask_position_offsets = tables['mask_position_offsets']
+        self.mask_digits = tables['mask_digits']
+        self.mask_offsets = tables['mask_offsets']
+        self.mask_blob = tables['mask_blob']
+
+
+class StringTable:
+    def __init__(self, offsets: Sequence[int], blob: Sequence[int]):
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        return bytes(self._blob[self._offsets[index] : self._offsets[index + 1]]).decode('utf-8')
+
+
+class OkvedIndex:
+    def __init__(self, tables: OkvedIndexTables):
+        self.tables = tables
+        self._codes = StringTable(offsets=tables.code_offsets, blob=tables.code_blob)
+        self._titles = StringTable(offsets=tables.title_offsets, blob=tables.title_blob)
+        self._suffix_keys = tables.suffix_keys
+        self._suffix_orders = tables.suffix_orders
+        self._suffix_slots = tables.suffix_slots
+        self._group_lengths = tables.group_lengths
+        self._group_order_offsets = tables.group_order_offsets
+        self._group_orders = tables.group_orders
+        self._group_digit_offsets = tables.group_digit_offsets
+        self._group_digits = tables.group_digits
+        # Группы от длинных кодов к коротким. Коды длиннее MAX_SUFFIX_KEY_DIGITS в хеш-таблицу не попадают
+        # и сравниваются с концом номера по цифрам;
+        self._complete_match_groups = [
+            (group, code_len, _SUFFIX_KEY_BASES[code_len] if code_len <= MAX_SUFFIX_KEY_DIGITS else None)
+            for group, code_len in sorted(enumerate(tables.group_lengths), key=lambda group_len: -group_len[1])
+        ]
+        self._max_code_len = max(tables.group_lengths, default=0)
+        # Группы, в которых есть коды с не-ASCII цифрами: такие коды в хеш-таблицу не попадают;
+        self._non_ascii_groups = {
+            group
+            for group in range(len(tables.group_lengths))
+            if max(tables.group_digits[tables.group_digit_offsets[group] : tables.group_digit_offsets[group + 1]]) > 127
+        }
+        self._mask_position_offsets = tables.mask_position_offsets
+        self._mask_digits = tables.mask_digits
+        self._mask_offsets = tables.mask_offsets
+        self._mask_blob = tables.mask_blob
+        # Позиции цифр всех групп пронумерованы подряд: первая позиция группы - сумма длин кодов предыдущих групп;
+        self._group_position_starts = [0]
+        for code_len in tables.group_lengths:
+            self._group_position_starts.append(self._group_position_starts[-1] + code_len)
+        # Коды с одинаковыми цифрами в группы попадают один раз, остальные нужны только для показа всех равных;
+        self._same_digits_orders: dict[int, list[int]] | None = None
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def find_matching_okved_code(self, phone: str) -> dict[str, str | int | bool]:
+        if not len(self._codes):
+            return _form_matching_okved_data(code='', title='', matches_count=-1, complete_match=False)
+
+        complete_match_len, complete_match_order = self._find_longest_complete_match(phone=phone)
+        if complete_match_len:
+            return _form_matching_okved_data(
+                code=self._codes[complete_match_order],
+                title=self._titles[complete_match_order],
+                matches_count=complete_match_len,
+                complete_match=True,
+            )
+
+        matches_count, match_order = self._find_best_partial_match(phone=phone)
+        return _form_matching_okved_data(
+            code=self._codes[match_order],
+            title=self._titles[match_order],
+            matches_count=matches_count,
+            complete_match=False,
+        )
+
+    def find_matching_okved_codes(self, phones: Sequence[str]) -> list[dict[str, str | int | bool]]:
+        return [self.find_matching_okved_code(phone=phone) for phone in phones]
+
+    def find_top_okved_codes(self, phone: str, k: int) -> list[dict[str, str | int | bool]]:
+        # Кандидаты ранжируются по полноте совпадения и числу совпавших цифр, а при равенстве - по порядку обхода
+        # в ширину, то есть сначала менее глубокие коды. Кандидаты, равные k-му, возвращаются все;
+        ranked_candidates = self._find_top_candidates(phone=phone, k=k)
+        if not ranked_candidates:
+            return [{**self.find_matching_okved_code(phone=phone), 'rank': 1}]
+
+        top_okved_codes = []
+        rank = 0
+        previous_score = None
+        for complete_match, matches_count, order in ranked_candidates:
+            if (complete_match, matches_count) != previous_score:
+                rank += 1
+                previous_score = (complete_match, matches_count)
+            okved_data = _form_matching_okved_data(
+                code=self._codes[order],
+                title=self._titles[order],
+                matches_count=matches_count,
+                complete_match=complete_match,
+            )
+            top_okved_codes.append({**okved_data, 'rank': rank})
+        return top_okved_codes
+
+    def _find_top_candidates(self, phone: str, k: int) -> list[tuple[bool, int, int]]:
+        # Для каждой группы счётчики совпадений считаются поразрядно, как при поиске одного ОКВЭД, и раскладываются
+        # на маски кодов с одинаковым числом совпадений. Уровни всех групп перебираются от лучшего к худшему,
+        # пока не наберётся k кандидатов; уровень, на котором это случилось, берётся целиком;
+        if k <= 0:
+            return []
+
+        score_levels = []
+        phone_points = list(map(ord, phone))
+        for group, code_len in enumerate(self._group_lengths):
+            match_masks = self._get_match_masks(group=group, phone_end_points=phone_points[-code_len:])
+            for matches_count, codes_mask in _split_by_matches_count(_count_matches(match_masks)):
+                score_levels.append((matches_count == code_len, matches_count, group, codes_mask))
+        score_levels.sort(key=lambda score_level: score_level[:2], reverse=True)
+
+        candidates = []
+        last_score = None
+        for complete_match, matches_count, group, codes_mask in score_levels:
+            if len(candidates) >= k and (complete_match, matches_count) != last_score:
+                break
+            last_score = (complete_match, matches_count)
+            orders_offset = self._group_order_offsets[group]
+            while codes_mask:
+                position = (codes_mask & -codes_mask).bit_length() - 1
+                codes_mask &= codes_mask - 1
+                order = self._group_orders[orders_offset + position]
+                candidates.append((complete_match, matches_count, order))
+                for same_digits_order in self._get_same_digits_orders().get(order, ()):
+                    candidates.append((complete_match, matches_count, same_digits_order))
+        candidates.sort(key=lambda candidate: (not candidate[0], -candidate[1], candidate[2]))
+
+        top_count = min(k, len(candidates))
+        while top_count < len(candidates) and candidates[top_count][:2] == candidates[top_count - 1][:2]:
+            top_count += 1
+        return candidates[:top_count]
+
+    def _get_same_digits_orders(self) -> dict[int, list[int]]:
+        if self._same_digits_orders is None:
+            first_orders = {}
+            same_digits_orders = {}
+            for order in range(len(self._codes)):
+                digit_code = _get_digits_of_code_if_correct(self._codes[order])
+                if not digit_code:
+                    continue
+                first_order = first_orders.setdefault(digit_code, order)
+                if first_order != order:
+                    same_digits_orders.setdefault(first_order, []).append(order)
+            self._same_digits_orders = same_digits_orders
+        return self._same_digits_orders
+
+    def _find_longest_complete_match(self, phone: str) -> tuple[int, int]:
+        # Конец номера из ASCII-цифр разбирается в число один раз, а ключи суффиксов всех длин получаются из него
+        # остатком от деления. Слоты хеш-таблицы проверяются прямо здесь: на полное совпадение приходится большая
+        # часть поисков, и вызов метода на каждую длину кода заметен;
+        digits_tail_len = min(len(phone) - len(phone.rstrip(_ASCII_DIGITS)), self._max_code_len)
+        # Код с не-ASCII цифрами полностью совпадает только с концом номера, в котором тоже есть не-ASCII цифры.
+        # Для таких номеров группы с этими кодами сравниваются с концом номера по цифрам;
+        non_ascii_groups = self._non_ascii_groups if not phone.isascii() else ()
+        if not digits_tail_len and not non_ascii_groups:
+            return 0, -1
+        phone_tail = int(phone[-digits_tail_len:][-MAX_SUFFIX_KEY_DIGITS:]) if digits_tail_len else 0
+        suffix_slots = self._suffix_slots
+        suffix_keys = self._suffix_keys
+        slots_count = len(suffix_slots)
+        for group, code_len, suffix_key_base in self._complete_match_groups:
+            if group in non_ascii_groups and not phone[-code_len:].isascii():
+                order = self._find_complete_match_in_group(group=group, phone_end=phone[-code_len:])
+                if order is not None:
+                    return code_len, order
+                continue
+            if code_len > digits_tail_len:
+                continue
+            if suffix_key_base is None:
+                order = self._find_complete_match_in_group(group=group, phone_end=phone[-code_len:])
+                if order is not None:
+                    return code_len, order
+                continue
+
+            suffix_key = suffix_key_base + phone_tail % suffix_key_base
+            slot = suffix_key % slots_count
+            position = suffix_slots[slot]
+            while position != NO_SUFFIX:
+                if suffix_keys[position] == suffix_key:
+                    return code_len, self._suffix_orders[position]
+                slot = (slot + 1) % slots_count
+                position = suffix_slots[slot]
+
+        return 0, -1
+
+    def _find_complete_match_in_group(self, group: int, phone_end: str) -> int | None:
+        phone_end_points = list(map(ord, phone_end))
+        for order, digit_points in self._iterate_group(group):
+            if list(digit_points) == phone_end_points:
+                return order
+        return None
+
+    def _find_best_partial_match(self, phone: str) -> tuple[int, int]:
+        # В случае, если совпадений будет не найдено, возвратится первый ОКВЭД в порядке обхода в ширину;
+        best_matches_count = 0
+        best_order = 0
+
+        phone_points = list(map(ord, phone))
+        for group, code_len in enumerate(self._group_lengths):
+            match_masks = self._get_match_masks(group=group, phone_end_points=phone_points[-code_len:])
+            matches_count, best_codes_mask = _find_max_matches_count(_count_matches(match_masks))
+            if not matches_count:
+                continue
+
+            # Порядок кодов в группе совпадает с порядком обхода в ширину, поэтому первый - младший бит маски;
+            position = (best_codes_mask & -best_codes_mask).bit_length() - 1
+            order = self._group_orders[self._group_order_offsets[group] + position]
+            if matches_count > best_matches_count or (matches_count == best_matches_count and order < best_order):
+                best_matches_count = matches_count
+                best_order = order
+
+        return best_matches_count, best_order
+
+    def _get_match_masks(self, group: int, phone_end_points: Sequence[int]) -> list[int]:
+        # Бит кода выставлен в маске позиции, если его цифра на этой позиции совпала с цифрой номера. Маски позиции
+        # упорядочены по цифрам, а позиции без совпавших кодов ничего не добавляют к счётчикам и пропускаются;
+        mask_position_offsets = self._mask_position_offsets
+        mask_digits = self._mask_digits
+        mask_offsets = self._mask_offsets
+        mask_blob = self._mask_blob
+        match_masks = []
+        position = self._group_position_starts[group]
+        for phone_point in phone_end_points:
+            masks_end = mask_position_offsets[position + 1]
+            mask = bisect_left(mask_digits, phone_point, mask_position_offsets[position], masks_end)
+            if mask < masks_end and mask_digits[mask] == phone_point:
+                match_masks.append(int.from_bytes(mask_blob[mask_offsets[mask] : mask_offsets[mask + 1]], 'little'))
+            position += 1
+        return match_masks
+
+    def _iterate_group(self, group: int) -> Iterator[tuple[int, Sequence[int]]]:
+        code_len = self._group_lengths[group]
+        digits_start = self._group_digit_offsets[group]
+        for position in range(self._group_order_offsets[group], self._group_order_offsets[group + 1]):
+            yield self._group_orders[position], self._group_digits[digits_start : digits_start + code_len]
+            digits_start += code_len
+
+
+def build_okved_index(okved_codes: list[dict]) -> OkvedIndex:
+    return OkvedIndex(build_okved_index_tables(okved_codes))
+
+
+def build_okved_index_tables(okved_codes: list[dict]) -> OkvedIndexTables:
+    codes = []
+    titles = []
+    digit_codes_by_len: dict[int, list[tuple[str, int]]] = {}
+    seen_digit_codes = set()
+
+    for order, node in enumerate(_iterate_okved_nodes_in_bfs_order(okved_codes)):
+        codes.append(node['code'])
+        titles.append(node.get('name', ''))
+
+        digit_code = _get_digits_of_code_if_correct(node['code'])
+        if not digit_code or digit_code in seen_digit_codes:
+            # При равенстве цифр кода побеждает ОКВЭД, встретившийся при обходе в ширину раньше;
+            continue
+        seen_digit_codes.add(digit_code)
+        digit_codes_by_len.setdefault(len(digit_code), []).append((digit_code, order))
+
+    code_offsets, code_blob = _build_string_table_arrays(codes)
+    title_offsets, title_blob = _build_string_table_arrays(titles)
+
+    # Коды с не-ASCII цифрами не разбираются в ключи суффиксов и ищутся сравнением по цифрам;
+    suffix_entries = sorted(
+        (int('1' + digit_code), order)
+        for digit_codes in digit_codes_by_len.values()
+        for digit_code, order in digit_codes
+        if digit_code.isascii() and len(digit_code) <= MAX_SUFFIX_KEY_DIGITS
+    )
+
+    suffix_keys = array('q', (suffix_key for suffix_key, _ in suffix_entries))
+
+    group_lengths = array('i')
+    group_order_offsets = array('q', [0])
+    group_orders = array('i')
+    group_digit_offsets = array('q', [0])
+    group_digits = array('I')
+    for code_len in sorted(digit_codes_by_len):
+        group_lengths.append(code_len)
+        for digit_code, order in digit_codes_by_len[code_len]:
+            group_orders.append(order)
+            group_digits.extend(map(ord, digit_code))
+        group_order_offsets.append(len(group_orders))
+        group_digit_offsets.append(len(group_digits))
+
+    return OkvedIndexTables(
+        code_offsets=code_offsets,
+        code_blob=code_blob,
+        title_offsets=title_offsets,
+        title_blob=title_blob,
+        suffix_keys=suffix_keys,
+        suffix_orders=array('i', (order for _, order in suffix_entries)),
+        suffix_slots=_build_suffix_slots(suffix_keys),
+        group_lengths=group_lengths,
+        group_order_offsets=group_order_offsets,
+        group_orders=group_orders,
+        group_digit_offsets=group_digit_offsets,
+        group_digits=group_digits,
+        **_build_mask_tables(group_lengths, group_order_offsets, group_digit_offsets, group_digits),
+    )
+
+
+def _build_string_table_arrays(strings: Iterable[str]) -> tuple[array, array]:
+    offsets = array('q', [0])
+    blob = array('B')
+    for string in strings:
+        blob.frombytes(string.encode('utf-8'))
+        offsets.append(len(blob))
+    return offsets, blob
+
+
+def _build_mask_tables(
+    group_lengths: Sequence[int],
+    group_order_offsets: Sequence[int],
+    group_digit_offsets: Sequence[int],
+    group_digits: Sequence[int],
+) -> dict[str, array]:
+    # Для каждой группы, позиции и цифры - битовая маска кодов группы, у которых на этой позиции эта цифра.
+    # Бит с номером i соответствует i-му коду группы, байты маски записаны от младших к старшим;
+    mask_position_offsets = array('q', [0])
+    mask_digits = array('I')
+    mask_offsets = array('q', [0])
+    mask_blob = array('B')
+    for group, code_len in enumerate(group_lengths):
+        group_size = group_order_offsets[group + 1] - group_order_offsets[group]
+        digits_start = group_digit_offsets[group]
+        for digit_position in range(code_len):
+            bitmaps: dict[int, bytearray] = {}
+            for position in range(group_size):
+                digit_point = group_digits[digits_start + position * code_len + digit_position]
+                if digit_point not in bitmaps:
+                    bitmaps[digit_point] = bytearray((group_size + 7) // 8)
+                bitmaps[digit_point][position >> 3] |= 1 << (position & 7)
+            for digit_point in sorted(bitmaps):
+                mask_digits.append(digit_point)
+                mask_blob.frombytes(bitmaps[digit_point])
+                mask_offsets.append(len(mask_blob))
+            mask_position_offsets.append(len(mask_digits))
+
+    return {
+        'mask_position_offsets': mask_position_offsets,
+        'mask_digits': mask_digits,
+        'mask_offsets': mask_offsets,
+        'mask_blob': mask_blob,
+    }
+
+
+def _build_suffix_slots(suffix_keys: Sequence[int]) -> array:
+    # Слотов больше, чем вдвое против ключей, поэтому цепочки линейного пробирования остаются короткими;
+    suffix_slots = array('i', [NO_SUFFIX]) * (1 << (2 * len(suffix_keys)).bit_length())
+    for position, suffix_key in enumerate(suffix_keys):
+        slot = suffix_key % len(suffix_slots)
+        while suffix_slots[slot] != NO_SUFFIX:
+            slot = (slot + 1) % len(suffix_slots)
+        suffix_slots[slot] = position
+    return suffix_slots
+
+
+def _iterate_okved_nodes_in_bfs_order(okved_codes: list[dict]) -> Iterator[dict]:
+    nodes = []
+    for section in okved_codes:
+        nodes.extend(section['items'])
+
+    while nodes:
+        next_nodes = []
+        for node in nodes:
+            if 'items' in node:
+                next_nodes.extend(node['items'])
+            yield node
+        nodes = next_nodes
+
+
+def _count_matches(match_masks: list[int]) -> list[int]:
+    # Числа совпадений всех кодов группы считаются сразу: разряд k счётчика кода хранится в его бите маски
+    # counter_masks[k], и каждая маска позиции прибавляется к счётчикам поразрядно с переносом;
+    counter_masks: list[int] = []
+    for carry in match_masks:
+        for bit in range(len(counter_masks)):
+            if not carry:
+                break
+            counter_mask = counter_masks[bit]
+            counter_masks[bit] = counter_mask ^ carry
+            carry &= counter_mask
+        if carry:
+            counter_masks.append(carry)
+    return counter_masks
+
+
+def _find_max_matches_count(counter_masks: list[int]) -> tuple[int, int]:
+    # Максимум ищется со старшего разряда: коды с единицей в нём, если такие есть, больше всех остальных;
+    max_matches_count = 0
+    best_codes_mask = -1
+    for bit in reversed(range(len(counter_masks))):
+        codes_mask = best_codes_mask & counter_masks[bit]
+        if codes_mask:
+            best_codes_mask = codes_mask
+            max_matches_count |= 1 << bit
+    return max_matches_count, best_codes_mask
+
+
+def _split_by_matches_count(counter_masks: list[int]) -> list[tuple[int, int]]:
+    # Коды делятся по разрядам счётчика со старшего: на каждом шаге маска уровня распадается на коды с единицей
+    # и с нулём в разряде. Уровни возвращаются по убыванию числа совпадений, коды без совпадений отбрасываются;
+    score_levels = [(0, -1)]
+    for bit in reversed(range(len(counter_masks))):
+        counter_mask = counter_masks[bit]
+        next_score_levels = []
+        for matches_count, codes_mask in score_levels:
+            if codes_mask & counter_mask:
+                next_score_levels.append((matches_count | 1 << bit, codes_mask & counter_mask))
+            if codes_mask & ~counter_mask:
+                next_score_levels.append((matches_count, codes_mask & ~counter_mask))
+        score_levels = next_score_levels
+    return [(matches_count, codes_mask) for matches_count, codes_mask in score_levels if matches_count]
+
+
+def _form_matching_okved_data(code: str, title: str, matches_count: int, complete_match: bool) -> dict:
+    return {
+        'okved': code,
+        'matches_count': matches_count,
+        'complete_match': complete_match,
+        'title': title,
+    }
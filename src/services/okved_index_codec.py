@@ -0,0 +1,91 @@
+import logging
+import struct
+import sys
+from array import array
+from typing import Tuple
+
+from src.services.okved_index import OKVED_INDEX_TABLE_TYPECODES, OkvedIndex, OkvedIndexTables
+
+logger = logging.getLogger(__name__)
+
+OKVED_INDEX_MAGIC = b'OKVEDIDX'
+OKVED_INDEX_FORMAT_VERSION = 3
+
+_BYTE_ORDERS = {'little': 1, 'big': 2}
+_NO_ETAG_LEN = 0xFFFFFFFF
+_ALIGNMENT = 8
+
+# magic, версия формата, порядок байт, длина etag;
+_HEADER = struct.Struct('<8sHBxI')
+# код типа элементов массива, размер массива в байтах;
+_TABLE_HEADER = struct.Struct('<c7xQ')
+
+
+class WrongOkvedIndexFormatError(ValueError): ...
+
+
+def dump_okved_index(etag: str | None, okved_index: OkvedIndex) -> bytes:
+    etag_bytes = b'' if etag is None else etag.encode('utf-8')
+    etag_len = _NO_ETAG_LEN if etag is None else len(etag_bytes)
+
+    chunks = [_HEADER.pack(OKVED_INDEX_MAGIC, OKVED_INDEX_FORMAT_VERSION, _BYTE_ORDERS[sys.byteorder], etag_len)]
+    chunks.append(_pad(etag_bytes, already_written=_HEADER.size))
+
+    for table_name, typecode in OKVED_INDEX_TABLE_TYPECODES:
+        table_bytes = array(typecode, getattr(okved_index.tables, table_name)).tobytes()
+        chunks.append(_TABLE_HEADER.pack(typecode.encode('ascii'), len(table_bytes)))
+        chunks.append(_pad(table_bytes))
+
+    return b''.join(chunks)
+
+
+def load_okved_index(buffer) -> Tuple[str | None, OkvedIndex]:
+    view = memoryview(buffer).cast('B')
+    if len(view) < _HEADER.size:
+        raise WrongOkvedIndexFormatError('Okved index is too short')
+
+    magic, version, byte_order, etag_len = _HEADER.unpack_from(view, 0)
+    if magic != OKVED_INDEX_MAGIC:
+        raise WrongOkvedIndexFormatError('Wrong okved index magic bytes')
+    if version != OKVED_INDEX_FORMAT_VERSION:
+        raise WrongOkvedIndexFormatError('Unsupported okved index format version: {version}'.format(version=version))
+    if byte_order != _BYTE_ORDERS[sys.byteorder]:
+        raise WrongOkvedIndexFormatError('Okved index was built on a machine with another byte order')
+
+    position = _HEADER.size
+    etag = None
+    if etag_len != _NO_ETAG_LEN:
+        etag = _take(view, position, etag_len).tobytes().decode('utf-8')
+        position += etag_len
+    position = _align(position)
+
+    tables = {}
+    for table_name, typecode in OKVED_INDEX_TABLE_TYPECODES:
+        stored_typecode, table_size = _TABLE_HEADER.unpack_from(_take(view, position, _TABLE_HEADER.size))
+        if stored_typecode != typecode.encode('ascii'):
+            raise WrongOkvedIndexFormatError('Unexpected okved index table: {name}'.format(name=table_name))
+        position += _TABLE_HEADER.size
+
+        # Таблицы не копируются: индекс читает их прямо из переданного буфера (например, из mmap);
+        try:
+            tables[table_name] = _take(view, position, table_size).cast(typecode)
+        except TypeError:
+            raise WrongOkvedIndexFormatError('Wrong okved index table size: {name}'.format(name=table_name))
+        position = _align(position + table_size)
+
+    return etag, OkvedIndex(OkvedIndexTables(**tables))
+
+
+def _take(view: memoryview, position: int, size: int) -> memoryview:
+    if position + size > len(view):
+        raise WrongOkvedIndexFormatError('Okved index is truncated')
+    return view[position : position + size]
+
+
+def _pad(data: bytes, already_written: int = 0) -> bytes:
+    padding = _align(already_written + len(data)) - already_written - len(data)
+    return data + b'\0' * padding
+
+
+def _align(position: int) -> int:
+    return (position + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
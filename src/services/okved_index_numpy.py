@@ -0,0 +1,97 @@
+from typing import Iterator, Sequence
+
+import numpy as np
+
+from src.services.okved_index import OkvedIndex, StringTable, _form_matching_okved_data
+
+# Номеров в блоке: матрица совпадений блока занимает block_size * (число кодов в группе) элементов;
+DEFAULT_BLOCK_SIZE = 1024
+# На маленьких пакетах подготовка матриц дороже поиска по индексу;
+MIN_VECTORIZED_BATCH_SIZE = 32
+
+
+class NumpyOkvedMatcher:
+    def __init__(self, okved_index: OkvedIndex, block_size: int = DEFAULT_BLOCK_SIZE):
+        tables = okved_index.tables
+        self._okved_index = okved_index
+        self._block_size = block_size
+        self._codes = StringTable(offsets=tables.code_offsets, blob=tables.code_blob)
+        self._titles = StringTable(offsets=tables.title_offsets, blob=tables.title_blob)
+
+        # Ключ совпадения - число совпавших цифр * key_base + (key_base - 1 - порядок обхода в ширину):
+        # максимум ключа даёт наибольшее число совпадений, а при равенстве - ОКВЭД, встретившийся раньше;
+        self._key_base = len(self._codes) + 1
+
+        group_orders = np.asarray(tables.group_orders, dtype=np.int64)
+        group_digits = np.asarray(tables.group_digits, dtype=np.uint32)
+        self._groups = []
+        for group, code_len in enumerate(tables.group_lengths):
+            orders = group_orders[tables.group_order_offsets[group] : tables.group_order_offsets[group + 1]]
+            digits_start = tables.group_digit_offsets[group]
+            digits_end = tables.group_digit_offsets[group + 1]
+            digits = group_digits[digits_start:digits_end].reshape(len(orders), code_len)
+            self._groups.append((code_len, digits, self._key_base - 1 - orders))
+
+    def find_matching_okved_codes(self, phones: Sequence[str]) -> list[dict[str, str | int | bool]]:
+        if not len(self._codes) or len(phones) < MIN_VECTORIZED_BATCH_SIZE:
+            return self._okved_index.find_matching_okved_codes(phones)
+
+        results: list[dict | None] = [None] * len(phones)
+        for positions, phone_points in _iterate_phone_blocks(phones, block_size=self._block_size):
+            complete_keys, partial_keys = self._find_best_match_keys(phone_points)
+            for position, complete_key, partial_key in zip(positions, complete_keys.tolist(), partial_keys.tolist()):
+                results[position] = self._form_matching_okved_data(complete_key, partial_key)
+        return results
+
+    def _find_best_match_keys(self, phone_points: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        phones_count, phone_len = phone_points.shape
+        complete_keys = np.zeros(phones_count, dtype=np.int64)
+        # В случае, если совпадений будет не найдено, возвратится первый ОКВЭД в порядке обхода в ширину;
+        partial_keys = np.full(phones_count, self._key_base - 1, dtype=np.int64)
+
+        for code_len, digits, order_keys in self._groups:
+            if code_len <= phone_len:
+                phone_end_points = phone_points[:, phone_len - code_len :]
+            else:
+                # Как и zip в эталонной реализации, длинный код сравнивается с номером с начала;
+                phone_end_points = phone_points
+                digits = digits[:, :phone_len]
+
+            matches_counts = np.zeros((phones_count, len(order_keys)), dtype=np.int16)
+            for position in range(phone_end_points.shape[1]):
+                matches_counts += phone_end_points[:, position, None] == digits[None, :, position]
+
+            match_keys = matches_counts.astype(np.int64) * self._key_base + order_keys
+            np.maximum(partial_keys, match_keys.max(axis=1), out=partial_keys)
+
+            if code_len <= phone_len:
+                # Число совпадений полного совпадения равно длине кода, поэтому ключ больше у более длинного кода;
+                complete_match_keys = np.where(matches_counts == code_len, match_keys, 0)
+                np.maximum(complete_keys, complete_match_keys.max(axis=1), out=complete_keys)
+
+        return complete_keys, partial_keys
+
+    def _form_matching_okved_data(self, complete_key: int, partial_key: int) -> dict[str, str | int | bool]:
+        complete_match = complete_key > 0
+        matches_count, order_key = divmod(complete_key if complete_match else partial_key, self._key_base)
+        order = self._key_base - 1 - order_key
+        return _form_matching_okved_data(
+            code=self._codes[order],
+            title=self._titles[order],
+            matches_count=matches_count,
+            complete_match=complete_match,
+        )
+
+
+def _iterate_phone_blocks(phones: Sequence[str], block_size: int) -> Iterator[tuple[list[int], np.ndarray]]:
+    # Номера разной длины кодируются в разные матрицы кодов символов: (число номеров, длина номера);
+    positions_by_len: dict[int, list[int]] = {}
+    for position, phone in enumerate(phones):
+        positions_by_len.setdefault(len(phone), []).append(position)
+
+    for phone_len, positions in positions_by_len.items():
+        for block_start in range(0, len(positions), block_size):
+            block_positions = positions[block_start : block_start + block_size]
+            encoded_phones = ''.join(phones[position] for position in block_positions).encode('utf-32-le')
+            phone_points = np.frombuffer(encoded_phones, dtype='<u4').reshape(len(block_positions), phone_len)
+            yield block_positions, phone_points
@@ -0,0 +1,163 @@
+from array import array
+from typing import Iterator
+
+from src.services.okved_index import StringTable, _build_string_table_arrays
+
+NO_PARENT = -1
+NO_NAME = -1
+
+
+class OkvedNode:
+    # Узел не хранит своих данных, а только ссылается на строку в параллельных массивах реестра;
+    __slots__ = ('_registry', 'order')
+
+    def __init__(self, registry: 'OkvedRegistry', order: int):
+        self._registry = registry
+        self.order = order
+
+    def __repr__(self) -> str:
+        return 'OkvedNode(order={order}, code={code!r})'.format(order=self.order, code=self.code)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, OkvedNode) and self._registry is other._registry and self.order == other.order
+
+    def __hash__(self) -> int:
+        return hash((id(self._registry), self.order))
+
+    @property
+    def code(self) -> str:
+        return self._registry.codes[self.order]
+
+    @property
+    def name(self) -> str | None:
+        name_id = self._registry.name_ids[self.order]
+        return None if name_id == NO_NAME else self._registry.names[name_id]
+
+    @property
+    def depth(self) -> int:
+        return self._registry.depths[self.order]
+
+    @property
+    def parent(self) -> 'OkvedNode | None':
+        parent_order = self._registry.parents[self.order]
+        return None if parent_order == NO_PARENT else OkvedNode(self._registry, parent_order)
+
+    @property
+    def children(self) -> list['OkvedNode']:
+        child_offsets = self._registry.child_offsets
+        return [
+            OkvedNode(self._registry, order)
+            for order in range(child_offsets[self.order], child_offsets[self.order + 1])
+        ]
+
+    def to_dict(self) -> dict:
+        node = {'code': self.code}
+        name = self.name
+        if name is not None:
+            node['name'] = name
+        node.update(self._registry.extra_fields.get(self.order, {}))
+        if self._registry.has_items[self.order]:
+            node['items'] = [child.to_dict() for child in self.children]
+        return node
+
+
+class OkvedRegistry:
+    # Дерево ОКВЭД в порядке обхода в ширину, включая разделы. Потомки каждого узла при таком обходе идут подряд,
+    # поэтому для них хватает одного смещения на узел. Названия хранятся в таблице строк по одному разу;
+    def __init__(
+        self,
+        codes: StringTable,
+        names: StringTable,
+        name_ids: array,
+        parents: array,
+        depths: array,
+        child_offsets: array,
+        has_items: array,
+        sections_count: int,
+        extra_fields: dict[int, dict],
+    ):
+        self.codes = codes
+        self.names = names
+        self.name_ids = name_ids
+        self.parents = parents
+        self.depths = depths
+        self.child_offsets = child_offsets
+        # У листьев ключ items в реестре бывает, а бывает и нет: флаг нужен, чтобы дерево восстанавливалось как было;
+        self.has_items = has_items
+        self.sections_count = sections_count
+        # Поля узлов, кроме кода, названия и вложенных узлов, встречаются редко и хранятся только для таких узлов;
+        self.extra_fields = extra_fields
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, order: int) -> OkvedNode:
+        if not 0 <= order < len(self.codes):
+            raise IndexError(order)
+        return OkvedNode(self, order)
+
+    def __iter__(self) -> Iterator[OkvedNode]:
+        return (OkvedNode(self, order) for order in range(len(self.codes)))
+
+    def get_sections(self) -> list[OkvedNode]:
+        return [OkvedNode(self, order) for order in range(self.sections_count)]
+
+    def to_okved_codes(self) -> list[dict]:
+        return [section.to_dict() for section in self.get_sections()]
+
+
+def build_okved_registry(okved_codes: list[dict]) -> OkvedRegistry:
+    codes = []
+    unique_names = []
+    name_ids_by_name = {}
+    name_ids = array('i')
+    parents = array('i')
+    depths = array('B')
+    child_offsets = array('q')
+    has_items = array('B')
+    extra_fields = {}
+
+    # Очередь обхода в ширину: узлы добавляются в конец, а позиция в ней и есть порядок узла в реестре;
+    queue = [(NO_PARENT, node) for node in okved_codes]
+    for order, (parent_order, node) in enumerate(queue):
+        codes.append(node['code'])
+        name = node.get('name')
+        if type(name) is str:
+            name_ids.append(name_ids_by_name.setdefault(name, len(unique_names)))
+            if name_ids[-1] == len(unique_names):
+                unique_names.append(name)
+        else:
+            name_ids.append(NO_NAME)
+        parents.append(parent_order)
+        depths.append(0 if parent_order == NO_PARENT else min(depths[parent_order] + 1, 255))
+
+        items = node.get('items')
+        node_extra_fields = {
+            key: value
+            for key, value in node.items()
+            if key != 'code'
+            and (key != 'name' or type(value) is not str)
+            and (key != 'items' or type(value) is not list)
+        }
+        if node_extra_fields:
+            extra_fields[order] = node_extra_fields
+
+        child_offsets.append(len(queue))
+        has_items.append(type(items) is list)
+        if type(items) is list:
+            queue.extend((order, child) for child in items)
+    child_offsets.append(len(queue))
+
+    code_offsets, code_blob = _build_string_table_arrays(codes)
+    name_offsets, name_blob = _build_string_table_arrays(unique_names)
+    return OkvedRegistry(
+        codes=StringTable(offsets=code_offsets, blob=code_blob),
+        names=StringTable(offsets=name_offsets, blob=name_blob),
+        name_ids=name_ids,
+        parents=parents,
+        depths=depths,
+        child_offsets=child_offsets,
+        has_items=has_items,
+        sections_count=len(okved_codes),
+        extra_fields=extra_fields,
+    )
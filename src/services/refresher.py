@@ -0,0 +1,33 @@
+import logging
+import threading
+
+from src.services.okved import OkvedService
+
+logger = logging.getLogger(__name__)
+
+
+class OkvedSnapshotRefresher:
+    def __init__(self, okved_service: OkvedService, interval: float):
+        self._okved_service = okved_service
+        self._interval = interval
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='okved-snapshot-refresher', daemon=True)
+        self._thread.start()
+        logger.info('Фоновое обновление ОКВЭД запущено, интервал %s с;', self._interval)
+
+    def stop(self, timeout: float | None = None) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        # Загрузка и построение индекса идут в этом потоке, а поиски продолжают работать на текущем снимке;
+        while not self._stopped.wait(self._interval):
+            self._okved_service.refresh_snapshot()
@@ -0,0 +1,207 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
+from src.repositories.cache import CacheRepository, CantSaveJsonError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESULT_CACHE_SIZE = 100_000
+DEFAULT_RESULT_CACHE_TTL = 24 * 60 * 60
+
+
+class ResultCacheStats:
+    def __init__(self, hits: int, misses: int, evictions: int, expirations: int, size: int):
+        self.hits = hits
+        self.misses = misses
+        self.evictions = evictions
+        self.expirations = expirations
+        self.size = size
+
+    def __repr__(self) -> str:
+        return (
+            'ResultCacheStats(hits={hits}, misses={misses}, evictions={evictions}, expirations={expirations}, '
+            'size={size})'
+        ).format(
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            expirations=self.expirations,
+            size=self.size,
+        )
+
+
+class OkvedResultCache:
+    def __init__(
+        self,
+        max_size: int = DEFAULT_RESULT_CACHE_SIZE,
+        ttl: float = DEFAULT_RESULT_CACHE_TTL,
+        clock: Callable[[], float] = time.time,
+        persistent: bool = False,
+    ):
+        self._max_size = max_size
+        self._ttl = ttl
+        # Время записи берётся по настенным часам, чтобы срок жизни записей переживал перезапуск CLI;
+        self._clock = clock
+        self._lock = threading.Lock()
+        # Ключ - etag снимка ОКВЭД и нормализованный номер, значение - время записи и найденный ОКВЭД;
+        self._entries: OrderedDict[tuple[str, str], tuple[float, dict]] = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        # Ключи, записанные после загрузки или сохранения на диск: дописываются в файл только они. Без сохранения
+        # на диск ключи не запоминаются, иначе их набор рос бы с каждым новым номером;
+        self._persistent = persistent
+        self._unsaved_keys: dict[tuple[str, str], None] = {}
+        # Число строк в файле результатов, по нему решается, пора ли переписать файл заново;
+        self._persisted_count = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, etag: str, phone: str) -> dict | None:
+        key = (etag, phone)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+
+            stored_at, okved_data = entry
+            if self._clock() - stored_at >= self._ttl:
+                del self._entries[key]
+                self._unsaved_keys.pop(key, None)
+                self._expirations += 1
+                self._misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._hits += 1
+        # Вызывающий код получает копию, чтобы её изменение не портило закэшированный результат;
+        return dict(okved_data)
+
+    def put(self, etag: str, phone: str, okved_data: dict) -> None:
+        if self._max_size <= 0:
+            return
+        key = (etag, phone)
+        with self._lock:
+            self._entries[key] = (self._clock(), dict(okved_data))
+            self._entries.move_to_end(key)
+            if self._persistent:
+                self._unsaved_keys[key] = None
+            while len(self._entries) > self._max_size:
+                evicted_key, _ = self._entries.popitem(last=False)
+                self._unsaved_keys.pop(evicted_key, None)
+                self._evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._unsaved_keys.clear()
+
+    def get_stats(self) -> ResultCacheStats:
+        with self._lock:
+            return ResultCacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                expirations=self._expirations,
+                size=len(self._entries),
+            )
+
+    def dump_entries(self, etag: str | None = None) -> list[list]:
+        # Записи выгружаются от давно использованных к недавним, чтобы после загрузки сохранился порядок вытеснения;
+        now = self._clock()
+        with self._lock:
+            return [
+                [entry_etag, phone, stored_at, okved_data]
+                for (entry_etag, phone), (stored_at, okved_data) in self._entries.items()
+                if (etag is None or entry_etag == etag) and now - stored_at < self._ttl
+            ]
+
+    def dump_unsaved_entries(self, etag: str | None = None) -> list[list]:
+        now = self._clock()
+        with self._lock:
+            unsaved_entries = []
+            for key in self._unsaved_keys:
+                entry = self._entries.get(key)
+                if entry is None or (etag is not None and key[0] != etag) or now - entry[0] >= self._ttl:
+                    continue
+                unsaved_entries.append([key[0], key[1], entry[0], entry[1]])
+            return unsaved_entries
+
+    def mark_saved(self, persisted_count: int) -> None:
+        with self._lock:
+            self._unsaved_keys.clear()
+            self._persisted_count = persisted_count
+
+    def get_max_size(self) -> int:
+        return self._max_size
+
+    def get_persisted_count(self) -> int:
+        return self._persisted_count
+
+    def load_entries(self, entries: list) -> int:
+        if self._max_size <= 0:
+            return 0
+        now = self._clock()
+        loaded_count = 0
+        with self._lock:
+            self._persisted_count = len(entries)
+            for entry in entries[-self._max_size :]:
+                if not _is_correct_entry(entry) or now - entry[2] >= self._ttl:
+                    continue
+                etag, phone, stored_at, okved_data = entry
+                self._entries[(etag, phone)] = (stored_at, okved_data)
+                self._entries.move_to_end((etag, phone))
+                loaded_count += 1
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+        return loaded_count
+
+
+def load_okved_result_cache_from_cache(cache_repo: CacheRepository, result_cache: OkvedResultCache) -> int:
+    entries = cache_repo.get_okved_results_from_cache()
+    if entries is None:
+        return 0
+    loaded_count = result_cache.load_entries(entries)
+    logger.info('Из кэша загружено результатов поиска ОКВЭД: %s;', loaded_count)
+    return loaded_count
+
+
+def save_okved_result_cache_to_cache(
+    cache_repo: CacheRepository,
+    result_cache: OkvedResultCache,
+    etag: str | None = None,
+) -> None:
+    # Если все поиски обошлись кэшем, файл не трогается. Иначе в него дописываются только новые результаты,
+    # а целиком он переписывается, когда строк в нём стало вдвое больше размера кэша;
+    unsaved_entries = result_cache.dump_unsaved_entries(etag=etag)
+    if not unsaved_entries:
+        return
+
+    try:
+        persisted_count = result_cache.get_persisted_count() + len(unsaved_entries)
+        if persisted_count > 2 * result_cache.get_max_size():
+            entries = result_cache.dump_entries(etag=etag)
+            cache_repo.save_okved_results_to_cache(entries)
+            persisted_count = len(entries)
+        else:
+            cache_repo.append_okved_results_to_cache(unsaved_entries)
+    except CantSaveJsonError:
+        logger.warning('Не удалось сохранить результаты поиска ОКВЭД в кэш;')
+        return
+    result_cache.mark_saved(persisted_count=persisted_count)
+
+
+def _is_correct_entry(entry) -> bool:
+    return (
+        type(entry) is list
+        and len(entry) == 4
+        and type(entry[1]) is str
+        and type(entry[2]) in (int, float)
+        and type(entry[3]) is dict
+    )
@@ -0,0 +1,10 @@
+from src.services.okved_index import OkvedIndex
+from src.services.okved_registry import OkvedRegistry
+
+
+class OkvedSnapshot:
+    def __init__(self, etag: str | None, okved_index: OkvedIndex, okved_registry: OkvedRegistry | None = None):
+        self.etag = etag
+        self.okved_index = okved_index
+        # Снимок, загруженный из бинарного кэша, исходного дерева ОКВЭД не содержит;
+        self.okved_registry = okved_registry
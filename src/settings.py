@@ -1,20 +1,63 @@
-from pydantic import BaseModel
-from pyhocon import ConfigFactory
+from functools import lru_cache
 
-github_config = ConfigFactory.parse_file('settings/github.conf')
-cache_config = ConfigFactory.parse_file('settings/cache.conf')
+from pydantic import BaseModel
 
 
 class GithubSettings(BaseModel):
-    owner: str = github_config['config']['owner']
-    repo: str = github_config['config']['repo']
-    file_path: str = github_config['config']['file_path']
+    owner: str
+    repo: str
+    file_path: str
+    connect_timeout: float = 5
+    read_timeout: float = 30
+    max_retries: int = 3
+    backoff_factor: float = 0.5
+    http2: bool = False
 
 
 class CacheSettings(BaseModel):
-    etag_cache_path: str = cache_config['config']['etag_cache_path']
-    okved_json_cache_path: str = cache_config['config']['okved_json_cache_path']
+    etag_cache_path: str
+    okved_json_cache_path: str
+    okved_manifest_path: str
+    snapshot_revalidate_interval: float = 0
+    snapshot_stale_while_revalidate: bool = False
+    result_cache_size: int = 0
+    result_cache_ttl: float = 24 * 60 * 60
+    result_cache_persist: bool = False
+
+
+class ServerSettings(BaseModel):
+    host: str
+    port: int
+    snapshot_revalidate_interval: float
+    background_refresh: bool = False
+    workers: int = 1
+
+
+class MatchingSettings(BaseModel):
+    engine: str = 'python'
+
+
+# Файл настроек разбирается при первом обращении к соответствующей константе, а не при импорте модуля;
+_LAZY_SETTINGS = {
+    'GITHUB_SETTINGS': (GithubSettings, 'settings/github.conf'),
+    'CACHE_SETTINGS': (CacheSettings, 'settings/cache.conf'),
+    'SERVER_SETTINGS': (ServerSettings, 'settings/server.conf'),
+    'MATCHING_SETTINGS': (MatchingSettings, 'settings/matching.conf'),
+}
+
+
+def __getattr__(name: str) -> BaseModel:
+    if name not in _LAZY_SETTINGS:
+        raise AttributeError('module {module!r} has no attribute {name!r}'.format(module=__name__, name=name))
+
+    settings_class, config_path = _LAZY_SETTINGS[name]
+    settings = settings_class(**_parse_config_file(config_path)['config'])
+    globals()[name] = settings
+    return settings
+
 
+@lru_cache(maxsize=None)
+def _parse_config_file(config_path: str) -> dict:
+    from pyhocon import ConfigFactory
 
-GITHUB_SETTINGS = GithubSettings()
-CACHE_SETTINGS = CacheSettings()
+    return ConfigFactory.parse_file(config_path)
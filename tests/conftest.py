@@ -0,0 +1,51 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+OKVED_CODES = [
+    {
+        'code': 'Раздел 1',
+        'items': [{'code': '81.23.45.67', 'name': 'Разведение гуппи Эндлера', 'items': []}],
+    },
+    {
+        'code': 'Раздел 2',
+        'items': [{'code': '5.67', 'name': 'Разведение сомов анциструсов', 'items': []}],
+    },
+]
+
+NEW_OKVED_CODES = [
+    {
+        'code': 'Раздел 1',
+        'items': [{'code': '45.67', 'name': 'Разведение креветок', 'items': []}],
+    },
+]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def github_client():
+    client = MagicMock()
+    client.check_okved_json_etag.return_value = None
+    return client
+
+
+@pytest.fixture
+def cache_repo():
+    repo = MagicMock()
+    repo.get_okved_etag_from_manifest.return_value = 'cached_etag'
+    repo.get_okved_snapshot_from_manifest.return_value = ('cached_etag', OKVED_CODES)
+    repo.open_okved_index_from_cache.return_value = None
+    repo.get_okved_refreshed_at.return_value = None
+    return repo
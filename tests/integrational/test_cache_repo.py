@@ -1,4 +1,5 @@
 import json
+import threading
 from pathlib import Path
 
 import pytest
@@ -7,6 +8,11 @@ from src.repositories.cache import CacheRepository
 
 TEST_ETAG_CACHE_PATH = 'test_etag_cache.json'
 TEST_OKVED_JSON_PATH = 'test_okved.json'
+TEST_OKVED_MANIFEST_PATH = 'test_okved.manifest.jsonl'
+TEST_OKVED_LOCK_PATH = 'test_okved.lock'
+TEST_OKVED_RESULTS_PATH = 'test_okved.results.jsonl'
+TEST_OKVED_CHANGES_PATH = 'test_okved.changes.jsonl'
+TEST_OKVED_GENERATION_PATH = 'test_okved.generation'
 TEST_CACHED_ETAG = 'test_etag_str'
 
 
@@ -15,6 +21,15 @@ def cache_repo():
     return CacheRepository(etag_cache_path=TEST_ETAG_CACHE_PATH, okved_json_cache_path=TEST_OKVED_JSON_PATH)
 
 
+@pytest.fixture
+def okved_manifest_file():
+    file_path = Path(TEST_OKVED_MANIFEST_PATH)
+    yield file_path
+
+    if file_path.exists():
+        file_path.unlink()
+
+
 @pytest.fixture
 def correct_etag_json_file():
     file_path = Path(TEST_ETAG_CACHE_PATH)
@@ -205,3 +220,199 @@ def test_load_okved_codes__invalid_file__returns_none(cache_repo, invalid_okved_
 
 def test_load_okved_codes__no_list_in_content__returns_none(cache_repo, no_list_in_okved_json_file):
     assert cache_repo.get_okved_codes_from_cache() is None
+
+
+def test_save_okved_snapshot__loads_same_etag_and_codes(cache_repo, okved_codes, okved_manifest_file):
+    cache_repo.save_okved_snapshot_to_manifest(etag=TEST_CACHED_ETAG, okved_codes=okved_codes)
+
+    assert cache_repo.get_okved_etag_from_manifest() == TEST_CACHED_ETAG
+    assert cache_repo.get_okved_snapshot_from_manifest() == (TEST_CACHED_ETAG, okved_codes)
+
+
+def test_save_okved_snapshot__overwrites_without_temp_files(cache_repo, okved_codes, okved_manifest_file):
+    cache_repo.save_okved_snapshot_to_manifest(etag='old_etag', okved_codes=[])
+    cache_repo.save_okved_snapshot_to_manifest(etag=TEST_CACHED_ETAG, okved_codes=okved_codes)
+
+    assert cache_repo.get_okved_snapshot_from_manifest() == (TEST_CACHED_ETAG, okved_codes)
+    assert not list(Path('.').glob('.{name}.*.tmp'.format(name=TEST_OKVED_MANIFEST_PATH)))
+
+
+def test_save_okved_snapshot__compact_payload(cache_repo, okved_codes, okved_manifest_file):
+    cache_repo.save_okved_snapshot_to_manifest(etag=TEST_CACHED_ETAG, okved_codes=okved_codes)
+
+    header_line, payload_line = okved_manifest_file.read_bytes().split(b'\n', 1)
+
+    assert json.loads(header_line)['etag'] == TEST_CACHED_ETAG
+    assert payload_line == json.dumps(okved_codes, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def test_load_okved_snapshot__corrupted_payload__returns_none(cache_repo, okved_codes, okved_manifest_file):
+    cache_repo.save_okved_snapshot_to_manifest(etag=TEST_CACHED_ETAG, okved_codes=okved_codes)
+    content = okved_manifest_file.read_bytes()
+    okved_manifest_file.write_bytes(content.replace('Раздел A'.encode('utf-8'), 'Раздел Z'.encode('utf-8')))
+
+    assert cache_repo.get_okved_snapshot_from_manifest() is None
+
+
+def test_load_okved_snapshot__truncated_file__returns_none(cache_repo, okved_codes, okved_manifest_file):
+    cache_repo.save_okved_snapshot_to_manifest(etag=TEST_CACHED_ETAG, okved_codes=okved_codes)
+    content = okved_manifest_file.read_bytes()
+    okved_manifest_file.write_bytes(content[:-10])
+
+    assert cache_repo.get_okved_snapshot_from_manifest() is None
+
+
+def test_load_okved_snapshot__unknown_version__returns_none(cache_repo, okved_manifest_file):
+    okved_manifest_file.write_bytes(b'{"version":999,"etag":"e","size":2,"sha256":"x"}\n[]')
+
+    assert cache_repo.get_okved_etag_from_manifest() is None
+    assert cache_repo.get_okved_snapshot_from_manifest() is None
+
+
+def test_load_okved_snapshot__file_doesnt_exist__returns_none(cache_repo):
+    assert cache_repo.get_okved_etag_from_manifest() is None
+    assert cache_repo.get_okved_snapshot_from_manifest() is None
+
+
+@pytest.fixture
+def okved_index_file():
+    file_path = Path(TEST_OKVED_JSON_PATH).with_suffix('.index.bin')
+    yield file_path
+
+    if file_path.exists():
+        file_path.unlink()
+
+
+def test_save_okved_index__opens_memory_mapped_file(cache_repo, okved_index_file):
+    cache_repo.save_okved_index_to_cache(okved_index_data=b'OKVEDIDX-test-data')
+
+    okved_index_buffer = cache_repo.open_okved_index_from_cache()
+
+    assert okved_index_buffer[:] == b'OKVEDIDX-test-data'
+
+
+def test_open_okved_index__empty_file__returns_none(cache_repo, okved_index_file):
+    okved_index_file.write_bytes(b'')
+    assert cache_repo.open_okved_index_from_cache() is None
+
+
+def test_open_okved_index__file_doesnt_exist__returns_none(cache_repo):
+    assert cache_repo.open_okved_index_from_cache() is None
+
+
+@pytest.fixture
+def okved_lock_file():
+    file_path = Path(TEST_OKVED_LOCK_PATH)
+    yield file_path
+
+    if file_path.exists():
+        file_path.unlink()
+
+
+def test_lock_okved_refresh__second_holder_waits_for_first(cache_repo, okved_lock_file):
+    other_cache_repo = CacheRepository(etag_cache_path=TEST_ETAG_CACHE_PATH, okved_json_cache_path=TEST_OKVED_JSON_PATH)
+    other_lock_acquired = threading.Event()
+
+    def lock_okved_refresh() -> None:
+        with other_cache_repo.lock_okved_refresh():
+            other_lock_acquired.set()
+
+    with cache_repo.lock_okved_refresh():
+        other_holder = threading.Thread(target=lock_okved_refresh)
+        other_holder.start()
+        assert not other_lock_acquired.wait(timeout=0.2)
+
+    assert other_lock_acquired.wait(timeout=5)
+    other_holder.join(timeout=5)
+
+
+def test_save_okved_refreshed_at__roundtrip(cache_repo, okved_lock_file):
+    assert cache_repo.get_okved_refreshed_at() is None
+
+    with cache_repo.lock_okved_refresh():
+        cache_repo.save_okved_refreshed_at(1234.5)
+
+    assert cache_repo.get_okved_refreshed_at() == 1234.5
+
+
+@pytest.fixture
+def okved_results_file():
+    file_path = Path(TEST_OKVED_RESULTS_PATH)
+    yield file_path
+
+    if file_path.exists():
+        file_path.unlink()
+
+
+def test_save_okved_results_to_cache__roundtrip(cache_repo, okved_results_file):
+    okved_results = [['etag', '+79001234567', 1234.5, {'okved': '5.67', 'title': 'Разведение сомов'}]]
+
+    cache_repo.save_okved_results_to_cache(okved_results)
+
+    assert cache_repo.get_okved_results_from_cache() == okved_results
+
+
+def test_append_okved_results_to_cache__appends_to_saved_results(cache_repo, okved_results_file):
+    saved_results = [['etag', '+79001234567', 1234.5, {'okved': '5.67'}]]
+    appended_results = [['etag', '+79001234568', 1235.5, {'okved': '4.56'}]]
+    cache_repo.save_okved_results_to_cache(saved_results)
+
+    cache_repo.append_okved_results_to_cache(appended_results)
+
+    assert cache_repo.get_okved_results_from_cache() == saved_results + appended_results
+
+
+def test_get_okved_results_from_cache__broken_last_line__skips_it(cache_repo, okved_results_file):
+    okved_results = [['etag', '+79001234567', 1234.5, {'okved': '5.67'}]]
+    cache_repo.append_okved_results_to_cache(okved_results)
+    with okved_results_file.open('a') as f:
+        f.write('["etag", "+790')
+
+    assert cache_repo.get_okved_results_from_cache() == okved_results
+
+
+@pytest.fixture
+def okved_changes_file():
+    file_path = Path(TEST_OKVED_CHANGES_PATH)
+    yield file_path
+
+    if file_path.exists():
+        file_path.unlink()
+
+
+def test_append_okved_change_to_log__changes_read_in_order(cache_repo, okved_changes_file):
+    change_records = [
+        {'version': 1, 'from_etag': None, 'to_etag': 'etag_1', 'renamed': [{'code': '5.67', 'name': 'Сомы'}]},
+        {'version': 1, 'from_etag': 'etag_1', 'to_etag': 'etag_2', 'removed': ['5.67']},
+    ]
+
+    for change_record in change_records:
+        cache_repo.append_okved_change_to_log(change_record)
+    with okved_changes_file.open('ab') as f:
+        f.write(b'{"version": 1, "from_e')
+
+    assert cache_repo.get_okved_changes_from_log() == change_records
+
+
+@pytest.fixture
+def okved_generation_file():
+    file_path = Path(TEST_OKVED_GENERATION_PATH)
+    yield file_path
+
+    if file_path.exists():
+        file_path.unlink()
+
+
+def test_get_okved_generation__file_doesnt_exist__returns_zero(cache_repo, okved_generation_file):
+    assert cache_repo.get_okved_generation() == 0
+
+
+def test_bump_okved_generation__other_repo_sees_new_generation(cache_repo, okved_generation_file):
+    other_cache_repo = CacheRepository(etag_cache_path=TEST_ETAG_CACHE_PATH, okved_json_cache_path=TEST_OKVED_JSON_PATH)
+    assert other_cache_repo.get_okved_generation() == 0
+
+    assert cache_repo.bump_okved_generation() == 1
+    assert other_cache_repo.get_okved_generation() == 1
+
+    assert cache_repo.bump_okved_generation() == 2
+    assert other_cache_repo.get_okved_generation() == 2
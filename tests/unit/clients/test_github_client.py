@@ -1,11 +1,14 @@
+import asyncio
 import base64
+import contextlib
 import json
-from unittest.mock import patch
+import time
+from unittest.mock import AsyncMock, patch
 
 import httpx
 import pytest
 
-from src.clients.github import GithubClient
+from src.clients.github import AsyncGithubClient, GithubClient, JsonArrayStreamParser
 
 
 @pytest.fixture
@@ -20,9 +23,32 @@ def mock_httpx_client_get():
         yield mock
 
 
+@pytest.fixture
+def mock_httpx_client_stream():
+    with patch('src.clients.github.httpx_client.stream') as mock:
+        yield mock
+
+
+@pytest.fixture
+def mock_httpx_async_client_get():
+    with patch('src.clients.github.httpx_async_client.get', new_callable=AsyncMock) as mock:
+        yield mock
+
+
+@pytest.fixture
+def mock_httpx_async_client_stream():
+    with patch('src.clients.github.httpx_async_client.stream') as mock:
+        yield mock
+
+
 @pytest.fixture
 def github_client() -> GithubClient:
-    return GithubClient(owner='test_owner', repo='test_case_repo', file_path='okveds.json')
+    return GithubClient(owner='test_owner', repo='test_case_repo', file_path='okveds.json', backoff_factor=0)
+
+
+@pytest.fixture
+def async_github_client() -> AsyncGithubClient:
+    return AsyncGithubClient(owner='test_owner', repo='test_case_repo', file_path='okveds.json', backoff_factor=0)
 
 
 def test_get_new_okved_json_etag(github_client, mock_httpx_client_head):
@@ -37,22 +63,173 @@ def test_check_actual_okved_json_etag(github_client, mock_httpx_client_head):
     cached_etag = 'test_etag_string'
     check_result = github_client.check_okved_json_etag(cached_etag=cached_etag)
     assert check_result is None
+    assert github_client.is_etag_check_succeeded()
+
+
+OKVEDS_LIST = [
+    {'code': 'Раздел A', 'name': 'Сельское хозяйство', 'items': [{'code': '01.11', 'name': 'Выращивание зерновых'}]},
+    {'code': 'Раздел B', 'name': 'Добыча полезных ископаемых', 'items': []},
+]
 
 
-def test_get_new_okved_json(github_client, mock_httpx_client_get):
+def test_get_new_okved_json(github_client, mock_httpx_client_stream):
+    mock_httpx_client_stream.return_value = _streamed_response(200, content=_get_json_bytes(OKVEDS_LIST))
+    okved_codes = github_client.load_okved_json()
+
+    assert okved_codes == OKVEDS_LIST
+    assert mock_httpx_client_stream.call_args.kwargs['headers'] == {'Accept': 'application/vnd.github.raw+json'}
+
+
+def test_get_new_okved_json__raw_media_type_rejected__uses_contents_api(
+    github_client,
+    mock_httpx_client_stream,
+    mock_httpx_client_get,
+):
     okveds_list = [{'code': 123, 'name': 'abc', 'items': []}]
     okveds_encoded_bytes = _get_encoded_bytes_from_list(okveds_list)
+    mock_httpx_client_stream.return_value = _streamed_response(415)
     mock_httpx_client_get.return_value = httpx.Response(200, json={'content': okveds_encoded_bytes})
     okved_codes = github_client.load_okved_json()
 
     assert okved_codes == okveds_list
 
 
+def test_get_new_okved_json__large_file__streams_download_url(
+    github_client,
+    mock_httpx_client_stream,
+    mock_httpx_client_get,
+):
+    download_url = 'https://raw.githubusercontent.com/test_owner/test_case_repo/main/okveds.json'
+    mock_httpx_client_stream.side_effect = [
+        _streamed_response(403, json={'errors': [{'code': 'too_large'}]}),
+        _streamed_response(200, content=_get_json_bytes(OKVEDS_LIST)),
+    ]
+    mock_httpx_client_get.return_value = httpx.Response(
+        200,
+        json={'content': '', 'encoding': 'none', 'download_url': download_url},
+    )
+
+    assert github_client.load_okved_json() == OKVEDS_LIST
+    assert mock_httpx_client_stream.call_args.args[1] == download_url
+
+
+def test_check_okved_json_etag__reuses_pooled_client(github_client, mock_httpx_client_head):
+    mock_httpx_client_head.return_value = httpx.Response(304, headers={})
+    first_client = github_client._get_client()
+
+    github_client.check_okved_json_etag(cached_etag='test_etag_string')
+    github_client.check_okved_json_etag(cached_etag='test_etag_string')
+
+    assert github_client._get_client() is first_client
+
+
+def test_check_okved_json_etag__transport_errors__retries_and_returns_none(github_client, mock_httpx_client_head):
+    mock_httpx_client_head.side_effect = httpx.ConnectError('Name or service not known')
+
+    assert github_client.check_okved_json_etag(cached_etag=None) is None
+    assert mock_httpx_client_head.call_count == 4
+    assert not github_client.is_etag_check_succeeded()
+
+
+def test_load_okved_json__server_error__retries_until_success(github_client, mock_httpx_client_stream):
+    mock_httpx_client_stream.side_effect = [
+        _streamed_response(503),
+        httpx.ReadTimeout('timed out'),
+        _streamed_response(200, content=_get_json_bytes(OKVEDS_LIST)),
+    ]
+
+    assert github_client.load_okved_json() == OKVEDS_LIST
+    assert mock_httpx_client_stream.call_count == 3
+
+
+def test_load_okved_json__not_found__doesnt_retry(github_client, mock_httpx_client_stream):
+    mock_httpx_client_stream.return_value = _streamed_response(404)
+
+    assert github_client.load_okved_json() is None
+    assert mock_httpx_client_stream.call_count == 1
+
+
+def test_load_okved_json__rate_limit_reset_is_far__doesnt_wait(github_client, mock_httpx_client_stream):
+    reset_at = str(int(time.time()) + 3600)
+    mock_httpx_client_stream.return_value = _streamed_response(
+        403,
+        headers={'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': reset_at},
+    )
+
+    assert github_client.load_okved_json() is None
+    assert mock_httpx_client_stream.call_count == 1
+
+
+def test_load_okved_json__retry_after__retries(github_client, mock_httpx_client_stream):
+    mock_httpx_client_stream.side_effect = [
+        _streamed_response(429, headers={'Retry-After': '0'}),
+        _streamed_response(200, content=_get_json_bytes(OKVEDS_LIST)),
+    ]
+
+    assert github_client.load_okved_json() == OKVEDS_LIST
+
+
+def test_load_okved_json__wrong_response_format__returns_none(github_client, mock_httpx_client_stream):
+    mock_httpx_client_stream.return_value = _streamed_response(200, content=b'{"message": "no content"}')
+    assert github_client.load_okved_json() is None
+
+
+def test_async_load_okved_json__retries_until_success(async_github_client, mock_httpx_async_client_stream):
+    mock_httpx_async_client_stream.side_effect = [
+        httpx.ConnectTimeout('timed out'),
+        _streamed_response(200, content=_get_json_bytes(OKVEDS_LIST)),
+    ]
+
+    async def load_okved_json():
+        async with async_github_client:
+            return await async_github_client.load_okved_json()
+
+    assert asyncio.run(load_okved_json()) == OKVEDS_LIST
+    assert mock_httpx_async_client_stream.call_count == 2
+
+
+def test_async_load_okved_json__raw_media_type_rejected__uses_contents_api(
+    async_github_client,
+    mock_httpx_async_client_stream,
+    mock_httpx_async_client_get,
+):
+    mock_httpx_async_client_stream.return_value = _streamed_response(406)
+    mock_httpx_async_client_get.return_value = httpx.Response(
+        200,
+        json={'content': _get_encoded_bytes_from_list(OKVEDS_LIST)},
+    )
+
+    assert asyncio.run(async_github_client.load_okved_json()) == OKVEDS_LIST
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 7, 1024])
+def test_json_array_stream_parser__chunked_input__same_as_json_loads(chunk_size):
+    content = json.dumps(OKVEDS_LIST + [12345, 'строка', None, [1, [2]]], ensure_ascii=False, indent=2).encode('utf-8')
+
+    parser = JsonArrayStreamParser()
+    for start in range(0, len(content), chunk_size):
+        parser.feed(content[start : start + chunk_size])
+
+    assert parser.close() == json.loads(content)
+
+
+@pytest.mark.parametrize('content', [b'', b'{"a": 1}', b'[1, 2', b'[1,, 2]', b'[1] 2', b'[1, ]'])
+def test_json_array_stream_parser__invalid_input__raises_value_error(content):
+    parser = JsonArrayStreamParser()
+    with pytest.raises(ValueError):
+        parser.feed(content)
+        parser.close()
+
+
+def _streamed_response(status_code: int, **kwargs) -> contextlib.nullcontext:
+    return contextlib.nullcontext(httpx.Response(status_code, **kwargs))
+
+
+def _get_json_bytes(given_list: list) -> bytes:
+    return json.dumps(given_list, ensure_ascii=False).encode('utf-8')
+
+
 def _get_encoded_bytes_from_list(given_list: list[dict]) -> str:
     okveds_json_string = json.dumps(given_list)
     bytes_string = okveds_json_string.encode('utf-8')
     return base64.b64encode(bytes_string).decode('ascii')
-
-
-# TODO: добавить тесты, проверяющие случаи, когда методы .get() и .head() httpx.Client завершаются неудачно, поднимая
-# исключения.
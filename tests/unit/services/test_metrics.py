@@ -0,0 +1,40 @@
+import pytest
+
+from src.services.metrics import COUNTER_CACHE_HITS, PrometheusMetrics, measure_stage
+
+
+def test_prometheus_metrics__render__cumulative_buckets_sum_and_count():
+    metrics = PrometheusMetrics(buckets=(0.001, 0.01))
+    metrics.observe_stage('match', 0.0005)
+    metrics.observe_stage('match', 0.001)
+    metrics.observe_stage('match', 0.5)
+
+    lines = metrics.render().splitlines()
+
+    assert 'okved_stage_duration_seconds_bucket{stage="match",le="0.001"} 2' in lines
+    assert 'okved_stage_duration_seconds_bucket{stage="match",le="0.01"} 2' in lines
+    assert 'okved_stage_duration_seconds_bucket{stage="match",le="+Inf"} 3' in lines
+    assert 'okved_stage_duration_seconds_sum{stage="match"} 0.5015' in lines
+    assert 'okved_stage_duration_seconds_count{stage="match"} 3' in lines
+
+
+def test_prometheus_metrics__render__counters_are_exported_even_if_zero():
+    metrics = PrometheusMetrics()
+    metrics.increment(COUNTER_CACHE_HITS, 2)
+
+    lines = metrics.render().splitlines()
+
+    assert '# TYPE okved_cache_hits_total counter' in lines
+    assert 'okved_cache_hits_total 2' in lines
+    assert 'okved_cache_misses_total 0' in lines
+    assert 'okved_cache_refreshes_total 0' in lines
+
+
+def test_measure_stage__exception__still_observes_duration():
+    metrics = PrometheusMetrics()
+
+    with pytest.raises(RuntimeError):
+        with measure_stage(metrics, 'download'):
+            raise RuntimeError()
+
+    assert metrics.get_stage_count('download') == 1
@@ -1,3 +1,5 @@
+import random
+
 import pytest
 
 from src.services.okved import (
@@ -6,8 +8,12 @@ from src.services.okved import (
     WrongDigitsNumberError,
     WrongSecondDigitError,
     _compare_code_with_phone,
+    _parse_ascii_phone,
+    _parse_raw_phone,
     find_matching_okved_code,
     normalize_phone,
+    normalize_phones,
+    try_normalize_phone,
 )
 
 
@@ -97,6 +103,35 @@ def test_normalize_phone__wrong_second_digit__raises_corresponding_error(input_s
         normalize_phone(sequence=input_sequence)
 
 
+@pytest.mark.parametrize(
+    'input_sequence, expected',
+    [
+        ('8 (900) 123-45-67', ('+79001234567', '')),
+        ('0+0+089001234567', (False, 'В данном телефонном номере неправильный код страны (8 вместо +7 или 8)')),
+        ('+7+9001234567', ('+79001234567', '')),
+        ('89٠٠1234567', ('+79٠٠1234567', '')),
+        ('٨9001234567', (False, 'В данном телефонном номере неправильный код страны (٨ вместо +7 или 8)')),
+        ('', (False, 'Данный телефонный номер пуст')),
+        ('9001234567', (False, 'В данном телефонном номере неправильное число цифр (10 вместо 11)')),
+        ('84001234567', (False, 'В данном телефонном номере неправильная вторая цифра (4 вместо 9)')),
+    ],
+)
+def test_try_normalize_phone__returns_normalized_phone_or_error_message(input_sequence, expected):
+    assert try_normalize_phone(input_sequence) == expected
+
+
+def test_parse_ascii_phone__random_sequences__same_as_char_by_char_parsing():
+    rnd = random.Random(0)
+    for _ in range(2000):
+        raw_phone = ''.join(rnd.choice('+0123456789 ()-#a') for _ in range(rnd.randint(1, 20)))
+        assert _parse_ascii_phone(raw_phone) == _parse_raw_phone(raw_phone)
+
+
+def test_normalize_phones__same_results_as_single_normalization():
+    raw_phones = ['+79001234567', '', '+19001234567', '8 (900) 000-56-70', 'не номер', '+7 ٩00 123 45 67']
+    assert list(normalize_phones(raw_phones)) == [try_normalize_phone(raw_phone) for raw_phone in raw_phones]
+
+
 def test_find_matching_okved_code__prefer_complete_match():
     phone = '+79001234567'
 
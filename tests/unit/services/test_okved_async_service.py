@@ -0,0 +1,152 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+import pytest
+
+from src.services.matching_engine import MatchingEngine
+from src.services.okved import AsyncOkvedService, OkvedService
+from src.services.okved_index import build_okved_index
+from tests.conftest import NEW_OKVED_CODES
+
+RAW_PHONES = ['+79001234567', '', '+19001234567', '8 (900) 000-56-70', '+7 900 812 34 56', 'не номер']
+
+
+@pytest.fixture
+def async_okved_service(github_client, cache_repo):
+    return AsyncOkvedService(okved_service=OkvedService(github_client=github_client, cache_repo=cache_repo))
+
+
+def test_get_okved__same_results_as_sync_service(async_okved_service, cache_repo):
+    okved_service = OkvedService(github_client=None, cache_repo=cache_repo)
+
+    async def get_okved() -> list:
+        return [await async_okved_service.get_okved(raw_phone) for raw_phone in RAW_PHONES]
+
+    assert asyncio.run(get_okved()) == [okved_service.get_okved(raw_phone) for raw_phone in RAW_PHONES]
+
+
+@pytest.mark.parametrize('matching_engine', [MatchingEngine.python, MatchingEngine.numpy])
+def test_get_okved_batch__same_results_as_sync_service(github_client, cache_repo, matching_engine):
+    if matching_engine is MatchingEngine.numpy:
+        pytest.importorskip('numpy')
+    okved_service = OkvedService(github_client=None, cache_repo=cache_repo, matching_engine=matching_engine)
+    async_okved_service = AsyncOkvedService(
+        okved_service=OkvedService(github_client=github_client, cache_repo=cache_repo, matching_engine=matching_engine)
+    )
+    raw_phones = RAW_PHONES * 500
+
+    batch_results = asyncio.run(async_okved_service.get_okved_batch(iter(raw_phones)))
+
+    assert batch_results == list(okved_service.get_okved_batch(raw_phones))
+
+
+def test_get_okved_batch__only_invalid_phones__doesnt_check_etag(async_okved_service, github_client):
+    results = asyncio.run(async_okved_service.get_okved_batch(['', 'не номер']))
+
+    assert [result[2] for result in results] == [None, None]
+    github_client.check_okved_json_etag.assert_not_called()
+
+
+def test_get_okved__concurrent_cold_lookups__refresh_okved_codes_once(github_client, cache_repo):
+    async_okved_service = AsyncOkvedService(
+        okved_service=OkvedService(github_client=github_client, cache_repo=cache_repo, revalidate_interval=60)
+    )
+
+    async def get_okved_concurrently() -> list:
+        return await asyncio.gather(*(async_okved_service.get_okved('+79001234567') for _ in range(10)))
+
+    results = asyncio.run(get_okved_concurrently())
+
+    assert {result[1]['okved'] for result in results} == {'5.67'}
+    assert github_client.check_okved_json_etag.call_count == 1
+
+
+def test_get_okved__refresh_in_executor_and_actual_lookups_inline(monkeypatch, github_client, cache_repo):
+    build_threads = []
+
+    def build_okved_index_in_thread(okved_codes: list[dict]):
+        build_threads.append(threading.current_thread())
+        return build_okved_index(okved_codes)
+
+    monkeypatch.setattr('src.services.okved.build_okved_index', build_okved_index_in_thread)
+    okved_service = OkvedService(github_client=github_client, cache_repo=cache_repo, revalidate_interval=60)
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix='okved-refresh') as executor:
+        async_okved_service = AsyncOkvedService(okved_service=okved_service, executor=executor)
+        assert asyncio.run(async_okved_service.get_okved('+79001234567'))[1]['okved'] == '5.67'
+
+        lookup_threads = []
+        okved_service.get_okved_from_snapshot = lambda snapshot, raw_phone: lookup_threads.append(
+            threading.current_thread()
+        )
+        asyncio.run(async_okved_service.get_okved('+79001234567'))
+
+    assert [thread.name.startswith('okved-refresh') for thread in build_threads] == [True]
+    assert lookup_threads == [threading.main_thread()]
+
+
+def test_get_okved__interval_expires_during_inline_lookup__doesnt_check_etag_on_loop(github_client, cache_repo):
+    clock = MagicMock(return_value=1000.0)
+    async_okved_service = AsyncOkvedService(
+        okved_service=OkvedService(
+            github_client=github_client,
+            cache_repo=cache_repo,
+            revalidate_interval=60,
+            clock=clock,
+        )
+    )
+    asyncio.run(async_okved_service.get_okved('+79001234567'))
+    # Снимок ещё актуален при выборе пути, но интервал проверки истекает сразу после этого;
+    clock.side_effect = [1059.0, 1061.0, 1061.0]
+
+    assert asyncio.run(async_okved_service.get_okved('+79001234567'))[1]['okved'] == '5.67'
+    assert github_client.check_okved_json_etag.call_count == 1
+
+
+def test_get_okved__new_etag__saves_logs_and_publishes_okved_codes(async_okved_service, github_client, cache_repo):
+    github_client.check_okved_json_etag.return_value = 'new_etag'
+    github_client.load_okved_json.return_value = NEW_OKVED_CODES
+
+    assert asyncio.run(async_okved_service.get_okved('+79001234567'))[1]['okved'] == '45.67'
+    cache_repo.save_okved_snapshot_to_manifest.assert_called_once_with(etag='new_etag', okved_codes=NEW_OKVED_CODES)
+    change_record = cache_repo.append_okved_change_to_log.call_args.args[0]
+    assert (change_record['from_etag'], change_record['to_etag']) == ('cached_etag', 'new_etag')
+    cache_repo.bump_okved_generation.assert_called_once_with()
+
+
+def test_get_okved__offline__answers_from_cache_without_github(cache_repo):
+    async_okved_service = AsyncOkvedService(okved_service=OkvedService(github_client=None, cache_repo=cache_repo))
+
+    assert asyncio.run(async_okved_service.get_okved('+79001234567'))[1]['okved'] == '5.67'
+
+
+def test_get_okved__stale_while_revalidate__serves_old_snapshot_during_refresh(github_client, cache_repo, clock):
+    async_okved_service = AsyncOkvedService(
+        okved_service=OkvedService(
+            github_client=github_client,
+            cache_repo=cache_repo,
+            revalidate_interval=60,
+            stale_while_revalidate=True,
+            clock=clock,
+        )
+    )
+
+    async def get_okved_during_refresh() -> tuple:
+        await async_okved_service.get_okved('+79001234567')
+        clock.now += 100
+        github_client.check_okved_json_etag.return_value = 'new_etag'
+        github_client.load_okved_json.return_value = NEW_OKVED_CODES
+        stale_result = await async_okved_service.get_okved('+79001234567')
+        # Новый снимок появляется, когда фоновый поток обновления доработает;
+        for _ in range(100):
+            fresh_result = await async_okved_service.get_okved('+79001234567')
+            if fresh_result[1]['okved'] != stale_result[1]['okved']:
+                break
+            await asyncio.sleep(0.01)
+        return stale_result, fresh_result
+
+    stale_result, fresh_result = asyncio.run(get_okved_during_refresh())
+
+    assert stale_result[1]['okved'] == '5.67'
+    assert fresh_result[1]['okved'] == '45.67'
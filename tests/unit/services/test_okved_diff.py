@@ -0,0 +1,104 @@
+import pytest
+
+from src.services.okved_diff import (
+    OkvedChangesReplayError,
+    apply_okved_change_record,
+    diff_okved_codes,
+    form_okved_change_record,
+)
+
+OKVED_CODES = [
+    {
+        'code': 'Раздел A',
+        'name': 'Сельское хозяйство',
+        'items': [
+            {
+                'code': '01',
+                'name': 'Растениеводство',
+                'items': [
+                    {'code': '01.1', 'name': 'Однолетние культуры', 'items': []},
+                    {'code': '01.2', 'name': 'Многолетние культуры', 'items': []},
+                ],
+            },
+            {'code': '02', 'name': 'Лесоводство', 'items': [{'code': '02.1', 'name': 'Лесозаготовки', 'items': []}]},
+        ],
+    },
+    {'code': 'Раздел B', 'name': 'Добыча', 'items': [{'code': '05', 'name': 'Добыча угля', 'items': []}]},
+]
+
+
+def edit_okved_codes(okved_codes: list[dict]) -> list[dict]:
+    section_a, section_b = okved_codes
+    crops, forestry = section_a['items']
+    crops['items'][1]['name'] = 'Многолетние культуры и ягоды'
+    crops['items'].insert(0, {'code': '01.0', 'name': 'Семена', 'items': []})
+    section_a['items'] = [forestry, crops]
+    forestry['items'] = []
+    section_b['items'].append({'code': '06', 'name': 'Добыча нефти', 'items': []})
+    return okved_codes
+
+
+def copy_okved_codes(okved_codes: list[dict]) -> list[dict]:
+    return [{**node, 'items': copy_okved_codes(node.get('items', []))} for node in okved_codes]
+
+
+def test_diff_okved_codes__finds_added_removed_renamed_and_moved_codes():
+    new_okved_codes = edit_okved_codes(copy_okved_codes(OKVED_CODES))
+
+    okved_codes_diff = diff_okved_codes(OKVED_CODES, new_okved_codes)
+
+    assert [entry['code'] for entry in okved_codes_diff.added] == ['01.0', '06']
+    assert okved_codes_diff.removed == ['02.1']
+    assert [(entry['code'], entry['old_name'], entry['name']) for entry in okved_codes_diff.renamed] == [
+        ('01.2', 'Многолетние культуры', 'Многолетние культуры и ягоды')
+    ]
+    assert sorted(entry['code'] for entry in okved_codes_diff.moved) == ['01', '01.1', '02']
+    assert okved_codes_diff.has_structural_changes()
+
+
+def test_diff_okved_codes__same_codes__empty_diff():
+    okved_codes_diff = diff_okved_codes(OKVED_CODES, copy_okved_codes(OKVED_CODES))
+
+    assert okved_codes_diff.is_empty()
+
+
+def test_diff_okved_codes__only_names_changed__no_structural_changes():
+    new_okved_codes = copy_okved_codes(OKVED_CODES)
+    new_okved_codes[1]['items'][0]['name'] = 'Добыча бурого угля'
+
+    okved_codes_diff = diff_okved_codes(OKVED_CODES, new_okved_codes)
+
+    assert [entry['code'] for entry in okved_codes_diff.renamed] == ['05']
+    assert not okved_codes_diff.has_structural_changes()
+
+
+def test_diff_okved_codes__duplicate_codes__returns_none():
+    new_okved_codes = copy_okved_codes(OKVED_CODES)
+    new_okved_codes[1]['items'].append({'code': '01', 'name': 'Дубль', 'items': []})
+
+    assert diff_okved_codes(OKVED_CODES, new_okved_codes) is None
+
+
+def test_apply_okved_change_record__replays_diff_to_new_okved_codes():
+    new_okved_codes = edit_okved_codes(copy_okved_codes(OKVED_CODES))
+    change_record = form_okved_change_record(
+        okved_codes_diff=diff_okved_codes(OKVED_CODES, new_okved_codes),
+        from_etag='old_etag',
+        to_etag='new_etag',
+        changed_at=1000.0,
+    )
+
+    assert apply_okved_change_record(copy_okved_codes(OKVED_CODES), change_record) == new_okved_codes
+
+
+def test_apply_okved_change_record__other_okved_codes__raises_error():
+    new_okved_codes = edit_okved_codes(copy_okved_codes(OKVED_CODES))
+    change_record = form_okved_change_record(
+        okved_codes_diff=diff_okved_codes(OKVED_CODES, new_okved_codes),
+        from_etag='old_etag',
+        to_etag='new_etag',
+        changed_at=1000.0,
+    )
+
+    with pytest.raises(OkvedChangesReplayError):
+        apply_okved_change_record(new_okved_codes, change_record)
@@ -0,0 +1,272 @@
+import random
+
+import pytest
+from hypothesis import given
+from hypothesis import strategies as st
+
+from src.commands.bench import generate_okved_codes
+from src.services.matching_engine import MatchingEngine, create_okved_batch_matcher
+from src.services.matching import _compare_code_with_phone, _get_digits_of_code_if_correct, find_matching_okved_code
+from src.services.okved_index import (
+    _iterate_okved_nodes_in_bfs_order,
+    build_okved_index,
+)
+
+PHONE = '+79001234567'
+
+
+def _generate_phone(rnd: random.Random) -> str:
+    return '+79{rest}'.format(rest=''.join(rnd.choice('0123456789') for _ in range(9)))
+
+
+@pytest.mark.parametrize(
+    'okved_codes',
+    [
+        [],
+        [{'code': 'Раздел 1', 'items': []}],
+        [{'code': 'Раздел 1', 'items': [{'code': 'Раздел 1.1', 'name': 'Буквенный код'}]}],
+        [
+            {'code': 'Раздел 1', 'items': [{'code': '81.23.45.67', 'name': 'Разведение гуппи Эндлера', 'items': []}]},
+            {'code': 'Раздел 2', 'items': [{'code': '5.67', 'name': 'Разведение сомов анциструсов', 'items': []}]},
+        ],
+        [
+            {'code': 'Раздел 1', 'items': [{'code': '80.00.77.70', 'name': 'Разведение гуппи Эндлера', 'items': []}]},
+            {'code': 'Раздел 2', 'items': [{'code': '7.70', 'name': 'Разведение сомов анциструсов', 'items': []}]},
+        ],
+        [
+            {'code': 'Раздел 1', 'items': [{'code': '4.57', 'name': 'Первый'}, {'code': '45.7', 'name': 'Второй'}]},
+        ],
+        [
+            {'code': 'Раздел 1', 'items': [{'code': '01.23.45.67.89.01.23', 'name': 'Длиннее номера'}]},
+        ],
+    ],
+)
+def test_okved_index__matches_reference_implementation(okved_codes):
+    okved_index = build_okved_index(okved_codes)
+    assert okved_index.find_matching_okved_code(phone=PHONE) == find_matching_okved_code(
+        phone=PHONE,
+        okved_codes=okved_codes,
+    )
+
+
+def test_okved_index__same_digits__prefers_first_code_in_bfs_order():
+    okved_codes = [
+        {
+            'code': 'Раздел 1',
+            'items': [
+                {'code': '45', 'name': 'Первый уровень', 'items': [{'code': '4.567', 'name': 'Второй уровень'}]},
+                {'code': '45.67', 'name': 'Первый уровень, полное совпадение'},
+            ],
+        },
+    ]
+    assert build_okved_index(okved_codes).find_matching_okved_code(phone=PHONE) == {
+        'okved': '45.67',
+        'matches_count': 4,
+        'complete_match': True,
+        'title': 'Первый уровень, полное совпадение',
+    }
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_okved_index__random_trees__matches_reference_implementation(seed):
+    rnd = random.Random(seed)
+    okved_codes = generate_okved_codes(rnd, sections_count=3, depth=4, width=4, letter_codes_share=0.05)
+    okved_index = build_okved_index(okved_codes)
+
+    for _ in range(50):
+        phone = _generate_phone(rnd)
+        assert okved_index.find_matching_okved_code(phone=phone) == find_matching_okved_code(
+            phone=phone,
+            okved_codes=okved_codes,
+        )
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_okved_index__phones_ending_with_code__matches_reference_implementation(seed):
+    rnd = random.Random(seed)
+    okved_codes = generate_okved_codes(rnd, sections_count=3, depth=4, width=4, letter_codes_share=0.05)
+    okved_codes[0]['items'].append({'code': '01.23.45.67.89.01.23.45.67.89', 'name': 'Длиннее ключа суффикса'})
+    okved_index = build_okved_index(okved_codes)
+    digit_codes = [
+        digit_code
+        for digit_code in map(_get_digits_of_code_if_correct, (node['code'] for node in okved_codes[0]['items']))
+        if digit_code
+    ]
+
+    for digit_code in digit_codes:
+        phone = '+7900{digit_code}'.format(digit_code=digit_code)
+        assert okved_index.find_matching_okved_code(phone=phone) == find_matching_okved_code(
+            phone=phone,
+            okved_codes=okved_codes,
+        )
+        assert okved_index.find_matching_okved_code(phone=phone)['complete_match']
+
+
+OKVED_CODE_PARTS = st.text(alphabet='0123456789٤', min_size=1, max_size=3)
+OKVED_NODES = st.recursive(
+    st.builds(
+        lambda parts, letter: {'code': letter + '.'.join(parts), 'name': '.'.join(parts)},
+        st.lists(OKVED_CODE_PARTS, min_size=1, max_size=3),
+        st.sampled_from(['', '', '', 'X']),
+    ),
+    lambda children: st.builds(
+        lambda node, items: {**node, 'items': items},
+        children,
+        st.lists(children, max_size=4),
+    ),
+    max_leaves=40,
+)
+OKVED_TREES = st.lists(
+    st.builds(lambda items: {'code': 'Раздел', 'items': items}, st.lists(OKVED_NODES, max_size=5)),
+    min_size=1,
+    max_size=3,
+)
+
+
+@given(okved_codes=OKVED_TREES, phone_digits=st.text(alphabet='0123456789', min_size=1, max_size=12))
+def test_okved_index__generated_trees__matches_reference_implementation(okved_codes, phone_digits):
+    phone = '+7{phone_digits}'.format(phone_digits=phone_digits)
+    assert build_okved_index(okved_codes).find_matching_okved_code(phone=phone) == find_matching_okved_code(
+        phone=phone,
+        okved_codes=okved_codes,
+    )
+
+
+NON_ASCII_DIGITS_OKVED_CODES = [
+    {
+        'code': 'Раздел 1',
+        'items': [
+            {'code': '4٥.٦7', 'name': 'Код с арабскими цифрами', 'items': []},
+            {'code': '5.67', 'name': 'Код с ASCII-цифрами', 'items': []},
+            {'code': '23.٤٥.67', 'name': 'Длинный код с арабскими цифрами', 'items': []},
+        ],
+    },
+]
+
+
+@pytest.mark.parametrize('phone', ['+7900123٤٥٦7', '+79001234٥٦7', '+790012٣٤٥67', '+79٠٠1234567', '+79001234567'])
+def test_okved_index__non_ascii_digits__matches_reference_implementation(phone):
+    okved_index = build_okved_index(NON_ASCII_DIGITS_OKVED_CODES)
+
+    assert okved_index.find_matching_okved_code(phone=phone) == find_matching_okved_code(
+        phone=phone,
+        okved_codes=NON_ASCII_DIGITS_OKVED_CODES,
+    )
+
+
+@pytest.mark.parametrize('engine', [MatchingEngine.auto, MatchingEngine.python])
+def test_create_okved_batch_matcher__auto_and_python__use_okved_index(engine):
+    okved_index = build_okved_index([])
+
+    assert create_okved_batch_matcher(okved_index=okved_index, engine=engine) is okved_index
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_numpy_okved_matcher__random_trees__matches_reference_implementation(seed):
+    pytest.importorskip('numpy')
+    from src.services.okved_index_numpy import NumpyOkvedMatcher
+
+    rnd = random.Random(seed)
+    okved_codes = generate_okved_codes(rnd, sections_count=3, depth=4, width=4, letter_codes_share=0.05)
+    okved_codes.append(
+        {
+            'code': 'Раздел длинных кодов',
+            'items': [
+                {'code': '01.23.45.67.89.01.23', 'name': 'Длиннее номера'},
+                {'code': '٤٥.٦٧', 'name': 'Арабо-индийские цифры'},
+            ],
+        }
+    )
+    phones = [_generate_phone(rnd) for _ in range(200)] + ['+79001234567', '+7900123456', '']
+
+    matcher = NumpyOkvedMatcher(build_okved_index(okved_codes), block_size=64)
+
+    assert matcher.find_matching_okved_codes(phones) == [
+        find_matching_okved_code(phone=phone, okved_codes=okved_codes) for phone in phones
+    ]
+
+
+@pytest.mark.parametrize(
+    'okved_codes',
+    [
+        [],
+        [{'code': 'Раздел 1', 'items': [{'code': 'Раздел 1.1', 'name': 'Буквенный код'}]}],
+        [
+            {'code': 'Раздел 1', 'items': [{'code': '4.57', 'name': 'Первый'}, {'code': '45.7', 'name': 'Второй'}]},
+        ],
+    ],
+)
+def test_numpy_okved_matcher__edge_trees__matches_reference_implementation(okved_codes):
+    pytest.importorskip('numpy')
+    from src.services.okved_index_numpy import NumpyOkvedMatcher
+
+    phones = [PHONE] * 40 + ['+79000000457'] * 40
+
+    matcher = NumpyOkvedMatcher(build_okved_index(okved_codes))
+
+    assert matcher.find_matching_okved_codes(phones) == [
+        find_matching_okved_code(phone=phone, okved_codes=okved_codes) for phone in phones
+    ]
+
+
+def _find_top_okved_codes_by_brute_force(phone: str, okved_codes: list[dict], k: int) -> list[tuple[str, int, bool]]:
+    candidates = []
+    for order, node in enumerate(_iterate_okved_nodes_in_bfs_order(okved_codes)):
+        matches_count, complete_match = _compare_code_with_phone(_get_digits_of_code_if_correct(node['code']), phone)
+        if matches_count:
+            candidates.append((not complete_match, -matches_count, order, node['code']))
+    candidates.sort()
+    threshold = candidates[min(k, len(candidates)) - 1][:2]
+    top_candidates = [candidate for candidate in candidates if candidate[:2] <= threshold]
+    return [(code, -matches_count, not complete) for complete, matches_count, _, code in top_candidates]
+
+
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('k', [1, 3, 10])
+def test_find_top_okved_codes__random_trees__matches_brute_force(seed, k):
+    rnd = random.Random(seed)
+    okved_codes = generate_okved_codes(rnd, sections_count=3, depth=4, width=4, letter_codes_share=0.05)
+    okved_index = build_okved_index(okved_codes)
+
+    for _ in range(20):
+        phone = _generate_phone(rnd)
+        top_okved_codes = okved_index.find_top_okved_codes(phone=phone, k=k)
+
+        assert [(data['okved'], data['matches_count'], data['complete_match']) for data in top_okved_codes] == (
+            _find_top_okved_codes_by_brute_force(phone=phone, okved_codes=okved_codes, k=k)
+        )
+        best_okved_data = {key: value for key, value in top_okved_codes[0].items() if key != 'rank'}
+        assert best_okved_data == okved_index.find_matching_okved_code(phone=phone)
+
+
+def test_find_top_okved_codes__same_matches__same_rank():
+    okved_index = build_okved_index(
+        [
+            {
+                'code': 'Раздел 1',
+                'items': [
+                    {'code': '45.67', 'name': 'Первый'},
+                    {'code': '4567', 'name': 'Те же цифры'},
+                    {'code': '1.67', 'name': 'Второй'},
+                    {'code': '2.67', 'name': 'Равный второму'},
+                ],
+            }
+        ]
+    )
+
+    top_okved_codes = okved_index.find_top_okved_codes(phone=PHONE, k=3)
+
+    assert [(data['okved'], data['rank']) for data in top_okved_codes] == [
+        ('45.67', 1),
+        ('4567', 1),
+        ('1.67', 2),
+        ('2.67', 2),
+    ]
+
+
+def test_find_top_okved_codes__no_matches__returns_fallback_code():
+    okved_index = build_okved_index([{'code': 'Раздел 1', 'items': [{'code': '1.2', 'name': 'Первый'}]}])
+
+    assert okved_index.find_top_okved_codes(phone='+79000000000', k=5) == [
+        {'okved': '1.2', 'matches_count': 0, 'complete_match': False, 'title': 'Первый', 'rank': 1}
+    ]
@@ -0,0 +1,70 @@
+import random
+
+import pytest
+
+from src.services.matching import find_matching_okved_code
+from src.services.okved_index import build_okved_index
+from src.services.okved_index_codec import WrongOkvedIndexFormatError, dump_okved_index, load_okved_index
+
+OKVED_CODES = [
+    {
+        'code': 'Раздел 1',
+        'items': [
+            {
+                'code': '81.23.45.67',
+                'name': 'Разведение гуппи Эндлера',
+                'items': [{'code': '81.23.45.67.1', 'name': 'Третий уровень'}],
+            },
+            {'code': 'Раздел 1.1', 'name': 'Буквенный код'},
+        ],
+    },
+    {'code': 'Раздел 2', 'items': [{'code': '5.67', 'name': 'Разведение сомов анциструсов', 'items': []}]},
+]
+
+
+@pytest.mark.parametrize('etag', ['W/"abc"', '', None])
+def test_load_okved_index__returns_dumped_etag(etag):
+    loaded_etag, _ = load_okved_index(dump_okved_index(etag, build_okved_index(OKVED_CODES)))
+    assert loaded_etag == etag
+
+
+@pytest.mark.parametrize('okved_codes', [OKVED_CODES, []])
+def test_load_okved_index__same_lookups_as_built_index(okved_codes):
+    okved_index = build_okved_index(okved_codes)
+    _, loaded_okved_index = load_okved_index(dump_okved_index('etag', okved_index))
+
+    assert len(loaded_okved_index) == len(okved_index)
+    for phone in ['+79001234567', '+79000000001', '+79008123456']:
+        assert loaded_okved_index.find_matching_okved_code(phone) == find_matching_okved_code(phone, okved_codes)
+
+
+def test_load_okved_index__random_phones__same_lookups_as_reference():
+    rnd = random.Random(0)
+    _, okved_index = load_okved_index(dump_okved_index('etag', build_okved_index(OKVED_CODES)))
+
+    for _ in range(200):
+        phone = '+79{rest}'.format(rest=''.join(rnd.choice('0123456789') for _ in range(9)))
+        assert okved_index.find_matching_okved_code(phone) == find_matching_okved_code(phone, OKVED_CODES)
+
+
+def test_load_okved_index__doesnt_copy_tables():
+    buffer = bytearray(dump_okved_index('etag', build_okved_index(OKVED_CODES)))
+    _, okved_index = load_okved_index(buffer)
+
+    assert okved_index.tables.group_digits.obj is buffer
+    assert okved_index.tables.suffix_slots.obj is buffer
+
+
+@pytest.mark.parametrize(
+    'corrupt',
+    [
+        lambda data: data[:10],
+        lambda data: data[:-8],
+        lambda data: b'NOTINDEX' + data[8:],
+        lambda data: data[:8] + b'\x63\x00' + data[10:],
+    ],
+)
+def test_load_okved_index__corrupted_data__raises_corresponding_error(corrupt):
+    data = dump_okved_index('etag', build_okved_index(OKVED_CODES))
+    with pytest.raises(WrongOkvedIndexFormatError):
+        load_okved_index(corrupt(data))
@@ -0,0 +1,92 @@
+import random
+
+import pytest
+
+from src.commands.bench import generate_okved_codes
+from src.services.okved_registry import OkvedNode, build_okved_registry
+
+OKVED_CODES = [
+    {
+        'code': 'Раздел A',
+        'name': 'Сельское хозяйство',
+        'items': [
+            {
+                'code': '01',
+                'name': 'Растениеводство',
+                'items': [
+                    {'code': '01.1', 'name': 'Выращивание однолетних культур', 'items': []},
+                    {'code': '01.2', 'name': 'Выращивание многолетних культур'},
+                ],
+            },
+            {'code': '02', 'name': 'Лесоводство', 'comment': 'Включает лесозаготовки', 'items': []},
+        ],
+    },
+    {
+        'code': 'Раздел B',
+        'name': 'Добыча полезных ископаемых',
+        'items': [
+            {'code': '05', 'name': 'Растениеводство', 'items': []},
+        ],
+    },
+]
+
+
+def test_build_okved_registry_orders_nodes_in_bfs_order():
+    okved_registry = build_okved_registry(OKVED_CODES)
+
+    assert [node.code for node in okved_registry] == ['Раздел A', 'Раздел B', '01', '02', '05', '01.1', '01.2']
+    assert len(okved_registry) == 7
+
+
+def test_build_okved_registry_interns_names():
+    okved_registry = build_okved_registry(OKVED_CODES)
+
+    assert len(okved_registry.names) == 6
+    assert okved_registry.name_ids[2] == okved_registry.name_ids[4]
+    assert okved_registry[4].name == 'Растениеводство'
+
+
+def test_okved_node_links_parent_and_children():
+    okved_registry = build_okved_registry(OKVED_CODES)
+    section, *_ = okved_registry.get_sections()
+    plant_growing = section.children[0]
+
+    assert [child.code for child in section.children] == ['01', '02']
+    assert [child.code for child in plant_growing.children] == ['01.1', '01.2']
+    assert plant_growing.children[1].parent == plant_growing
+    assert section.parent is None
+    assert (section.depth, plant_growing.depth, plant_growing.children[0].depth) == (0, 1, 2)
+
+
+def test_okved_node_has_no_instance_dict():
+    okved_node = build_okved_registry(OKVED_CODES)[0]
+
+    assert isinstance(okved_node, OkvedNode)
+    with pytest.raises(AttributeError):
+        okved_node.title = 'Сельское хозяйство'
+
+
+def test_okved_registry_raises_index_error_out_of_range():
+    okved_registry = build_okved_registry(OKVED_CODES)
+
+    with pytest.raises(IndexError):
+        okved_registry[len(okved_registry)]
+
+
+@pytest.mark.parametrize(
+    'okved_codes',
+    [
+        OKVED_CODES,
+        [],
+        [{'code': 'Раздел A', 'items': [{'code': '01', 'name': None, 'items': None}]}],
+    ],
+)
+def test_okved_registry_restores_okved_codes(okved_codes):
+    assert build_okved_registry(okved_codes).to_okved_codes() == okved_codes
+
+
+def test_okved_registry_restores_generated_okved_codes():
+    rnd = random.Random(21)
+    okved_codes = generate_okved_codes(rnd, sections_count=5, depth=4, width=4, letter_codes_share=0.05)
+
+    assert build_okved_registry(okved_codes).to_okved_codes() == okved_codes
@@ -0,0 +1,492 @@
+import threading
+import time
+
+import pytest
+
+from src.services.matching_engine import MatchingEngine
+from src.services.metrics import (
+    COUNTER_CACHE_HITS,
+    COUNTER_CACHE_MISSES,
+    COUNTER_CACHE_REFRESHES,
+    COUNTER_RESULT_CACHE_HITS,
+    COUNTER_RESULT_CACHE_MISSES,
+    STAGE_CACHE_READ,
+    STAGE_DOWNLOAD,
+    STAGE_ETAG_CHECK,
+    STAGE_INDEX_BUILD,
+    STAGE_MATCH,
+    STAGE_NORMALIZE,
+    PrometheusMetrics,
+)
+from src.services.okved import OkvedService
+from src.services.okved_index import build_okved_index
+from src.services.okved_index_codec import dump_okved_index, load_okved_index
+from src.services.result_cache import OkvedResultCache
+from tests.conftest import NEW_OKVED_CODES
+
+
+@pytest.fixture
+def okved_service(github_client, cache_repo):
+    return OkvedService(github_client=github_client, cache_repo=cache_repo)
+
+
+def test_get_okved_batch__resolves_okved_codes_once(okved_service, github_client, cache_repo):
+    results = list(okved_service.get_okved_batch(['+79001234567', '89001234567', '+79000000000']))
+
+    assert len(results) == 3
+    assert github_client.check_okved_json_etag.call_count == 1
+    assert cache_repo.get_okved_snapshot_from_manifest.call_count == 1
+
+
+def test_get_okved_batch__same_results_as_single_lookups(okved_service):
+    raw_phones = ['+79001234567', '', '+19001234567', '8 (900) 000-56-70']
+
+    batch_results = list(okved_service.get_okved_batch(raw_phones))
+
+    assert [result[0] for result in batch_results] == raw_phones
+    assert [result[1:] for result in batch_results] == [okved_service.get_okved(phone) for phone in raw_phones]
+
+
+@pytest.mark.parametrize('matching_engine', [MatchingEngine.python, MatchingEngine.numpy])
+def test_get_okved_batch__several_chunks__same_results_as_single_lookups(github_client, cache_repo, matching_engine):
+    if matching_engine is MatchingEngine.numpy:
+        pytest.importorskip('numpy')
+    okved_service = OkvedService(github_client=github_client, cache_repo=cache_repo, matching_engine=matching_engine)
+    raw_phones = ['+7900000{tail:04d}'.format(tail=tail) for tail in range(0, 10000, 4)] + ['', '+19001234567']
+
+    batch_results = list(okved_service.get_okved_batch(raw_phones))
+
+    assert [result[0] for result in batch_results] == raw_phones
+    assert [result[1:] for result in batch_results] == [okved_service.get_okved(phone) for phone in raw_phones]
+
+
+def test_get_okved_batch__only_invalid_phones__doesnt_check_etag(okved_service, github_client):
+    results = list(okved_service.get_okved_batch(['', '123']))
+
+    assert [result[2] for result in results] == [None, None]
+    github_client.check_okved_json_etag.assert_not_called()
+
+
+def test_get_okved_batch__okved_codes_unavailable__returns_none_okved_data(okved_service, github_client, cache_repo):
+    cache_repo.get_okved_snapshot_from_manifest.return_value = None
+    github_client.load_okved_json.return_value = None
+
+    results = list(okved_service.get_okved_batch(['+79001234567', '+79001234568']))
+
+    assert [result[2] for result in results] == [None, None]
+    assert cache_repo.get_okved_snapshot_from_manifest.call_count == 1
+
+
+@pytest.fixture
+def caching_okved_service(github_client, cache_repo, clock):
+    return OkvedService(github_client=github_client, cache_repo=cache_repo, revalidate_interval=60, clock=clock)
+
+
+def test_get_okved__within_revalidate_interval__doesnt_check_etag(
+    github_client, cache_repo, clock, caching_okved_service
+):
+    okved_service = caching_okved_service
+
+    okved_service.get_okved('+79001234567')
+    clock.now += 59
+    okved_service.get_okved('+79001234567')
+
+    assert github_client.check_okved_json_etag.call_count == 1
+    assert cache_repo.get_okved_snapshot_from_manifest.call_count == 1
+
+
+def test_get_okved__etag_didnt_change__doesnt_reread_cache(github_client, cache_repo, clock, caching_okved_service):
+    okved_service = caching_okved_service
+
+    okved_service.get_okved('+79001234567')
+    clock.now += 61
+    okved_service.get_okved('+79001234567')
+
+    assert github_client.check_okved_json_etag.call_count == 2
+    assert cache_repo.get_okved_snapshot_from_manifest.call_count == 1
+
+
+def test_get_okved__etag_changed__uses_new_okved_codes(github_client, cache_repo, clock, caching_okved_service):
+    okved_service = caching_okved_service
+    assert okved_service.get_okved('+79001234567')[1]['okved'] == '5.67'
+
+    github_client.check_okved_json_etag.return_value = 'new_etag'
+    github_client.load_okved_json.return_value = NEW_OKVED_CODES
+    clock.now += 61
+
+    assert okved_service.get_okved('+79001234567')[1]['okved'] == '45.67'
+
+
+def test_has_actual_snapshot__only_within_revalidate_interval(clock, caching_okved_service):
+    okved_service = caching_okved_service
+    assert not okved_service.has_actual_snapshot()
+
+    okved_service.get_okved('+79001234567')
+    clock.now += 59
+    assert okved_service.has_actual_snapshot()
+
+    clock.now += 2
+    assert not okved_service.has_actual_snapshot()
+
+
+def test_get_okved__stale_while_revalidate__serves_old_snapshot_during_refresh(github_client, cache_repo, clock):
+    okved_service = OkvedService(
+        github_client=github_client,
+        cache_repo=cache_repo,
+        revalidate_interval=60,
+        stale_while_revalidate=True,
+        clock=clock,
+    )
+    okved_service.get_okved('+79001234567')
+
+    github_client.check_okved_json_etag.return_value = 'new_etag'
+    github_client.load_okved_json.return_value = NEW_OKVED_CODES
+    clock.now += 61
+
+    assert okved_service.get_okved('+79001234567')[1]['okved'] == '5.67'
+    okved_service._background_revalidation.join()
+    assert okved_service.get_okved('+79001234567')[1]['okved'] == '45.67'
+
+
+def test_refresh_snapshot__etag_changed__swaps_snapshot_for_next_lookups(github_client, caching_okved_service):
+    okved_service = caching_okved_service
+    okved_service.get_okved('+79001234567')
+
+    github_client.check_okved_json_etag.return_value = 'new_etag'
+    github_client.load_okved_json.return_value = NEW_OKVED_CODES
+
+    assert okved_service.refresh_snapshot() is True
+    assert okved_service.get_okved('+79001234567')[1]['okved'] == '45.67'
+
+
+def test_refresh_snapshot__during_batch__batch_finishes_on_old_snapshot(github_client, caching_okved_service):
+    okved_service = caching_okved_service
+    raw_phones = ['+79001234567'] * 3000
+    batch_results = okved_service.get_okved_batch(raw_phones)
+    first_result = next(batch_results)
+
+    github_client.check_okved_json_etag.return_value = 'new_etag'
+    github_client.load_okved_json.return_value = NEW_OKVED_CODES
+    okved_service.refresh_snapshot()
+
+    assert {result[2]['okved'] for result in [first_result, *batch_results]} == {'5.67'}
+    assert okved_service.get_okved('+79001234567')[1]['okved'] == '45.67'
+
+
+def test_refresh_snapshot__unexpected_error__returns_false(github_client, caching_okved_service):
+    github_client.check_okved_json_etag.side_effect = RuntimeError('boom')
+    assert caching_okved_service.refresh_snapshot() is False
+
+
+def test_get_okved__refresh_failed__keeps_old_snapshot(github_client, cache_repo, clock):
+    okved_service = OkvedService(github_client=github_client, cache_repo=cache_repo, clock=clock)
+    okved_service.get_okved('+79001234567')
+
+    github_client.check_okved_json_etag.return_value = 'new_etag'
+    github_client.load_okved_json.return_value = None
+    cache_repo.get_okved_snapshot_from_manifest.return_value = None
+
+    assert okved_service.get_okved('+79001234567')[1]['okved'] == '5.67'
+
+
+def test_get_okved__new_etag_download_failed__doesnt_save_new_etag(okved_service, github_client, cache_repo):
+    github_client.check_okved_json_etag.return_value = 'new_etag'
+    github_client.load_okved_json.return_value = None
+
+    assert okved_service.get_okved('+79001234567')[1]['okved'] == '5.67'
+    cache_repo.save_okved_snapshot_to_manifest.assert_not_called()
+
+
+def test_get_okved__new_etag__saves_etag_with_okved_codes(okved_service, github_client, cache_repo):
+    github_client.check_okved_json_etag.return_value = 'new_etag'
+    github_client.load_okved_json.return_value = NEW_OKVED_CODES
+
+    okved_service.get_okved('+79001234567')
+
+    cache_repo.save_okved_snapshot_to_manifest.assert_called_once_with(etag='new_etag', okved_codes=NEW_OKVED_CODES)
+
+
+def test_get_okved__binary_index_with_same_etag__doesnt_read_manifest(okved_service, cache_repo):
+    cache_repo.open_okved_index_from_cache.return_value = dump_okved_index(
+        'cached_etag',
+        build_okved_index(NEW_OKVED_CODES),
+    )
+
+    assert okved_service.get_okved('+79001234567')[1]['okved'] == '45.67'
+    cache_repo.get_okved_snapshot_from_manifest.assert_not_called()
+
+
+def test_get_okved__binary_index_with_other_etag__rebuilds_it_from_manifest(okved_service, cache_repo):
+    cache_repo.open_okved_index_from_cache.return_value = dump_okved_index(
+        'old_etag',
+        build_okved_index(NEW_OKVED_CODES),
+    )
+
+    assert okved_service.get_okved('+79001234567')[1]['okved'] == '5.67'
+    saved_okved_index_data = cache_repo.save_okved_index_to_cache.call_args.kwargs['okved_index_data']
+    assert load_okved_index(saved_okved_index_data)[0] == 'cached_etag'
+
+
+def test_get_okved__metrics__observes_every_stage_of_cache_lookup(github_client, cache_repo):
+    metrics = PrometheusMetrics()
+    okved_service = OkvedService(github_client=github_client, cache_repo=cache_repo, metrics=metrics)
+
+    okved_service.get_okved('+79001234567')
+
+    for stage in (STAGE_NORMALIZE, STAGE_CACHE_READ, STAGE_ETAG_CHECK, STAGE_INDEX_BUILD, STAGE_MATCH):
+        assert metrics.get_stage_count(stage) > 0
+    assert metrics.get_stage_count(STAGE_DOWNLOAD) == 0
+    assert metrics.get_counter(COUNTER_CACHE_HITS) == 1
+
+
+def test_get_okved__metrics__counts_refreshes_and_misses(github_client, cache_repo):
+    metrics = PrometheusMetrics()
+    okved_service = OkvedService(github_client=github_client, cache_repo=cache_repo, metrics=metrics)
+    github_client.check_okved_json_etag.return_value = 'new_etag'
+    github_client.load_okved_json.return_value = NEW_OKVED_CODES
+
+    okved_service.get_okved('+79001234567')
+
+    github_client.check_okved_json_etag.return_value = None
+    cache_repo.get_okved_snapshot_from_manifest.return_value = None
+    cache_repo.get_okved_etag_from_manifest.return_value = 'other_etag'
+    okved_service.get_okved('+79001234567')
+
+    assert metrics.get_counter(COUNTER_CACHE_REFRESHES) == 1
+    assert metrics.get_counter(COUNTER_CACHE_MISSES) == 1
+    assert metrics.get_stage_count(STAGE_DOWNLOAD) == 2
+
+
+def test_get_okved__offline__answers_from_cache_without_github(cache_repo):
+    okved_service = OkvedService(github_client=None, cache_repo=cache_repo)
+
+    assert okved_service.get_okved('+79001234567')[1]['okved'] == '5.67'
+    assert okved_service.refresh_snapshot() is True
+    assert cache_repo.get_okved_snapshot_from_manifest.call_count == 1
+
+
+def test_get_okved__offline_without_cache__returns_none_okved_data(cache_repo):
+    cache_repo.get_okved_snapshot_from_manifest.return_value = None
+    okved_service = OkvedService(github_client=None, cache_repo=cache_repo)
+
+    assert okved_service.get_okved('+79001234567')[1] is None
+
+
+def test_get_okved__concurrent_cold_lookups__refresh_okved_codes_once(github_client, cache_repo):
+    etag_check_started = threading.Event()
+    etag_check_released = threading.Event()
+    github_client.load_okved_json.return_value = NEW_OKVED_CODES
+
+    def check_okved_json_etag(cached_etag: str | None) -> str:
+        etag_check_started.set()
+        etag_check_released.wait(timeout=5)
+        return 'new_etag'
+
+    github_client.check_okved_json_etag.side_effect = check_okved_json_etag
+    okved_service = OkvedService(github_client=github_client, cache_repo=cache_repo)
+    results = []
+
+    def get_okved() -> None:
+        results.append(okved_service.get_okved('+79001234567')[1]['okved'])
+
+    threads = [threading.Thread(target=get_okved) for _ in range(8)]
+    threads[0].start()
+    assert etag_check_started.wait(timeout=5)
+    for thread in threads[1:]:
+        thread.start()
+    time.sleep(0.1)
+    etag_check_released.set()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert results == ['45.67'] * 8
+    assert github_client.check_okved_json_etag.call_count == 1
+    assert github_client.load_okved_json.call_count == 1
+    cache_repo.save_okved_snapshot_to_manifest.assert_called_once()
+    cache_repo.save_okved_refreshed_at.assert_called_once()
+
+
+def test_get_okved__cache_refreshed_by_other_process__doesnt_check_etag(okved_service, github_client, cache_repo):
+    cache_repo.get_okved_refreshed_at.return_value = time.time() + 60
+
+    assert okved_service.get_okved('+79001234567')[1]['okved'] == '5.67'
+    github_client.check_okved_json_etag.assert_not_called()
+    cache_repo.save_okved_refreshed_at.assert_not_called()
+
+
+@pytest.mark.parametrize('offline', [False, True])
+def test_get_okved__registry_didnt_answer__doesnt_save_refreshed_at(github_client, cache_repo, offline):
+    github_client.is_etag_check_succeeded.return_value = False
+    okved_service = OkvedService(github_client=None if offline else github_client, cache_repo=cache_repo)
+
+    assert okved_service.get_okved('+79001234567')[1]['okved'] == '5.67'
+    cache_repo.save_okved_refreshed_at.assert_not_called()
+
+
+def test_get_okved__etag_not_changed__saves_refreshed_at(okved_service, github_client, cache_repo):
+    github_client.is_etag_check_succeeded.return_value = True
+
+    assert okved_service.get_okved('+79001234567')[1]['okved'] == '5.67'
+    cache_repo.save_okved_refreshed_at.assert_called_once()
+
+
+def test_get_okved__result_cache__matches_repeated_phone_once(github_client, cache_repo):
+    metrics = PrometheusMetrics()
+    okved_service = OkvedService(
+        github_client=github_client,
+        cache_repo=cache_repo,
+        metrics=metrics,
+        result_cache=OkvedResultCache(),
+    )
+
+    results = [okved_service.get_okved(phone) for phone in ('+79001234567', '89001234567', '+79001234567')]
+
+    assert {result[1]['okved'] for result in results} == {'5.67'}
+    assert metrics.get_stage_count(STAGE_MATCH) == 1
+    assert metrics.get_counter(COUNTER_RESULT_CACHE_HITS) == 2
+    assert metrics.get_counter(COUNTER_RESULT_CACHE_MISSES) == 1
+
+
+def test_get_okved__result_cache__etag_changed__matches_with_new_okved_codes(github_client, cache_repo):
+    okved_service = OkvedService(github_client=github_client, cache_repo=cache_repo, result_cache=OkvedResultCache())
+    assert okved_service.get_okved('+79001234567')[1]['okved'] == '5.67'
+
+    github_client.check_okved_json_etag.return_value = 'new_etag'
+    github_client.load_okved_json.return_value = NEW_OKVED_CODES
+
+    assert okved_service.get_okved('+79001234567')[1]['okved'] == '45.67'
+
+
+def test_save_result_cache__persistent__saves_only_actual_etag_entries(github_client, cache_repo):
+    result_cache = OkvedResultCache(persistent=True)
+    result_cache.put(etag='old_etag', phone='+79001234567', okved_data={'okved': '1.1'})
+    okved_service = OkvedService(
+        github_client=github_client,
+        cache_repo=cache_repo,
+        result_cache=result_cache,
+        persist_result_cache=True,
+    )
+    okved_service.get_okved('+79001234567')
+
+    okved_service.save_result_cache()
+
+    saved_results = cache_repo.append_okved_results_to_cache.call_args.args[0]
+    assert [(etag, phone) for etag, phone, _, _ in saved_results] == [('cached_etag', '+79001234567')]
+
+
+def test_save_result_cache__not_persistent__doesnt_save(okved_service, cache_repo):
+    okved_service.save_result_cache()
+
+    cache_repo.save_okved_results_to_cache.assert_not_called()
+    cache_repo.append_okved_results_to_cache.assert_not_called()
+
+
+RENAMED_OKVED_CODES = [
+    {
+        'code': 'Раздел 1',
+        'items': [{'code': '81.23.45.67', 'name': 'Разведение гуппи Эндлера', 'items': []}],
+    },
+    {
+        'code': 'Раздел 2',
+        'items': [{'code': '5.67', 'name': 'Разведение сомов и вьюнов', 'items': []}],
+    },
+]
+
+
+def test_get_okved__only_names_changed__logs_changes_and_rebuilds_index(okved_service, github_client, cache_repo):
+    okved_service.get_okved('+79001234567')
+    github_client.check_okved_json_etag.return_value = 'new_etag'
+    github_client.load_okved_json.return_value = RENAMED_OKVED_CODES
+
+    assert okved_service.get_okved('+79001234567')[1]['title'] == 'Разведение сомов и вьюнов'
+    change_record = cache_repo.append_okved_change_to_log.call_args.args[0]
+    assert (change_record['from_etag'], change_record['to_etag']) == ('cached_etag', 'new_etag')
+    assert [entry['code'] for entry in change_record['renamed']] == ['5.67']
+    saved_okved_index_data = cache_repo.save_okved_index_to_cache.call_args.kwargs['okved_index_data']
+    assert load_okved_index(saved_okved_index_data)[0] == 'new_etag'
+
+
+def test_get_okved__codes_added_and_removed__logs_changes_and_rebuilds_index(okved_service, github_client, cache_repo):
+    okved_service.get_okved('+79001234567')
+    github_client.check_okved_json_etag.return_value = 'new_etag'
+    github_client.load_okved_json.return_value = NEW_OKVED_CODES
+
+    assert okved_service.get_okved('+79001234567')[1]['okved'] == '45.67'
+    change_record = cache_repo.append_okved_change_to_log.call_args.args[0]
+    assert [entry['code'] for entry in change_record['added']] == ['45.67']
+    assert change_record['removed'] == ['Раздел 2', '81.23.45.67', '5.67']
+
+
+def test_get_top_okved__ranks_okved_codes(okved_service):
+    normalized_phone, top_okved_codes, error_message = okved_service.get_top_okved('89001234567', k=2)
+
+    assert (normalized_phone, error_message) == ('+79001234567', '')
+    assert [(data['okved'], data['rank']) for data in top_okved_codes] == [('5.67', 1), ('81.23.45.67', 2)]
+
+
+def test_get_top_okved__wrong_phone__returns_error(okved_service, github_client):
+    assert okved_service.get_top_okved('123', k=2)[1:] == (
+        None,
+        'В данном телефонном номере неправильное число цифр (3 вместо 11)',
+    )
+    github_client.check_okved_json_etag.assert_not_called()
+
+
+def test_get_okved__new_etag__bumps_snapshot_generation(okved_service, github_client, cache_repo):
+    github_client.check_okved_json_etag.return_value = 'new_etag'
+    github_client.load_okved_json.return_value = NEW_OKVED_CODES
+
+    okved_service.get_okved('+79001234567')
+
+    cache_repo.bump_okved_generation.assert_called_once_with()
+
+
+def test_get_okved__etag_didnt_change__doesnt_bump_snapshot_generation(okved_service, cache_repo):
+    okved_service.get_okved('+79001234567')
+
+    cache_repo.bump_okved_generation.assert_not_called()
+
+
+def test_get_okved__published_index__answers_from_published_copy(okved_service, github_client, cache_repo):
+    github_client.check_okved_json_etag.return_value = 'new_etag'
+    github_client.load_okved_json.return_value = NEW_OKVED_CODES
+
+    def save_okved_index_to_cache(okved_index_data: bytes) -> None:
+        cache_repo.open_okved_index_from_cache.return_value = okved_index_data
+
+    cache_repo.save_okved_index_to_cache.side_effect = save_okved_index_to_cache
+
+    assert okved_service.get_okved('+79001234567')[1]['okved'] == '45.67'
+    assert type(okved_service.get_actual_snapshot().okved_index.tables.code_blob) is memoryview
+
+
+@pytest.fixture
+def following_okved_service(cache_repo):
+    cache_repo.get_okved_generation.return_value = 1
+    return OkvedService(
+        github_client=None,
+        cache_repo=cache_repo,
+        revalidate_interval=float('inf'),
+        watch_generation=True,
+    )
+
+
+def test_get_okved__watch_generation__same_generation__doesnt_reread_cache(following_okved_service, cache_repo):
+    following_okved_service.get_okved('+79001234567')
+    following_okved_service.get_okved('+79001234567')
+
+    assert cache_repo.get_okved_etag_from_manifest.call_count == 1
+
+
+def test_get_okved__watch_generation__new_generation__attaches_published_snapshot(following_okved_service, cache_repo):
+    assert following_okved_service.get_okved('+79001234567')[1]['okved'] == '5.67'
+    cache_repo.get_okved_etag_from_manifest.return_value = 'new_etag'
+    cache_repo.open_okved_index_from_cache.return_value = dump_okved_index(
+        'new_etag', build_okved_index(NEW_OKVED_CODES)
+    )
+    assert following_okved_service.get_okved('+79001234567')[1]['okved'] == '5.67'
+
+    cache_repo.get_okved_generation.return_value = 2
+
+    assert following_okved_service.get_okved('+79001234567')[1]['okved'] == '45.67'
+    cache_repo.bump_okved_generation.assert_not_called()
@@ -0,0 +1,35 @@
+import threading
+from unittest.mock import MagicMock
+
+from src.services.refresher import OkvedSnapshotRefresher
+
+
+def test_refresher__refreshes_snapshot_on_schedule_until_stopped():
+    refreshed = threading.Event()
+    okved_service = MagicMock()
+
+    def refresh_snapshot() -> bool:
+        if okved_service.refresh_snapshot.call_count >= 3:
+            refreshed.set()
+        return True
+
+    okved_service.refresh_snapshot.side_effect = refresh_snapshot
+    refresher = OkvedSnapshotRefresher(okved_service=okved_service, interval=0.01)
+
+    refresher.start()
+    assert refreshed.wait(timeout=5)
+    refresher.stop(timeout=5)
+    calls_count = okved_service.refresh_snapshot.call_count
+
+    assert calls_count >= 3
+    assert not any(thread.name == 'okved-snapshot-refresher' for thread in threading.enumerate())
+
+
+def test_refresher__stopped_before_interval__doesnt_refresh():
+    okved_service = MagicMock()
+    refresher = OkvedSnapshotRefresher(okved_service=okved_service, interval=60)
+
+    refresher.start()
+    refresher.stop(timeout=5)
+
+    okved_service.refresh_snapshot.assert_not_called()
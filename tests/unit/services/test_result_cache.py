@@ -0,0 +1,116 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from src.services.result_cache import OkvedResultCache, save_okved_result_cache_to_cache
+
+OKVED_DATA = {'okved': '5.67', 'title': 'Разведение сомов анциструсов', 'matches_count': 3, 'complete_match': True}
+
+
+def test_get__after_put__returns_copy_of_okved_data():
+    result_cache = OkvedResultCache()
+    result_cache.put(etag='etag', phone='+79001234567', okved_data=OKVED_DATA)
+
+    okved_data = result_cache.get(etag='etag', phone='+79001234567')
+    okved_data['okved'] = 'changed'
+
+    assert result_cache.get(etag='etag', phone='+79001234567') == OKVED_DATA
+
+
+def test_get__other_etag__misses():
+    result_cache = OkvedResultCache()
+    result_cache.put(etag='old_etag', phone='+79001234567', okved_data=OKVED_DATA)
+
+    assert result_cache.get(etag='new_etag', phone='+79001234567') is None
+
+
+def test_put__over_max_size__evicts_least_recently_used():
+    result_cache = OkvedResultCache(max_size=2)
+    result_cache.put(etag='etag', phone='+79000000001', okved_data=OKVED_DATA)
+    result_cache.put(etag='etag', phone='+79000000002', okved_data=OKVED_DATA)
+    result_cache.get(etag='etag', phone='+79000000001')
+
+    result_cache.put(etag='etag', phone='+79000000003', okved_data=OKVED_DATA)
+
+    assert result_cache.get(etag='etag', phone='+79000000001') is not None
+    assert result_cache.get(etag='etag', phone='+79000000002') is None
+    assert result_cache.get_stats().evictions == 1
+    assert len(result_cache) == 2
+
+
+def test_get__after_ttl__expires_entry(clock):
+    result_cache = OkvedResultCache(ttl=60, clock=clock)
+    result_cache.put(etag='etag', phone='+79001234567', okved_data=OKVED_DATA)
+
+    clock.now += 59
+    assert result_cache.get(etag='etag', phone='+79001234567') is not None
+    clock.now += 1
+    assert result_cache.get(etag='etag', phone='+79001234567') is None
+
+    stats = result_cache.get_stats()
+    assert (stats.hits, stats.misses, stats.expirations, stats.size) == (1, 1, 1, 0)
+
+
+def test_load_entries__dumped_entries__restores_actual_ones_in_lru_order(clock):
+    result_cache = OkvedResultCache(ttl=60, clock=clock)
+    result_cache.put(etag='old_etag', phone='+79000000000', okved_data=OKVED_DATA)
+    result_cache.put(etag='etag', phone='+79000000001', okved_data=OKVED_DATA)
+    clock.now += 30
+    result_cache.put(etag='etag', phone='+79000000002', okved_data=OKVED_DATA)
+    result_cache.get(etag='etag', phone='+79000000001')
+    entries = result_cache.dump_entries(etag='etag')
+
+    clock.now += 40
+    restored_cache = OkvedResultCache(max_size=10, ttl=60, clock=clock)
+
+    assert restored_cache.load_entries(entries + [['etag', '+79000000003'], 'wrong entry']) == 1
+    assert restored_cache.get(etag='etag', phone='+79000000002') == OKVED_DATA
+    assert restored_cache.get(etag='etag', phone='+79000000001') is None
+
+
+def test_save_okved_result_cache_to_cache__appends_only_new_entries(clock):
+    cache_repo = MagicMock()
+    result_cache = OkvedResultCache(clock=clock, persistent=True)
+    result_cache.load_entries([['etag', '+79000000001', 1000.0, OKVED_DATA]])
+    result_cache.get(etag='etag', phone='+79000000001')
+
+    save_okved_result_cache_to_cache(cache_repo=cache_repo, result_cache=result_cache)
+    cache_repo.append_okved_results_to_cache.assert_not_called()
+
+    result_cache.put(etag='etag', phone='+79000000002', okved_data=OKVED_DATA)
+    save_okved_result_cache_to_cache(cache_repo=cache_repo, result_cache=result_cache)
+    save_okved_result_cache_to_cache(cache_repo=cache_repo, result_cache=result_cache)
+
+    appended_results = cache_repo.append_okved_results_to_cache.call_args.args[0]
+    assert cache_repo.append_okved_results_to_cache.call_count == 1
+    assert [phone for _, phone, _, _ in appended_results] == ['+79000000002']
+    cache_repo.save_okved_results_to_cache.assert_not_called()
+
+
+def test_save_okved_result_cache_to_cache__too_many_lines__rewrites_file(clock):
+    cache_repo = MagicMock()
+    result_cache = OkvedResultCache(max_size=2, clock=clock, persistent=True)
+    result_cache.load_entries([['etag', '+79000000001', 1000.0, OKVED_DATA]] * 4)
+
+    result_cache.put(etag='etag', phone='+79000000002', okved_data=OKVED_DATA)
+    save_okved_result_cache_to_cache(cache_repo=cache_repo, result_cache=result_cache)
+
+    saved_results = cache_repo.save_okved_results_to_cache.call_args.args[0]
+    assert [phone for _, phone, _, _ in saved_results] == ['+79000000001', '+79000000002']
+    assert result_cache.get_persisted_count() == 2
+    cache_repo.append_okved_results_to_cache.assert_not_called()
+
+
+@pytest.mark.parametrize('persistent', [False, True])
+def test_put__evicted_and_expired_entries__dont_stay_unsaved(persistent, clock):
+    result_cache = OkvedResultCache(max_size=2, ttl=60, clock=clock, persistent=persistent)
+    for phone_number in range(100):
+        result_cache.put(etag='etag', phone=str(phone_number), okved_data=OKVED_DATA)
+    clock.now += 60
+    result_cache.get(etag='etag', phone='99')
+
+    assert [phone for _, phone, _, _ in result_cache.dump_unsaved_entries()] == []
+    assert len(result_cache._unsaved_keys) == (1 if persistent else 0)
+
+    result_cache.clear()
+    assert not result_cache._unsaved_keys
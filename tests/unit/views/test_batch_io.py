@@ -0,0 +1,139 @@
+import io
+import json
+
+import pytest
+
+from src.commands.batch_io import (
+    RESULT_WRITE_CHUNK_SIZE,
+    MissingPhoneColumnError,
+    OutputFormat,
+    read_phones,
+    write_results,
+)
+
+OKVED_DATA = {
+    'okved': '5.67',
+    'matches_count': 3,
+    'complete_match': True,
+    'title': 'Разведение сомов анциструсов',
+}
+
+
+def test_read_phones__one_phone_per_line__skips_empty_lines():
+    input_file = io.StringIO('+79001234567\r\n\n8 900 123 45 67\n')
+    assert list(read_phones(input_file)) == ['+79001234567', '8 900 123 45 67']
+
+
+def test_read_phones__csv_column():
+    input_file = io.StringIO('id,phone\n1,+79001234567\n2,"8 (900) 123-45-67"\n')
+    assert list(read_phones(input_file, column='phone')) == ['+79001234567', '8 (900) 123-45-67']
+
+
+def test_read_phones__csv_without_column__raises_corresponding_error():
+    input_file = io.StringIO('id,msisdn\n1,+79001234567\n')
+    with pytest.raises(MissingPhoneColumnError):
+        list(read_phones(input_file, column='phone'))
+
+
+def test_write_results__jsonl():
+    output_file = io.StringIO()
+    results = [
+        ('+79001234567', '+79001234567', OKVED_DATA, ''),
+        ('', False, None, 'Данный телефонный номер пуст'),
+    ]
+
+    written_count = write_results(results, output_file, OutputFormat.jsonl)
+
+    records = [json.loads(line) for line in output_file.getvalue().splitlines()]
+    assert written_count == 2
+    assert records[0]['okved'] == '5.67'
+    assert records[0]['complete_match'] is True
+    assert records[1] == {
+        'phone': '',
+        'normalized_phone': '',
+        'okved': '',
+        'title': '',
+        'matches_count': None,
+        'complete_match': None,
+        'error': 'Данный телефонный номер пуст',
+    }
+
+
+def test_write_results__csv():
+    output_file = io.StringIO()
+    results = [('+7 900 123 45 67', '+79001234567', OKVED_DATA, '')]
+
+    write_results(results, output_file, OutputFormat.csv)
+
+    assert output_file.getvalue().splitlines() == [
+        'phone,normalized_phone,okved,title,matches_count,complete_match,error',
+        '+7 900 123 45 67,+79001234567,5.67,Разведение сомов анциструсов,3,True,',
+    ]
+
+
+def test_write_results__csv_without_results__writes_header():
+    output_file = io.StringIO()
+
+    assert write_results([], output_file, OutputFormat.csv) == 0
+    assert output_file.getvalue().splitlines() == [
+        'phone,normalized_phone,okved,title,matches_count,complete_match,error',
+    ]
+
+
+class RecordingOutputFile:
+    def __init__(self):
+        self.writes_consumed_counts = []
+        self.consumed_count = 0
+
+    def write(self, data: str) -> None:
+        self.writes_consumed_counts.append(self.consumed_count)
+
+
+@pytest.mark.parametrize('output_format', [OutputFormat.csv, OutputFormat.jsonl])
+def test_write_results__streams_results_by_chunks(output_format):
+    output_file = RecordingOutputFile()
+
+    def iterate_results():
+        for _ in range(RESULT_WRITE_CHUNK_SIZE * 3 + 1):
+            output_file.consumed_count += 1
+            yield '+79001234567', '+79001234567', OKVED_DATA, ''
+
+    written_count = write_results(iterate_results(), output_file, output_format, write_header=False)
+
+    assert written_count == RESULT_WRITE_CHUNK_SIZE * 3 + 1
+    assert output_file.writes_consumed_counts[:4] == [
+        RESULT_WRITE_CHUNK_SIZE,
+        RESULT_WRITE_CHUNK_SIZE * 2,
+        RESULT_WRITE_CHUNK_SIZE * 3,
+        RESULT_WRITE_CHUNK_SIZE * 3 + 1,
+    ]
+
+
+@pytest.mark.parametrize('output_format', [OutputFormat.csv, OutputFormat.jsonl])
+def test_write_results__several_chunks__same_output_as_one_by_one(output_format):
+    results = [('+7900{tail:07d}'.format(tail=tail), '', None, 'Ошибка') for tail in range(RESULT_WRITE_CHUNK_SIZE + 5)]
+    output_file = io.StringIO()
+    expected_output_file = io.StringIO()
+
+    write_results(results, output_file, output_format)
+    write_results(results[:1], expected_output_file, output_format)
+    for result in results[1:]:
+        write_results([result], expected_output_file, output_format, write_header=False)
+
+    assert output_file.getvalue() == expected_output_file.getvalue()
+
+
+def test_write_results__parquet():
+    pyarrow_parquet = pytest.importorskip('pyarrow.parquet')
+    output_file = io.BytesIO()
+    results = [
+        ('+7 900 123 45 67', '+79001234567', OKVED_DATA, ''),
+        ('', False, None, 'Данный телефонный номер пуст'),
+    ]
+
+    assert write_results(results, output_file, OutputFormat.parquet) == 2
+
+    output_file.seek(0)
+    table = pyarrow_parquet.read_table(output_file)
+    assert table.column('okved').to_pylist() == ['5.67', '']
+    assert table.column('matches_count').to_pylist() == [3, None]
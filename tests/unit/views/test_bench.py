@@ -0,0 +1,43 @@
+import json
+import random
+
+from src.commands.bench import generate_okved_codes, generate_phones, run_benchmarks
+from src.services.okved import normalize_phones
+
+
+def test_generate_phones__no_invalid_share__all_phones_normalize():
+    phones = generate_phones(random.Random(0), count=500, invalid_share=0)
+    assert all(normalized_phone for normalized_phone, _ in normalize_phones(phones))
+
+
+def test_generate_phones__invalid_share__some_phones_dont_normalize():
+    phones = generate_phones(random.Random(0), count=500, invalid_share=0.5)
+    errors = [error_message for _, error_message in normalize_phones(phones) if error_message]
+    assert 0 < len(errors) < len(phones)
+
+
+def test_generate_okved_codes__configurable_size_and_depth():
+    okved_codes = generate_okved_codes(random.Random(0), sections_count=3, depth=2, width=2)
+
+    assert len(okved_codes) == 3
+    for section in okved_codes:
+        for node in section['items']:
+            assert all('items' not in child for child in node['items'])
+
+
+def test_run_benchmarks__results_are_json_serializable():
+    bench_results = run_benchmarks(sections_count=2, depth=2, width=2, phones_count=20, repeat=1)
+
+    assert json.loads(json.dumps(bench_results)) == bench_results
+    assert bench_results['parameters']['phones_count'] == 20
+    assert {
+        'normalize_phone',
+        'find_matching_okved_code.reference',
+        'find_matching_okved_code.index',
+        'cache.save_okved_snapshot_to_manifest',
+        'cache.load_okved_index_from_cache',
+        'okved_service.get_okved.warm',
+    } <= set(bench_results['results'])
+    for result in bench_results['results'].values():
+        assert result['operations'] > 0
+        assert result['min_s'] <= result['median_s']
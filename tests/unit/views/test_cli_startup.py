@@ -0,0 +1,78 @@
+import os
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+
+# Бюджет на импорт модуля CLI в микросекундах, с запасом для медленных машин;
+CLI_IMPORT_TIME_BUDGET_US = 300_000
+
+HEAVY_MODULES = ('httpx', 'pydantic', 'pyhocon', 'asyncio', 'numpy', 'src.settings', 'src.clients.github')
+
+# Автономному поиску нужны настройки кэша, поэтому pydantic и pyhocon в этот список не входят;
+OFFLINE_PHONE_FORBIDDEN_MODULES = ('httpx', 'asyncio', 'numpy', 'src.clients.github')
+
+OKVED_CODES = [{'code': 'Раздел 1', 'items': [{'code': '5.67', 'name': 'Разведение сомов анциструсов', 'items': []}]}]
+
+
+def _run_python(code: str, *options: str, cwd: Path = REPO_ROOT) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *options, '-c', code],
+        cwd=cwd,
+        env={**os.environ, 'PYTHONPATH': str(REPO_ROOT)},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def test_cli_import__doesnt_import_heavy_dependencies():
+    completed = _run_python(
+        'import sys; import src.commands.cli; print(*sorted(m for m in {modules} if m in sys.modules))'.format(
+            modules=HEAVY_MODULES,
+        )
+    )
+    assert completed.stdout.split() == []
+
+
+def test_cli_import__fits_import_time_budget():
+    completed = _run_python('import src.commands.cli', '-X', 'importtime')
+
+    cumulative_times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative_time, module = line.split('|')
+        if cumulative_time.strip().isdigit():
+            cumulative_times[module.strip()] = int(cumulative_time)
+
+    assert cumulative_times['src.commands.cli'] < CLI_IMPORT_TIME_BUDGET_US
+
+
+def test_offline_phone__doesnt_import_network_and_async_dependencies(tmp_path):
+    shutil.copytree(REPO_ROOT / 'settings', tmp_path / 'settings')
+    _run_python(
+        'from src.deps import get_cache_repo; '
+        'get_cache_repo().save_okved_snapshot_to_manifest(etag=None, okved_codes={okved_codes!r})'.format(
+            okved_codes=OKVED_CODES,
+        ),
+        cwd=tmp_path,
+    )
+
+    completed = _run_python(
+        'import sys\n'
+        'from src.commands.cli import app\n'
+        'try:\n'
+        '    app(["phone", "+79001234567", "--offline"])\n'
+        'except SystemExit:\n'
+        '    pass\n'
+        'print("loaded:", *sorted(m for m in {modules} if m in sys.modules))'.format(
+            modules=OFFLINE_PHONE_FORBIDDEN_MODULES,
+        ),
+        cwd=tmp_path,
+    )
+
+    assert '5.67' in completed.stdout
+    assert completed.stdout.splitlines()[-1].split() == ['loaded:']
@@ -1,4 +1,4 @@
-from src.commands.cli import form_resulting_message
+from src.commands.cli import form_resulting_message, form_top_okved_message
 
 
 def test__no_normalized_phone__phone_error_message():
@@ -33,3 +33,18 @@ def test__none_okved_data__show_okved_loading_failed_messag():
         'Увы. Нам не удалось загрузить коды ОКВЭД ни из удалённого реестра, ни из локального кэша.\n'
         'Пожалуйста, попробуйте повторить свой запрос чуть позже.'
     )
+
+
+def test__top_okved_codes__show_ranked_list():
+    top_okved_codes = [
+        {'okved': '45.67', 'matches_count': 4, 'complete_match': True, 'title': 'Разведение креветок', 'rank': 1},
+        {'okved': '1.67', 'matches_count': 2, 'complete_match': False, 'title': 'Разведение гуппи', 'rank': 2},
+        {'okved': '2.67', 'matches_count': 2, 'complete_match': False, 'title': 'Разведение сомов', 'rank': 2},
+    ]
+    msg = form_top_okved_message('+79001234567', top_okved_codes, '')
+    assert msg == (
+        'Лучшие ОКВЭД для номера +79001234567 (равные по числу совпадений показаны все):\n'
+        '1. ОКВЭД: 45.67; совпало цифр: 4, полное совпадение; название: Разведение креветок.\n'
+        '2. ОКВЭД: 1.67; совпало цифр: 2; название: Разведение гуппи.\n'
+        '2. ОКВЭД: 2.67; совпало цифр: 2; название: Разведение сомов.'
+    )
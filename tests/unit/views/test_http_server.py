@@ -0,0 +1,158 @@
+import asyncio
+import json
+import threading
+from http import HTTPStatus
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from src.commands.server import OkvedHttpServer
+from src.services.metrics import PrometheusMetrics
+
+OKVED_DATA = {
+    'okved': '5.67',
+    'matches_count': 3,
+    'complete_match': True,
+    'title': 'Разведение сомов анциструсов',
+}
+
+
+@pytest.fixture
+def okved_service():
+    service = MagicMock()
+    service.warm_up.return_value = True
+    service.get_okved.return_value = ('+79001234567', OKVED_DATA, '')
+    service.get_okved_batch.side_effect = lambda raw_phones: [
+        (raw_phone, '+79001234567', OKVED_DATA, '') for raw_phone in raw_phones
+    ]
+    return service
+
+
+@pytest.fixture
+def okved_http_server(okved_service):
+    return OkvedHttpServer(okved_service=okved_service, host='127.0.0.1', port=0)
+
+
+def test_get_okved__plus_sign_is_not_decoded_as_space(okved_http_server, okved_service):
+    status, payload = okved_http_server.handle_request('GET', '/okved?phone=+7%20900%20123-45-67', b'')
+
+    assert status == HTTPStatus.OK
+    assert payload['okved'] == '5.67'
+    okved_service.get_okved.assert_called_once_with('+7 900 123-45-67')
+
+
+def test_get_okved__no_phone__bad_request(okved_http_server):
+    status, _ = okved_http_server.handle_request('GET', '/okved', b'')
+    assert status == HTTPStatus.BAD_REQUEST
+
+
+@pytest.mark.parametrize(
+    'body',
+    [
+        b'["+79001234567", "89001234567"]',
+        b'{"phones": ["+79001234567", "89001234567"]}',
+    ],
+)
+def test_get_okved_batch__returns_record_per_phone(okved_http_server, body):
+    status, payload = okved_http_server.handle_request('POST', '/okved/batch', body)
+
+    assert status == HTTPStatus.OK
+    assert [record['phone'] for record in payload] == ['+79001234567', '89001234567']
+
+
+@pytest.mark.parametrize('body', [b'not json', b'{"numbers": []}', b'[1, 2]'])
+def test_get_okved_batch__invalid_body__bad_request(okved_http_server, body):
+    status, _ = okved_http_server.handle_request('POST', '/okved/batch', body)
+    assert status == HTTPStatus.BAD_REQUEST
+
+
+def test_unknown_path__not_found(okved_http_server):
+    status, _ = okved_http_server.handle_request('GET', '/unknown', b'')
+    assert status == HTTPStatus.NOT_FOUND
+
+
+def test_wrong_method__method_not_allowed(okved_http_server):
+    status, _ = okved_http_server.handle_request('POST', '/okved', b'')
+    assert status == HTTPStatus.METHOD_NOT_ALLOWED
+
+
+def test_connection__serves_keep_alive_requests(okved_http_server):
+    async def send_requests() -> list[bytes]:
+        server = await asyncio.start_server(okved_http_server._handle_connection, host='127.0.0.1', port=0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            body = b'["89001234567"]'
+            writer.write(b'GET /okved?phone=89001234567 HTTP/1.1\r\nHost: localhost\r\n\r\n')
+            writer.write(
+                b'POST /okved/batch HTTP/1.1\r\nContent-Length: %d\r\nConnection: close\r\n\r\n%s' % (len(body), body)
+            )
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+        return response.split(b'HTTP/1.1 ')[1:]
+
+    responses = asyncio.run(send_requests())
+
+    assert len(responses) == 2
+    assert responses[0].startswith(b'200 OK')
+    assert json.loads(responses[1].split(b'\r\n\r\n', 1)[1])[0]['okved'] == '5.67'
+
+
+@pytest.mark.parametrize('wait_closed_error', [None, ConnectionResetError()])
+def test_connection__waits_until_closed(okved_http_server, wait_closed_error):
+    async def handle_closed_connection() -> None:
+        reader = asyncio.StreamReader()
+        reader.feed_eof()
+        await okved_http_server._handle_connection(reader, writer)
+
+    writer = MagicMock()
+    writer.wait_closed = AsyncMock(side_effect=wait_closed_error)
+
+    asyncio.run(handle_closed_connection())
+
+    writer.close.assert_called_once_with()
+    writer.wait_closed.assert_awaited_once_with()
+
+
+def test_metrics__prometheus_text(okved_service):
+    metrics = PrometheusMetrics()
+    metrics.observe_stage('match', 0.001)
+    okved_http_server = OkvedHttpServer(okved_service=okved_service, host='127.0.0.1', port=0, metrics=metrics)
+
+    status, payload = okved_http_server.handle_request('GET', '/metrics', b'')
+
+    assert status == HTTPStatus.OK
+    assert 'okved_stage_duration_seconds_count{stage="match"} 1' in payload.splitlines()
+
+
+def test_metrics__without_metrics__not_found(okved_http_server):
+    status, _ = okved_http_server.handle_request('GET', '/metrics', b'')
+    assert status == HTTPStatus.NOT_FOUND
+
+
+@pytest.mark.parametrize(
+    ('target', 'has_actual_snapshot', 'off_loop'),
+    [
+        ('/okved?phone=89001234567', True, False),
+        ('/okved?phone=89001234567', False, True),
+        ('/okved/batch', True, True),
+    ],
+)
+def test_dispatch_request__batch_and_refresh_off_event_loop(
+    okved_http_server, okved_service, target, has_actual_snapshot, off_loop
+):
+    okved_service.has_actual_snapshot.return_value = has_actual_snapshot
+    handler_threads = []
+    okved_service.get_okved.side_effect = lambda raw_phone: (
+        handler_threads.append(threading.current_thread()) or ('+79001234567', OKVED_DATA, '')
+    )
+    okved_service.get_okved_batch.side_effect = lambda raw_phones: (
+        handler_threads.append(threading.current_thread()) or []
+    )
+    method = 'POST' if target == '/okved/batch' else 'GET'
+
+    status, _ = asyncio.run(okved_http_server._dispatch_request(method, target, b'["89001234567"]'))
+
+    assert status == HTTPStatus.OK
+    assert [thread is not threading.main_thread() for thread in handler_threads] == [off_loop]
@@ -0,0 +1,150 @@
+import io
+from unittest.mock import MagicMock
+
+import pytest
+
+from src.commands import sharded_batch
+from src.commands.batch_io import MissingPhoneColumnError, OutputFormat, read_phones, write_results
+from src.repositories.cache import CacheRepository
+from src.services.okved import match_okved_batch
+from src.services.okved_index import build_okved_index
+from src.services.okved_registry import build_okved_registry
+from src.services.snapshot import OkvedSnapshot
+
+OKVED_ETAG = 'test_etag'
+
+OKVED_CODES = [
+    {
+        'code': 'Раздел 1',
+        'items': [{'code': '81.23.45.67', 'name': 'Разведение гуппи Эндлера', 'items': []}],
+    },
+    {
+        'code': 'Раздел 2',
+        'items': [{'code': '5.67', 'name': 'Разведение сомов анциструсов', 'items': []}],
+    },
+]
+
+RAW_PHONES = ['+7 900 123 45 {tail:02d}'.format(tail=tail) for tail in range(100)] + ['', 'не номер', '+79001234567']
+
+
+@pytest.fixture
+def cache_repo(tmp_path):
+    repo = CacheRepository(
+        etag_cache_path=str(tmp_path / 'etag.json'),
+        okved_json_cache_path=str(tmp_path / 'okved.json'),
+    )
+    repo.save_okved_snapshot_to_manifest(etag=OKVED_ETAG, okved_codes=OKVED_CODES)
+    return repo
+
+
+@pytest.fixture
+def okved_service():
+    service = MagicMock()
+    service.get_actual_snapshot.return_value = OkvedSnapshot(
+        etag=OKVED_ETAG,
+        okved_index=build_okved_index(OKVED_CODES),
+        okved_registry=build_okved_registry(OKVED_CODES),
+    )
+    return service
+
+
+@pytest.fixture
+def small_shards(monkeypatch):
+    monkeypatch.setattr(sharded_batch, 'MIN_SHARD_SIZE', 64)
+
+
+def _form_expected_output(input_text: str, column: str | None, output_format: OutputFormat) -> str:
+    output_file = io.StringIO(newline='')
+    raw_phones = read_phones(io.StringIO(input_text, newline=''), column=column)
+    okved_index = build_okved_index(OKVED_CODES)
+    results = match_okved_batch(raw_phone_numbers=raw_phones, get_okved_index=lambda: okved_index)
+    write_results(results, output_file, output_format)
+    return output_file.getvalue()
+
+
+def test_split_into_line_ranges__covers_file_by_whole_lines(tmp_path, small_shards):
+    input_path = tmp_path / 'phones.txt'
+    input_path.write_bytes(b''.join('{phone}\n'.format(phone=phone).encode('utf-8') for phone in RAW_PHONES))
+
+    byte_ranges = sharded_batch.split_into_line_ranges(str(input_path), data_start=0, shards_count=8)
+
+    content = input_path.read_bytes()
+    assert len(byte_ranges) == 8
+    assert byte_ranges[0][0] == 0
+    assert byte_ranges[-1][1] == len(content)
+    for (_, end), (start, _) in zip(byte_ranges, byte_ranges[1:]):
+        assert end == start
+        assert content[start - 1 : start] == b'\n'
+
+
+def test_split_into_line_ranges__small_file__one_range(tmp_path):
+    input_path = tmp_path / 'phones.txt'
+    input_path.write_text('+79001234567\n', encoding='utf-8')
+
+    assert sharded_batch.split_into_line_ranges(str(input_path), data_start=0, shards_count=8) == [(0, 13)]
+
+
+@pytest.mark.parametrize('output_format', [OutputFormat.csv, OutputFormat.jsonl])
+def test_run_sharded_batch__plain_lines__same_output_as_one_process(
+    tmp_path,
+    small_shards,
+    okved_service,
+    cache_repo,
+    output_format,
+):
+    input_text = ''.join('{phone}\n'.format(phone=phone) for phone in RAW_PHONES)
+    input_path = tmp_path / 'phones.txt'
+    input_path.write_text(input_text, encoding='utf-8')
+    output_path = tmp_path / 'result'
+
+    processed_count = sharded_batch.run_sharded_batch(
+        okved_service=okved_service,
+        cache_repo=cache_repo,
+        input_path=str(input_path),
+        output_path=str(output_path),
+        output_format=output_format,
+        column=None,
+        workers=2,
+    )
+
+    assert processed_count == len(RAW_PHONES) - 1
+    assert output_path.read_bytes().decode('utf-8') == _form_expected_output(input_text, None, output_format)
+
+
+def test_run_sharded_batch__csv_column__same_output_as_one_process(tmp_path, small_shards, okved_service, cache_repo):
+    input_text = 'id,phone\n' + ''.join(
+        '{id},"{phone}"\n'.format(id=number, phone=phone) for number, phone in enumerate(RAW_PHONES)
+    )
+    input_path = tmp_path / 'phones.csv'
+    input_path.write_text(input_text, encoding='utf-8')
+    output_path = tmp_path / 'result.csv'
+
+    processed_count = sharded_batch.run_sharded_batch(
+        okved_service=okved_service,
+        cache_repo=cache_repo,
+        input_path=str(input_path),
+        output_path=str(output_path),
+        output_format=OutputFormat.csv,
+        column='phone',
+        workers=2,
+    )
+
+    assert processed_count == len(RAW_PHONES)
+    assert output_path.read_bytes().decode('utf-8') == _form_expected_output(input_text, 'phone', OutputFormat.csv)
+
+
+def test_run_sharded_batch__csv_without_column__raises_corresponding_error(tmp_path, okved_service, cache_repo):
+    input_path = tmp_path / 'phones.csv'
+    input_path.write_text('id,msisdn\n1,+79001234567\n', encoding='utf-8')
+
+    with pytest.raises(MissingPhoneColumnError):
+        sharded_batch.run_sharded_batch(
+            okved_service=okved_service,
+            cache_repo=cache_repo,
+            input_path=str(input_path),
+            output_path=str(tmp_path / 'result.csv'),
+            output_format=OutputFormat.csv,
+            column='phone',
+            workers=2,
+        )
+    okved_service.get_actual_snapshot.assert_not_called()